@@ -0,0 +1,291 @@
+"""
+Audit log sink outside graph state: nodes emit entries to a bounded in-memory queue and a
+background thread writes them in batches to an append-only SQLite table or JSONL file
+
+    python -m agent.audit TICKET_ID [--path .audit.db]
+"""
+
+import asyncio
+import atexit
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from argparse import ArgumentParser
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from clients.settings import env_flag, load_section
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    eid TEXT NOT NULL,
+    ticket_id TEXT NOT NULL,
+    run_id TEXT NOT NULL DEFAULT '',
+    stage TEXT,
+    entry TEXT NOT NULL,
+    written_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS audit_log_ticket ON audit_log (ticket_id, id);
+"""
+
+# (eid, ticket_id, run_id, entry); eid is unique across processes so queued and written copies can be
+# merged, run_id tells apart the runs of a ticket id that is submitted more than once
+Record = Tuple[str, str, str, Dict[str, Any]]
+
+
+def latest_run(records: List[Tuple[str, str, Dict[str, Any]]], run_id: Optional[str]) -> List[Tuple[str, Dict[str, Any]]]:
+    """(eid, entry) of one run from a ticket's (eid, run_id, entry) in write order: `run_id`'s, or the last run's."""
+    if run_id is None:
+        run_id = records[-1][1] if records else ""
+    return [(eid, entry) for eid, rid, entry in records if rid == run_id]
+
+
+class SqliteAuditStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # Stores written before entries carried a run id: their rows all read as one run ('')
+        if "run_id" not in {row[1] for row in self._conn.execute("PRAGMA table_info(audit_log)")}:
+            self._conn.execute("ALTER TABLE audit_log ADD COLUMN run_id TEXT NOT NULL DEFAULT ''")
+
+    def write(self, records: List[Record]) -> None:
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "INSERT INTO audit_log (eid, ticket_id, run_id, stage, entry, written_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(eid, tid, rid, entry.get("stage"), json.dumps(entry, default=str), now) for eid, tid, rid, entry in records],
+            )
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def read(self, ticket_id: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """(eid, run_id, entry) of every run of `ticket_id`, in write order."""
+        # Own connection: reads come from request/event-loop threads while the writer thread inserts
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            rows = conn.execute("SELECT eid, run_id, entry FROM audit_log WHERE ticket_id = ? ORDER BY id", (ticket_id,)).fetchall()
+        finally:
+            conn.close()
+        return [(eid, rid, json.loads(entry)) for eid, rid, entry in rows]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class JsonlAuditStore:
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, records: List[Record]) -> None:
+        self._file.write("".join(json.dumps({"eid": eid, "ticket_id": tid, "run_id": rid, "entry": entry}, default=str) + "\n" for eid, tid, rid, entry in records))
+        self._file.flush()
+
+    def read(self, ticket_id: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+        out = []
+        if not Path(self.path).exists():
+            return out
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:  # a batch still being appended
+                    continue
+                if rec.get("ticket_id") == ticket_id:
+                    out.append((rec["eid"], rec.get("run_id", ""), rec["entry"]))
+        return out
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def store_path(backend: str, cfg: Dict[str, Any]) -> str:
+    """AUDIT_SINK_PATH, else the configured path if it is for this backend, else a default per backend."""
+    if os.getenv("AUDIT_SINK_PATH"):
+        return os.environ["AUDIT_SINK_PATH"]
+    if cfg.get("path") and cfg.get("backend", "sqlite") == backend:
+        return cfg["path"]
+    return ".audit.db" if backend == "sqlite" else ".audit.jsonl"
+
+
+def open_store(backend: str, path: str):
+    if backend == "jsonl":
+        return JsonlAuditStore(path)
+    if backend == "sqlite":
+        return SqliteAuditStore(path)
+    raise ValueError(f"Unknown audit backend {backend!r} (expected 'sqlite' or 'jsonl')")
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class AuditSink:
+    """Bounded queue + batch writer thread. `emit` never does I/O; when the queue is full it waits up
+    to `block_ms` for the writer (backpressure) and then drops the entry, counting it. Called from an
+    event loop thread it does not wait: the entry is dropped at once, so a slow store never stalls the loop."""
+
+    def __init__(self, store, queue_size: int = 10000, batch_size: int = 200, flush_interval_ms: float = 200, block_ms: float = 100):
+        self.store = store
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_ms / 1000
+        self.block_s = block_ms / 1000
+        self._pending: Deque[Record] = deque()
+        self._inflight: List[Record] = []
+        self._cond = threading.Condition()
+        self._ids = itertools.count()
+        self._prefix = uuid.uuid4().hex[:12]
+        self._closed = False
+        self._flushing = False
+        self._stats = {"emitted": 0, "written": 0, "dropped": 0, "dropped_on_loop": 0, "batches": 0, "write_ms": 0.0, "max_pending": 0, "errors": 0}
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def emit(self, ticket_id: str, entries: List[Dict[str, Any]], run_id: str = "") -> int:
+        """Queue entries for run `run_id` of `ticket_id`; returns how many were accepted."""
+        block_s = 0.0 if _on_event_loop() else self.block_s
+        accepted = 0
+        with self._cond:
+            for entry in entries:
+                if len(self._pending) >= self.queue_size:
+                    if block_s:
+                        self._cond.wait_for(lambda: len(self._pending) < self.queue_size, timeout=block_s)
+                    if len(self._pending) >= self.queue_size:
+                        self._stats["dropped"] += 1
+                        if not block_s:
+                            self._stats["dropped_on_loop"] += 1
+                        continue
+                self._pending.append((f"{self._prefix}-{next(self._ids)}", ticket_id, run_id, entry))
+                accepted += 1
+            self._stats["emitted"] += accepted
+            self._stats["max_pending"] = max(self._stats["max_pending"], len(self._pending))
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+        return accepted
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._flushing or len(self._pending) >= self.batch_size, timeout=self.flush_interval_s)
+                if not self._pending:
+                    self._flushing = False
+                    if self._closed:
+                        return
+                    continue
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                self._inflight = batch
+            started = time.perf_counter()
+            try:
+                self.store.write(batch)
+                ok = True
+            except Exception:
+                ok = False
+            with self._cond:
+                if ok:
+                    self._stats["written"] += len(batch)
+                    self._stats["batches"] += 1
+                    self._stats["write_ms"] += (time.perf_counter() - started) * 1000
+                else:
+                    # Keep the entries and retry on the next cycle
+                    self._stats["errors"] += 1
+                    self._pending.extendleft(reversed(batch))
+                self._inflight = []
+                self._cond.notify_all()
+            if not ok:
+                time.sleep(self.flush_interval_s)
+
+    def ticket_log(self, ticket_id: str, run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Entries of one run of a ticket (`run_id`, or its latest) in emission order: written ones plus
+        those still queued or being written.
+
+        The in-memory snapshot is taken first; an entry only leaves `_inflight` once it is written,
+        so anything missing from the snapshot is already in the store.
+        """
+        with self._cond:
+            unwritten = [(eid, rid, entry) for eid, tid, rid, entry in (*self._inflight, *self._pending) if tid == ticket_id]
+        written = self.store.read(ticket_id)
+        seen = {eid for eid, _, _ in written}
+        return [entry for _, entry in latest_run(written + [r for r in unwritten if r[0] not in seen], run_id)]
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until everything emitted so far is written."""
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._inflight, timeout=timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        if self._closed:
+            return
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self.store.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            s = dict(self._stats)
+            pending = len(self._pending) + len(self._inflight)
+        return {
+            "backend": type(self.store).__name__,
+            "path": self.store.path,
+            **s,
+            "write_ms": round(s["write_ms"], 2),
+            "mean_batch": round(s["written"] / s["batches"], 1) if s["batches"] else 0.0,
+            "pending": pending,
+            "queue_size": self.queue_size,
+        }
+
+
+def build_audit_sink() -> Optional[AuditSink]:
+    cfg = load_section("audit")
+    if not env_flag("AUDIT_SINK", bool(cfg.get("enabled", False))):
+        return None
+    backend = os.getenv("AUDIT_SINK_BACKEND", cfg.get("backend", "sqlite"))
+    return AuditSink(
+        open_store(backend, store_path(backend, cfg)),
+        queue_size=int(cfg.get("queue_size", 10000)),
+        batch_size=int(cfg.get("batch_size", 200)),
+        flush_interval_ms=float(cfg.get("flush_interval_ms", 200)),
+        block_ms=float(cfg.get("block_ms", 100)),
+    )
+
+
+def main() -> None:
+    cfg = load_section("audit")
+    parser = ArgumentParser(description="Print a ticket's audit log from the sink")
+    parser.add_argument("ticket_id")
+    parser.add_argument("--backend", default=os.getenv("AUDIT_SINK_BACKEND", cfg.get("backend", "sqlite")), choices=["sqlite", "jsonl"])
+    parser.add_argument("--path", default=None)
+    parser.add_argument("--run-id", default=None, help="Run to print (default: the ticket's latest run)")
+    args = parser.parse_args()
+    store = open_store(args.backend, args.path or store_path(args.backend, cfg))
+    try:
+        print(json.dumps([entry for _, entry in latest_run(store.read(args.ticket_id), args.run_id)], indent=2))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Checkpointer that reports how many bytes each superstep serializes
+"""
+
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List
+
+from langgraph.checkpoint.memory import MemorySaver
+
+
+class MeteredMemorySaver(MemorySaver):
+    def __init__(self, *args: Any, max_threads: int = 1000, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.max_threads = max_threads
+        self._steps: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._pending_writes: Dict[str, int] = defaultdict(int)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"]["checkpoint_ns"]
+        channels = {k: len(self.blobs[(thread_id, ns, k, v)][1]) for k, v in new_versions.items()}
+        blob, meta, _ = self.storage[thread_id][ns][checkpoint["id"]]
+        record = {
+            "step": metadata.get("step"),
+            "source": metadata.get("source"),
+            "channel_bytes": channels,
+            "checkpoint_bytes": len(blob[1]) + len(meta[1]),
+            "writes_bytes": self._pending_writes.pop(thread_id, 0),
+        }
+        record["total_bytes"] = sum(channels.values()) + record["checkpoint_bytes"] + record["writes_bytes"]
+        steps = self._steps.setdefault(thread_id, [])
+        steps.append(record)
+        self._steps.move_to_end(thread_id)
+        while len(self._steps) > self.max_threads:
+            self._steps.popitem(last=False)
+        return saved
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        super().put_writes(config, writes, task_id, task_path)
+        thread_id = config["configurable"]["thread_id"]
+        outer = self.writes.get((thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"]), {})
+        self._pending_writes[thread_id] += sum(len(w[2][1]) for w in outer.values() if w[0] == task_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        self._steps.pop(thread_id, None)
+        self._pending_writes.pop(thread_id, None)
+
+    def thread_bytes(self, thread_id: str) -> int:
+        """Bytes currently held in the store for one thread (all checkpoints, blobs and writes)."""
+        total = 0
+        for ns in self.storage.get(thread_id, {}).values():
+            total += sum(len(c[1]) + len(m[1]) for c, m, _ in ns.values())
+        total += sum(len(b[1]) for key, b in self.blobs.items() if key[0] == thread_id)
+        for key, writes in self.writes.items():
+            if key[0] == thread_id:
+                total += sum(len(w[2][1]) for w in writes.values())
+        return total
+
+    def store_report(self, top: int = 5) -> Dict[str, Any]:
+        """Size of the whole store: thread count, bytes per thread and the largest threads."""
+        sizes = {thread_id: self.thread_bytes(thread_id) for thread_id in list(self.storage)}
+        total = sum(sizes.values())
+        largest = sorted(sizes.items(), key=lambda kv: -kv[1])[:top]
+        return {
+            "threads": len(sizes),
+            "total_bytes": total,
+            "mean_thread_bytes": round(total / len(sizes)) if sizes else 0,
+            "max_thread_bytes": largest[0][1] if largest else 0,
+            "largest": [{"thread_id": t, "bytes": n} for t, n in largest],
+        }
+
+    def report(self, thread_id: str) -> Dict[str, Any]:
+        steps = list(self._steps.get(thread_id, []))
+        return {
+            "steps": steps,
+            "supersteps": len(steps),
+            "serialized_bytes": sum(s["total_bytes"] for s in steps),
+            "max_step_bytes": max((s["total_bytes"] for s in steps), default=0),
+            "stored_bytes": self.thread_bytes(thread_id),
+        }
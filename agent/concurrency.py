@@ -0,0 +1,187 @@
+"""
+Adaptive concurrency limit for ability calls: grows while latency stays flat,
+backs off when latency rises or providers throttle (429)
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from clients.llm import is_throttle_error, throttle_count
+
+
+class AdaptiveLimiter:
+    """Gradient (default) or AIMD limit on in-flight calls.
+
+    Latency is compared per ability against a slow-moving baseline, so cheap deterministic
+    abilities and multi-second LLM abilities can share one limiter.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: float = 16,
+        min_limit: int = 2,
+        max_limit: int = 256,
+        mode: str = "gradient",
+        smoothing: float = 0.2,
+        tolerance: float = 1.5,
+        backoff: float = 0.7,
+        decrease_cooldown_s: float = 1.0,
+        history: int = 200,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.mode = mode
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.decrease_cooldown_s = decrease_cooldown_s
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._ratio = 1.0
+        self._baseline: Dict[str, float] = {}
+        self._last_decrease = 0.0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._lock = threading.Lock()
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._counts = {"calls": 0, "throttled": 0, "errors": 0, "increases": 0, "decreases": 0, "queued": 0}
+        self._record_history("start")
+
+    def slots(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_flight < self.slots() and not self._waiters:
+                self._take()
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+            self._counts["queued"] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if future.done() and not future.cancelled():
+                    # Slot was handed over just as we were cancelled; give it back
+                    self.in_flight -= 1
+                    self._wake()
+                elif (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+            raise
+
+    def _take(self) -> None:
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _wake(self) -> None:
+        # Called with the lock held
+        while self._waiters and self.in_flight < self.slots():
+            loop, future = self._waiters.popleft()
+            if future.done():
+                continue
+            self._take()
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+
+    def release(self, ability: str, seconds: float, ok: bool = True, throttled: bool = False) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._counts["calls"] += 1
+            if throttled:
+                self._counts["throttled"] += 1
+            elif not ok:
+                self._counts["errors"] += 1
+            self._update(ability, seconds, ok, throttled)
+            self._wake()
+
+    def _update(self, ability: str, seconds: float, ok: bool, throttled: bool) -> None:
+        now = time.monotonic()
+        if throttled:
+            self._decrease(now, "throttled")
+            return
+        if not ok:
+            return
+        baseline = self._baseline.get(ability)
+        if baseline is None:
+            self._baseline[ability] = max(seconds, 1e-4)
+            return
+        ratio = seconds / baseline
+        # The baseline drifts slowly towards faster samples and very slowly towards slower ones
+        alpha = 0.1 if seconds < baseline else 0.01
+        self._baseline[ability] = max(1e-4, baseline + alpha * (seconds - baseline))
+        self._ratio += 0.3 * (ratio - self._ratio)
+
+        gradient = max(0.5, min(1.0, self.tolerance / self._ratio))
+        if gradient < 1.0:
+            if self.mode == "aimd":
+                self._decrease(now, "latency")
+            elif now - self._last_decrease >= self.decrease_cooldown_s:
+                self._last_decrease = now
+                target = self.limit * gradient + math.sqrt(self.limit)
+                self.limit = max(self.min_limit, (1 - self.smoothing) * self.limit + self.smoothing * target)
+                self._counts["decreases"] += 1
+                self._record_history("latency")
+            return
+        if now - self._last_decrease < self.decrease_cooldown_s or self.in_flight + 1 < self.slots() / 2:
+            return  # backing off, or app-limited: no evidence that a higher limit would be used
+        before = self.slots()
+        # Spread the increase over a window of `limit` calls: +1 (AIMD) or +sqrt(limit) (gradient) per window
+        step = 1.0 if self.mode == "aimd" else math.sqrt(self.limit)
+        self.limit = min(self.max_limit, self.limit + step / self.limit)
+        if self.slots() > before:
+            self._counts["increases"] += 1
+            self._record_history("increase")
+
+    def _decrease(self, now: float, reason: str) -> None:
+        if now - self._last_decrease < self.decrease_cooldown_s:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self._counts["decreases"] += 1
+        self._record_history(reason)
+
+    def _record_history(self, reason: str) -> None:
+        self._history.append({
+            "ts": round(time.time(), 3),
+            "limit": self.slots(),
+            "in_flight": self.in_flight,
+            "latency_ratio": round(self._ratio, 2),
+            "reason": reason,
+        })
+
+    async def run(self, ability: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        await self.acquire()
+        throttles_before = throttle_count()
+        started = time.perf_counter()
+        try:
+            result = await call()
+        except Exception as exc:
+            self.release(ability, time.perf_counter() - started, ok=False, throttled=is_throttle_error(exc))
+            raise
+        except BaseException:
+            self.release(ability, time.perf_counter() - started, ok=False)
+            raise
+        # A 429 absorbed by provider failover still counts as a throttling signal
+        self.release(ability, time.perf_counter() - started, throttled=throttle_count() > throttles_before)
+        return result
+
+    def snapshot(self, history: Optional[int] = None) -> Dict[str, Any]:
+        with self._lock:
+            items = list(self._history)
+            return {
+                "mode": self.mode,
+                "limit": self.slots(),
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "waiting": len(self._waiters),
+                "latency_ratio": round(self._ratio, 2),
+                **self._counts,
+                "history": items[-history:] if history else items,
+            }
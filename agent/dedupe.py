@@ -0,0 +1,171 @@
+"""
+Near-duplicate ticket detection (MinHash + LSH over normalized query shingles) so that
+incident storms of near-identical queries can reuse a resolved ticket's analysis
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from clients.settings import env_flag, load_section
+
+_PRIME = (1 << 61) - 1
+_ID_RE = re.compile(r"\S+@\S+|\b[\w-]*\d[\w-]*\d[\w-]*\b")
+# Standalone numbers and amounts ("3", "$1,200", "49.99"), with their separators, as one token
+_NUMBER_RE = re.compile(r"(?<![\w-])[$€£¥₹]?\d+(?:[.,]\d+)*(?![\w-])")
+_NON_WORD_RE = re.compile(r"[^a-z0-9 ]+")
+
+# Fields copied from the resolved ticket; everything customer-specific is recomputed. The score,
+# route and rationale depend on priority, so a ticket only reuses one of the same priority
+REUSED_FIELDS = ("entities", "retrieved_data", "retrieval_summary", "solution_score", "escalation_path", "route", "escalate", "decision_reason")
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop emails, numbers and amounts, identifier-like tokens (two or more digits: order ids) and punctuation."""
+    text = _ID_RE.sub(" ", _NUMBER_RE.sub(" ", str(text).lower()))
+    return " ".join(_NON_WORD_RE.sub(" ", text).split())
+
+
+def shingles(text: str, k: int = 5) -> Set[str]:
+    text = normalize_query(text)
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+def _lsh_bands(num_perm: int, threshold: float) -> int:
+    """Band count whose LSH S-curve threshold (1/b)^(1/r) sits just below `threshold`."""
+    target = max(0.05, threshold - 0.1)
+    options = [b for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda b: abs((1 / b) ** (b / num_perm) - target))
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = _Lcg(seed)
+        self.num_perm = num_perm
+        self._perms = [(rng.next() % (_PRIME - 1) + 1, rng.next() % _PRIME) for _ in range(num_perm)]
+
+    def signature(self, items: Set[str]) -> Tuple[int, ...]:
+        if not items:
+            return tuple([_PRIME] * self.num_perm)
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in items]
+        return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms)
+
+
+class _Lcg:
+    def __init__(self, seed: int):
+        self.state = seed
+
+    def next(self) -> int:
+        self.state = (6364136223846793005 * self.state + 1442695040888963407) % (1 << 64)
+        return self.state >> 3
+
+
+def estimate_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / max(1, len(a))
+
+
+def _priority_key(priority: Any) -> str:
+    # PREPARE upper-cases the priority, so the indexed ticket and a new one spell it differently
+    return str(priority or "").strip().lower()
+
+
+class DedupeIndex:
+    """Bounded in-process LSH index of recently resolved tickets (LRU by insertion, TTL on lookup)."""
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, shingle_size: int = 5, capacity: int = 2000, ttl_s: float = 3600.0):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.capacity = capacity
+        self.ttl_s = ttl_s
+        self.hasher = MinHasher(num_perm)
+        self.bands = _lsh_bands(num_perm, threshold)
+        self.rows = num_perm // self.bands
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._counts = {"lookups": 0, "hits": 0, "indexed": 0, "evicted": 0, "expired": 0}
+
+    def _band_keys(self, sig: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [(i, sig[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band in self._band_keys(entry["signature"]):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def add(self, ticket_id: str, query: str, result: Dict[str, Any], priority: str = "") -> None:
+        sig = self.hasher.signature(shingles(query, self.shingle_size))
+        with self._lock:
+            self._drop(ticket_id)
+            self._entries[ticket_id] = {"signature": sig, "result": result, "priority": _priority_key(priority), "added_at": time.time()}
+            for band in self._band_keys(sig):
+                self._buckets[band].add(ticket_id)
+            self._counts["indexed"] += 1
+            while len(self._entries) > self.capacity:
+                self._drop(next(iter(self._entries)))
+                self._counts["evicted"] += 1
+
+    def lookup(self, query: str, priority: str = "") -> Optional[Dict[str, Any]]:
+        """Best match of the same priority at or above the threshold: {"ticket_id", "similarity", "result"}, or None."""
+        sig = self.hasher.signature(shingles(query, self.shingle_size))
+        priority = _priority_key(priority)
+        now = time.time()
+        with self._lock:
+            self._counts["lookups"] += 1
+            candidates: Set[str] = set()
+            for band in self._band_keys(sig):
+                candidates |= self._buckets.get(band, set())
+            best: Optional[Tuple[float, str]] = None
+            for key in candidates:
+                entry = self._entries[key]
+                if now - entry["added_at"] > self.ttl_s:
+                    self._drop(key)
+                    self._counts["expired"] += 1
+                    continue
+                if entry["priority"] != priority:
+                    continue
+                similarity = estimate_similarity(sig, entry["signature"])
+                if similarity >= self.threshold and (best is None or similarity > best[0]):
+                    best = (similarity, key)
+            if best is None:
+                return None
+            self._counts["hits"] += 1
+            return {"ticket_id": best[1], "similarity": round(best[0], 3), "result": dict(self._entries[best[1]]["result"])}
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            size = len(self._entries)
+        return {
+            "threshold": self.threshold,
+            "bands": self.bands,
+            "rows": self.rows,
+            "size": size,
+            **counts,
+            "reuse_rate": round(counts["hits"] / counts["lookups"], 3) if counts["lookups"] else 0.0,
+        }
+
+
+def build_dedupe_index() -> Optional[DedupeIndex]:
+    cfg = load_section("dedupe")
+    if not env_flag("DEDUPE", bool(cfg.get("enabled", False))):
+        return None
+    return DedupeIndex(
+        threshold=float(os.getenv("DEDUPE_THRESHOLD", cfg.get("threshold", 0.8))),
+        num_perm=int(cfg.get("num_perm", 64)),
+        shingle_size=int(cfg.get("shingle_size", 5)),
+        capacity=int(cfg.get("capacity", 2000)),
+        ttl_s=float(cfg.get("ttl_s", 3600)),
+    )
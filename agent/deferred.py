@@ -0,0 +1,197 @@
+"""
+Deferred abilities: optional abilities whose result only feeds the output payload and audit
+(`summarize_retrieval` -> `retrieval_summary`, `decision_rationale` -> `decision_reason`) run as
+background tasks while the graph moves on, and are joined by the first stage that reads their field
+"""
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from agent.profiling import wrap_node
+from agent.scratch import thread_id_of
+from clients.settings import env_flag, load_section
+
+_DEFAULT_ABILITIES = {"summarize_retrieval": "retrieval_summary", "decision_rationale": "decision_reason"}
+
+
+@dataclass
+class _Pending:
+    ability: str
+    call: Callable[[], Awaitable[Any]]
+    task: asyncio.Task
+    loop: asyncio.AbstractEventLoop
+    work_s: float = 0.0
+
+
+class DeferredAbilities:
+    """`launch` starts an ability's call as a task on the running loop; `join` collects the results of a
+    thread's pending fields. The state already holds each field's non-LLM fallback, so a result that
+    fails or times out just leaves it in place. A task lost with the loop it ran on (the ticket paused
+    and was resumed under another `asyncio.run`) is re-run at the join; a ticket resumed in another
+    process has nothing pending and keeps the fallback."""
+
+    def __init__(self, abilities: Dict[str, str], join_timeout_s: float = 10.0):
+        self.abilities = dict(abilities)
+        self.join_timeout_s = join_timeout_s
+        self._pending: Dict[str, Dict[str, _Pending]] = {}
+        self._joined: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._tickets = {"tickets": 0, "critical_path_s": 0.0, "deferred_work_s": 0.0, "join_wait_s": 0.0}
+
+    def defers(self, ability: str) -> bool:
+        return ability in self.abilities
+
+    def _count(self, ability: str, key: str, n: float = 1) -> None:
+        with self._lock:
+            c = self._stats.setdefault(ability, {"launched": 0, "ready_at_join": 0, "waited": 0, "failed": 0, "timed_out": 0, "rerun": 0, "work_s": 0.0, "wait_s": 0.0})
+            c[key] += n
+
+    def launch(self, thread_id: str, ability: str, call: Callable[[], Awaitable[Any]]) -> None:
+        pending = _Pending(ability, call, None, asyncio.get_running_loop())  # type: ignore[arg-type]
+
+        async def _timed() -> Any:
+            started = time.perf_counter()
+            try:
+                return await call()
+            finally:
+                pending.work_s = time.perf_counter() - started
+
+        pending.task = asyncio.ensure_future(_timed())
+        with self._lock:
+            previous = self._pending.setdefault(thread_id, {}).pop(self.abilities[ability], None)
+            self._pending[thread_id][self.abilities[ability]] = pending
+        if previous is not None:
+            self._cancel(previous)
+        self._count(ability, "launched")
+
+    def pending_fields(self, thread_id: str) -> List[str]:
+        with self._lock:
+            return list(self._pending.get(thread_id, {}))
+
+    async def join(self, thread_id: str, fields: Optional[Iterable[str]] = None) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """Results of the thread's pending fields (all, or those in `fields`), and per ability how long
+        its work took and how long the join waited for it."""
+        with self._lock:
+            own = self._pending.get(thread_id, {})
+            picked = {f: own.pop(f) for f in list(own) if fields is None or f in fields}
+            if not own:
+                self._pending.pop(thread_id, None)
+        values: Dict[str, Any] = {}
+        report: Dict[str, Dict[str, Any]] = {}
+        for field, p in picked.items():
+            started = time.perf_counter()
+            outcome = "ready_at_join" if p.task.done() else "waited"
+            try:
+                if p.loop is not asyncio.get_running_loop():
+                    # Launched before the ticket paused, on a loop that has since ended or moved on
+                    if p.task.done() and not p.task.cancelled() and p.task.exception() is None:
+                        values[field] = p.task.result()
+                    else:
+                        outcome = "rerun"
+                        self._cancel(p)
+                        rerun = time.perf_counter()
+                        values[field] = await asyncio.wait_for(p.call(), self.join_timeout_s)
+                        p.work_s = time.perf_counter() - rerun
+                else:
+                    values[field] = await asyncio.wait_for(asyncio.shield(p.task), self.join_timeout_s)
+            except asyncio.TimeoutError:
+                outcome = "timed_out"
+                p.task.cancel()
+            except asyncio.CancelledError:
+                # Only a task cancelled on its own (replaced by a newer launch) lands here; the join's own cancellation propagates
+                if not p.task.cancelled() or outcome == "rerun":
+                    raise
+                outcome = "failed"
+            except Exception:
+                outcome = "failed"
+            if field in values and not (isinstance(values[field], str) and values[field]):
+                values.pop(field)
+                outcome = "failed"
+            wait_s = time.perf_counter() - started
+            self._count(p.ability, outcome)
+            self._count(p.ability, "work_s", p.work_s)
+            self._count(p.ability, "wait_s", wait_s)
+            report[p.ability] = {"outcome": outcome, "work_s": round(p.work_s, 4), "wait_s": round(wait_s, 4)}
+        return values, report
+
+    @staticmethod
+    def _cancel(p: _Pending) -> None:
+        if not p.loop.is_closed():
+            p.loop.call_soon_threadsafe(p.task.cancel)
+
+    def release(self, thread_id: str) -> None:
+        """Cancel whatever the thread still has pending (its ticket finished without reading it)."""
+        with self._lock:
+            left = self._pending.pop(thread_id, {})
+            self._joined.pop(thread_id, None)
+        for p in left.values():
+            self._cancel(p)
+
+    def timing(self, critical_path_s: float, joined: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+        """Per-ticket split: wall time on the critical path vs total work, which adds the deferred
+        work and drops the time the critical path only spent waiting on it."""
+        work = sum(r["work_s"] for r in joined.values())
+        wait = sum(r["wait_s"] for r in joined.values())
+        with self._lock:
+            self._tickets["tickets"] += 1
+            self._tickets["critical_path_s"] += critical_path_s
+            self._tickets["deferred_work_s"] += work
+            self._tickets["join_wait_s"] += wait
+        return {
+            "critical_path_s": round(critical_path_s, 3),
+            "deferred_work_s": round(work, 3),
+            "join_wait_s": round(wait, 3),
+            "total_work_s": round(critical_path_s - wait + work, 3),
+        }
+
+    def node(self, reads: Iterable[str], fn: Callable) -> Callable:
+        """Wrap a graph node that reads state `reads`: pending deferred fields among them are joined
+        first, handed to the node and written back with its update."""
+        fields = set(reads) & set(self.abilities.values())
+        if not fields:
+            return fn
+
+        async def _run(state, *rest):
+            thread_id = thread_id_of(rest[0] if rest else None)
+            if not thread_id or not set(self.pending_fields(thread_id)) & fields:
+                return await fn(state, *rest)
+            values, report = await self.join(thread_id, fields)
+            with self._lock:
+                self._joined.setdefault(thread_id, {}).update(report)
+            update = await fn({**state, **values}, *rest)
+            return {**values, **(update or {})}
+
+        return wrap_node(fn, _run)
+
+    def joined(self, thread_id: str) -> Dict[str, Dict[str, Any]]:
+        """Join reports of the thread's deferred abilities so far, cleared as they are read."""
+        with self._lock:
+            return self._joined.pop(thread_id, {})
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            t = dict(self._tickets)
+            abilities = {k: {m: round(v, 3) if isinstance(v, float) else v for m, v in c.items()} for k, c in sorted(self._stats.items())}
+            pending = sum(len(v) for v in self._pending.values())
+        n = t["tickets"] or 1
+        return {
+            "abilities": abilities,
+            "pending": pending,
+            "tickets": t["tickets"],
+            "mean_critical_path_s": round(t["critical_path_s"] / n, 3),
+            "mean_deferred_work_s": round(t["deferred_work_s"] / n, 3),
+            "mean_join_wait_s": round(t["join_wait_s"] / n, 3),
+            # Deferred work that overlapped other stages instead of adding to the critical path
+            "hidden_s": round(t["deferred_work_s"] - t["join_wait_s"], 3),
+        }
+
+
+def build_deferred() -> Optional[DeferredAbilities]:
+    cfg = load_section("deferred")
+    if not env_flag("DEFERRED_ABILITIES", bool(cfg.get("enabled", False))):
+        return None
+    return DeferredAbilities(cfg.get("abilities") or _DEFAULT_ABILITIES, float(cfg.get("join_timeout_s", 10.0)))
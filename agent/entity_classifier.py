@@ -0,0 +1,320 @@
+"""
+Distilled entity classifier for UNDERSTAND: a hashed n-gram softmax model trained on the entities
+the LLM path produced, used as a fast path when it is confident
+
+    python -m agent.entity_classifier train --labels .entity_labels.jsonl --out models/entity_classifier.npz
+    python -m agent.entity_classifier eval --labels holdout.jsonl
+"""
+
+import atexit
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from argparse import ArgumentParser
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from agent.dedupe import normalize_query
+from clients.settings import env_flag, load_section
+
+try:
+    import numpy as np
+except ImportError:  # the fast path is optional; UNDERSTAND falls back to the LLM
+    np = None
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+LABEL_FIELDS = ("issue_type", "affected_component")
+
+
+def class_of(entities: Dict[str, Any]) -> str:
+    """Joint label the model predicts, e.g. "Authentication|Two-Factor Authentication"."""
+    return "|".join(str(entities.get(f, "")).strip() for f in LABEL_FIELDS)
+
+
+def features(text: str, dims: int) -> List[int]:
+    """Hashed word unigrams, bigrams and in-word character 4-grams of the normalized query."""
+    words = normalize_query(text).split()
+    grams = list(words)
+    grams += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f"<{w}>"
+        grams += [f"#{padded[i:i + 4]}" for i in range(max(1, len(padded) - 3))]
+    return sorted({zlib.crc32(g.encode("utf-8")) % dims for g in grams})
+
+
+def _batch(rows: List[List[int]]) -> Tuple[Any, Any, Any]:
+    """CSR-style arrays: flat feature indices, per-row start offsets and L2-normalized values."""
+    lengths = np.array([max(1, len(r)) for r in rows])
+    indices = np.concatenate([np.array(r or [0], dtype=np.int64) for r in rows])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    values = np.repeat(1.0 / np.sqrt(lengths), lengths).astype(np.float32)
+    return indices, starts, values
+
+
+def _softmax(z: Any) -> Any:
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+@dataclass
+class Prediction:
+    entities: Dict[str, Any]
+    label: str
+    confidence: float
+    confident: bool
+    shadow: bool = False
+
+
+class EntityClassifier:
+    def __init__(self, weights: Any, bias: Any, classes: List[str], request_types: Dict[str, str], dims: int):
+        self.weights = weights
+        self.bias = bias
+        self.classes = classes
+        self.request_types = request_types
+        self.dims = dims
+
+    # -- training ----------------------------------------------------------------------------
+    @classmethod
+    def train(cls, examples: List[Dict[str, Any]], dims: int = 1 << 16, epochs: int = 30, lr: float = 0.5,
+              l2: float = 1e-6, min_count: int = 3, seed: int = 0) -> "EntityClassifier":
+        """Multinomial logistic regression by minibatch SGD over {"query", "entities"} examples."""
+        counts = Counter(class_of(e["entities"]) for e in examples)
+        classes = sorted(c for c, n in counts.items() if n >= min_count and c.strip("|"))
+        if len(classes) < 2:
+            raise ValueError(f"Need at least two classes with {min_count}+ examples, got {dict(counts)}")
+        index = {c: i for i, c in enumerate(classes)}
+        data = [(features(e["query"], dims), index[class_of(e["entities"])]) for e in examples if class_of(e["entities"]) in index]
+        by_class: Dict[str, Counter] = defaultdict(Counter)
+        for e in examples:
+            by_class[class_of(e["entities"])][str(e["entities"].get("request_type", ""))] += 1
+
+        w = np.zeros((dims, len(classes)), dtype=np.float32)
+        b = np.zeros(len(classes), dtype=np.float32)
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            step = lr / (1 + epoch * 0.1)
+            for start in range(0, len(data), 64):
+                chunk = data[start:start + 64]
+                indices, starts, values = _batch([f for f, _ in chunk])
+                logits = np.add.reduceat(w[indices] * values[:, None], starts, axis=0) + b
+                grad = _softmax(logits)
+                grad[np.arange(len(chunk)), [y for _, y in chunk]] -= 1.0
+                grad /= len(chunk)
+                rows = np.repeat(np.arange(len(chunk)), np.diff(np.append(starts, len(indices))))
+                np.add.at(w, indices, -step * (values[:, None] * grad[rows]))
+                w[indices] *= (1 - step * l2)
+                b -= step * grad.sum(axis=0)
+        request_types = {c: by_class[c].most_common(1)[0][0] for c in classes}
+        return cls(w, b, classes, request_types, dims)
+
+    def save(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        meta = json.dumps({"classes": self.classes, "request_types": self.request_types, "dims": self.dims})
+        with open(path, "wb") as f:
+            np.savez_compressed(f, weights=self.weights, bias=self.bias, meta=np.array(meta))
+
+    @classmethod
+    def load(cls, path: str) -> "EntityClassifier":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            return cls(data["weights"], data["bias"], meta["classes"], meta["request_types"], int(meta["dims"]))
+
+    # -- inference ---------------------------------------------------------------------------
+    def scores(self, query: str) -> Tuple[str, float]:
+        idx = features(query, self.dims)
+        if not idx:
+            return self.classes[0], 0.0
+        logits = self.weights[idx].sum(axis=0) / np.sqrt(len(idx)) + self.bias
+        probs = _softmax(logits[None, :])[0]
+        best = int(probs.argmax())
+        return self.classes[best], float(probs[best])
+
+    def entities_for(self, label: str, query: str) -> Dict[str, Any]:
+        issue_type, affected_component = label.split("|", 1)
+        first_sentence = _SENTENCE_RE.split(query.strip(), maxsplit=1)[0][:160]
+        return {
+            "issue_type": issue_type,
+            "affected_component": affected_component,
+            "request_type": self.request_types.get(label, ""),
+            "problem_description": [first_sentence] if first_sentence else [],
+        }
+
+
+def evaluate(model: EntityClassifier, examples: List[Dict[str, Any]], thresholds: Iterable[float] = (0.5, 0.7, 0.8, 0.9, 0.95)) -> Dict[str, Any]:
+    """Accuracy against the LLM labels, overall and on the share of tickets each threshold would bypass."""
+    rows = []
+    for e in examples:
+        label, confidence = model.scores(e["query"])
+        truth = class_of(e["entities"])
+        t_issue, t_comp = truth.split("|", 1)
+        p_issue, p_comp = label.split("|", 1)
+        rows.append((confidence, label == truth, p_issue.lower() == t_issue.lower(), p_comp.lower() == t_comp.lower()))
+    n = len(rows) or 1
+    sweep = []
+    for t in thresholds:
+        chosen = [r for r in rows if r[0] >= t]
+        sweep.append({
+            "threshold": t,
+            "bypass_rate": round(len(chosen) / n, 3),
+            "accuracy_bypassed": round(sum(r[1] for r in chosen) / len(chosen), 3) if chosen else None,
+        })
+    return {
+        "examples": len(rows),
+        "accuracy": round(sum(r[1] for r in rows) / n, 3),
+        "issue_type_accuracy": round(sum(r[2] for r in rows) / n, 3),
+        "affected_component_accuracy": round(sum(r[3] for r in rows) / n, 3),
+        "thresholds": sweep,
+    }
+
+
+_LABEL_FLUSH_S = 0.5
+
+
+class EntityFastPath:
+    """Runtime wrapper: thresholding, shadow sampling against the LLM, teacher-label logging and counters."""
+
+    def __init__(self, model: Optional[EntityClassifier], threshold: float = 0.9, shadow_rate: float = 0.05, labels_path: Optional[str] = None):
+        self.model = model
+        self.threshold = threshold
+        self.shadow_rate = shadow_rate
+        self.labels_path = labels_path
+        self._rng = random.Random()
+        self._lock = threading.Lock()
+        self._counts = {"lookups": 0, "bypassed": 0, "shadowed": 0, "shadow_agree": 0, "fallback": 0, "fallback_agree": 0, "labels_logged": 0, "label_errors": 0}
+        # Teacher labels are buffered and appended by a writer thread, never from the ticket's own path
+        self._labels: List[str] = []
+        self._labels_cond = threading.Condition()
+        self._writing = False
+        self._writer: Optional[threading.Thread] = None
+
+    def predict(self, query: str) -> Optional[Prediction]:
+        if self.model is None:
+            return None
+        label, confidence = self.model.scores(query)
+        confident = confidence >= self.threshold
+        # A sample of confident predictions still goes to the LLM to measure accuracy on bypassed traffic
+        shadow = confident and self._rng.random() < self.shadow_rate
+        with self._lock:
+            self._counts["lookups"] += 1
+            if confident and not shadow:
+                self._counts["bypassed"] += 1
+        return Prediction(self.model.entities_for(label, query), label, round(confidence, 4), confident, shadow)
+
+    def observe(self, query: str, prediction: Optional[Prediction], entities: Dict[str, Any]) -> None:
+        """Record the LLM path's entities: agreement counters, and a teacher label for the next training run."""
+        if prediction is not None:
+            agree = prediction.label.lower() == class_of(entities).lower()
+            total, agreed = ("shadowed", "shadow_agree") if prediction.shadow else ("fallback", "fallback_agree")
+            with self._lock:
+                self._counts[total] += 1
+                self._counts[agreed] += int(agree)
+        if self.labels_path and entities.get("issue_type"):
+            line = json.dumps({"query": query, "entities": {k: entities.get(k) for k in (*LABEL_FIELDS, "request_type")}})
+            with self._labels_cond:
+                self._labels.append(line + "\n")
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_labels, name="entity-labels", daemon=True)
+                    self._writer.start()
+                    atexit.register(self.flush_labels)
+                self._labels_cond.notify_all()
+
+    def _write_labels(self) -> None:
+        while True:
+            with self._labels_cond:
+                self._labels_cond.wait_for(lambda: self._labels)
+                batch, self._labels = self._labels, []
+                self._writing = True
+            try:
+                with open(self.labels_path, "a", encoding="utf-8") as f:
+                    f.write("".join(batch))
+                ok = True
+            except OSError:
+                ok = False
+            with self._lock:
+                self._counts["labels_logged" if ok else "label_errors"] += len(batch)
+            with self._labels_cond:
+                self._writing = False
+                self._labels_cond.notify_all()
+            time.sleep(_LABEL_FLUSH_S)  # let the next labels accumulate into one append
+
+    def flush_labels(self, timeout: float = 5.0) -> bool:
+        """Wait until every buffered teacher label is written."""
+        with self._labels_cond:
+            return self._labels_cond.wait_for(lambda: not self._labels and not self._writing, timeout=timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            c = dict(self._counts)
+        return {
+            "model_loaded": self.model is not None,
+            "threshold": self.threshold,
+            **c,
+            "bypass_rate": round(c["bypassed"] / c["lookups"], 3) if c["lookups"] else 0.0,
+            # Estimated accuracy of bypassed predictions (from the shadow sample) and of low-confidence ones
+            "bypassed_accuracy": round(c["shadow_agree"] / c["shadowed"], 3) if c["shadowed"] else None,
+            "fallback_accuracy": round(c["fallback_agree"] / c["fallback"], 3) if c["fallback"] else None,
+        }
+
+
+def build_entity_fast_path() -> Optional[EntityFastPath]:
+    cfg = load_section("entity_classifier")
+    if not env_flag("ENTITY_CLASSIFIER", bool(cfg.get("enabled", False))):
+        return None
+    model_path = os.getenv("ENTITY_CLASSIFIER_MODEL", cfg.get("model_path", "models/entity_classifier.npz"))
+    model = EntityClassifier.load(model_path) if np is not None and Path(model_path).exists() else None
+    return EntityFastPath(
+        model,
+        threshold=float(os.getenv("ENTITY_CLASSIFIER_THRESHOLD", cfg.get("threshold", 0.9))),
+        shadow_rate=float(cfg.get("shadow_rate", 0.05)),
+        labels_path=cfg.get("labels_path") if cfg.get("log_labels", True) else None,
+    )
+
+
+def _read_labels(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main() -> None:
+    if np is None:
+        raise SystemExit("numpy is required to train or evaluate the entity classifier")
+    cfg = load_section("entity_classifier")
+    parser = ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="Train on logged LLM labels and report hold-out accuracy")
+    train.add_argument("--labels", default=cfg.get("labels_path", ".entity_labels.jsonl"))
+    train.add_argument("--out", default=cfg.get("model_path", "models/entity_classifier.npz"))
+    train.add_argument("--holdout", type=float, default=0.2)
+    train.add_argument("--epochs", type=int, default=30)
+    train.add_argument("--dims", type=int, default=1 << 16)
+    ev = sub.add_parser("eval", help="Evaluate a saved model against a labels file")
+    ev.add_argument("--labels", required=True)
+    ev.add_argument("--model", default=cfg.get("model_path", "models/entity_classifier.npz"))
+    args = parser.parse_args()
+
+    examples = _read_labels(args.labels)
+    if args.command == "eval":
+        print(json.dumps(evaluate(EntityClassifier.load(args.model), examples), indent=2))
+        return
+    random.Random(0).shuffle(examples)
+    cut = int(len(examples) * (1 - args.holdout))
+    model = EntityClassifier.train(examples[:cut], dims=args.dims, epochs=args.epochs)
+    # Report on the hold-out split, then refit on everything for the saved model
+    report = {"train_examples": cut, "classes": model.classes, "holdout": evaluate(model, examples[cut:])}
+    if args.holdout > 0:
+        model = EntityClassifier.train(examples, dims=args.dims, epochs=args.epochs)
+    model.save(args.out)
+    report["model"] = args.out
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
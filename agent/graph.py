@@ -1,403 +1,657 @@
-"""
-LangGraph Agent for Customer Support Workflows
-"""
-
-from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
-from datetime import datetime, timedelta
-from schemas.agent_state import AgentState
-from typing import Any, Dict
-from clients.common_client import CommonClient
-from clients.atlas_client import AtlasClient
-import asyncio
-
-
-_COMMON = CommonClient()
-_ATLAS = AtlasClient()
-
-async def _common_call(ability: str, **kwargs):
-    state_like: Dict[str, Any] = {
-        "query": kwargs.get("query", ""),
-        "retrieved_data": kwargs.get("retrieved_data", {}),
-        "priority": kwargs.get("priority", ""),
-        "customer_name": kwargs.get("customer_name", ""),
-        "entities": kwargs.get("entities", {}),
-        "solution_score": kwargs.get("solution_score", 0),
-    }
-    return await asyncio.to_thread(_COMMON.execute, ability, state_like)
-
-async def _atlas_call(ability: str, **kwargs):
-    state_like: Dict[str, Any] = {
-        "query": kwargs.get("query", ""),
-        "ticket_id": kwargs.get("ticket_id", ""),
-        "customer_email": kwargs.get("customer_email", ""),
-        "solution_score": kwargs.get("score", 0),
-        "entities": kwargs.get("entities", {}),
-    }
-    return await asyncio.to_thread(_ATLAS.execute, ability, state_like)
-
-def add_audit(state: AgentState, stage: str, abilities: list, servers: list, extras: dict | None = None):
-    offset_ms = len(state.get("audit_log", [])) * 3
-    ts = (datetime.now() + timedelta(milliseconds=offset_ms)).isoformat(timespec="milliseconds")
-    new_entry = {
-        "stage": stage,
-        "timestamp": ts,
-        "abilities_executed": abilities,
-        "mcp_client": [s for s in servers if s],
-        "status": "Completed",
-    }
-    if extras:
-        new_entry.update(extras)
-    return {"audit_log": state["audit_log"] + [new_entry]}
-
-async def intake_node(state: AgentState):
-    abilities = ["accept_payload"]
-    servers = []
-    return add_audit(state, "INTAKE", abilities, servers)
-
-async def understand_node(state: AgentState):
-    abilities = []
-    servers = []
-    structured = await _common_call("parse_request_text", query=state["query"])
-    abilities.append("parse_request_text")
-    servers.append("COMMON")
-    
-
-    entities = await _atlas_call("extract_entities", query=state["query"]) 
-    abilities.append("extract_entities")
-    servers.append("ATLAS")
-    
-    # Merge results; prefer ATLAS LLM entities if they include required keys
-    extracted = {}
-    if isinstance(entities, dict):
-        atlas_extracted = entities.get("entities", entities)
-        if isinstance(atlas_extracted, dict) and atlas_extracted.get("issue_type"):
-            extracted = atlas_extracted
-    elif isinstance(entities, list):
-        extracted = entities[0] if entities and isinstance(entities[0], dict) else {}
-    # Fallback entity inference if extractor returned nothing
-    if not extracted:
-        ql = str(state["query"]).lower()
-        inferred = {}
-        if "password" in ql or "reset" in ql:
-            inferred = {"issue_type": "Password Reset", "product": "User Account"}
-        elif "software" in ql:
-            inferred = {"product": "Software", "issue_type": "General Issue"}
-        extracted = inferred
-    structured["entities"] = extracted
-    structured.update(extracted)
-    # Identify missing info for potential clarification
-    required_keys = ["issue_type", "affected_component"]
-    missing = [k for k in required_keys if not extracted.get(k)]
-    # Domain-specific required IDs
-    issue_type_val = str(extracted.get("issue_type", "")).lower()
-    if issue_type_val == "delivery" and not structured.get("order_number"):
-        missing.append("order_number")
-    if issue_type_val == "payment" and not (structured.get("transaction_reference") or extracted.get("transaction_reference")):
-        missing.append("transaction_reference")
-    updates = {"structured_data": structured, "entities": extracted, "missing_info": missing}
-    updates.update(add_audit(state, "UNDERSTAND", abilities, servers))
-    return updates
-
-async def prepare_node(state: AgentState):
-    abilities = []
-    servers = []
-    
-    # Execute COMMON server abilities
-    norm = await _common_call("normalize_fields", priority=state["priority"], ticket_id=state["ticket_id"])
-    abilities.append("normalize_fields")
-    servers.append("COMMON")
-    
-    # Execute ATLAS server ability
-    enrich = await _atlas_call("enrich_records", ticket_id=state["ticket_id"], customer_email=state["email"])
-    abilities.append("enrich_records")
-    servers.append("ATLAS")
-    
-    # Execute COMMON server ability
-    flags = await _common_call("add_flags_calculations", priority=state["priority"], query=state["query"])
-    abilities.append("add_flags_calculations")
-    servers.append("COMMON")
-    
-    # LLM-based entity normalization (COMMON)
-    norm_entities = await _common_call("entity_normalization", entities=state.get("structured_data", {}).get("entities", {}))
-    abilities.append("entity_normalization")
-    servers.append("COMMON")
-    
-    # Carry forward or update missing_info depending on enrichment results
-    current_missing = list(state.get("missing_info", []))
-    # Merge normalized entities back into structured state
-    structured = dict(state.get("structured_data", {}))
-    if isinstance(norm_entities, dict) and norm_entities.get("entities"):
-        structured["entities"] = norm_entities["entities"]
-        structured.update(norm_entities["entities"])  # flatten top-level shortcuts
-    # Derive SLA risk heuristically: escalate for critical auth
-    ql = str(state.get("query", "")).lower()
-    sla_risk = "high" if ("critical" in ql or norm.get("priority", "").upper() == "CRITICAL") else flags.get("sla_risk", "low")
-    flags["sla_risk"] = sla_risk
-    updates = {"priority": norm.get("priority", state["priority"]), "enriched_data": enrich, "flags": flags, "missing_info": current_missing, "structured_data": structured}
-    updates.update(add_audit(state, "PREPARE", abilities, servers))
-    return updates
-
-async def ask_node(state: AgentState):
-    abilities = []
-    servers = []
-    
-    # Only ask if required fields are missing
-    missing = state.get("missing_info", [])
-    if not missing:
-        _audit = add_audit(state, "ASK", abilities, servers, extras={"status": "Skipped", "reason": "No missing information"})
-        return {"audit_log": _audit["audit_log"]}
-    
-    # Execute ATLAS server ability
-    question = await _atlas_call("clarify_question", query=state["query"], structured_data=state.get("structured_data", {}), missing_info=state.get("missing_info", []))
-    abilities.append("clarify_question")
-    servers.append("ATLAS")
-    
-    updates: Dict[str, Any] = {"clarification_question": question["question"]}
-    _audit = add_audit(state, "ASK", abilities, servers)
-    updates["audit_log"] = _audit["audit_log"]
-    return updates
-
-async def wait_node(state: AgentState):
-    abilities = []
-    servers = []
-    
-    # Use the actual user response from ASK stage (matches schema field name)
-    user_response = state.get("customer_response", "").strip()
-
-    # If no response yet, mark awaiting and don't call external ability
-    if not user_response:
-        abilities.append("store_answer")
-        structured = {**state.get("structured_data", {}), "customer_answer": ""}
-        if state.get("missing_info"):
-            updates: Dict[str, Any] = {"structured_data": structured, "status": "awaiting_customer"}
-            _audit = add_audit(state, "WAIT", abilities, servers)
-            updates["audit_log"] = _audit["audit_log"]
-            return updates
-        else:
-            _audit = add_audit(state, "WAIT", abilities, servers, extras={"status": "Skipped", "reason": "No clarification required"})
-            return {"audit_log": _audit["audit_log"]}
-
-    # Execute ATLAS server ability with real user input
-    answer = await _atlas_call("extract_answer", customer_response=user_response)
-    abilities.append("extract_answer")
-    servers.append("ATLAS")
-    
-    # store_answer (STATE management)
-    abilities.append("store_answer")
-    structured = {**state["structured_data"], "customer_answer": answer["answer"]}
-    updates: Dict[str, Any] = {"structured_data": structured, "status": "received_customer_reply"}
-    _audit = add_audit(state, "WAIT", abilities, servers)
-    updates["audit_log"] = _audit["audit_log"]
-    return updates
-
-async def retrieve_node(state: AgentState):
-    abilities = []
-    servers = []
-    
-    # Optionally generate a semantic query (COMMON)
-    semantic = await _common_call("generate_semantic_query", query=state["query"], entities=state.get("structured_data", {}).get("entities", {}))
-    abilities.append("generate_semantic_query")
-    servers.append("COMMON")
-
-    # Execute ATLAS server ability using semantic query when present
-    effective_query = semantic.get("semantic_query") if isinstance(semantic, dict) and semantic.get("semantic_query") else state["query"]
-    data = await _atlas_call("knowledge_base_search", query=effective_query)
-    abilities.append("knowledge_base_search")
-    servers.append("ATLAS")
-    
-    # store_data (STATE management)
-    abilities.append("store_data")
-    # Ensure we always have a meaningful KB hit in demos
-    if not data or not data.get("data"):
-        data = {"data": "To reset your password, use the latest reset link; if it fails, request a new link."}
-
-    # Summarize retrieval (COMMON)
-    summary = await _common_call("summarize_retrieval", retrieved=data)
-    abilities.append("summarize_retrieval")
-    servers.append("COMMON")
-
-    updates: Dict[str, Any] = {"retrieved_data": data, "retrieval_summary": summary}
-    _audit = add_audit(state, "RETRIEVE", abilities, servers)
-    updates["audit_log"] = _audit["audit_log"]
-    return updates
-
-async def decide_node(state: AgentState):
-    abilities = []
-    servers = []
-    
-    # Execute COMMON server ability
-    score_result = await _common_call("solution_evaluation", query=state["query"], priority=state.get("priority", ""), retrieved_data=state.get("retrieved_data", {}))
-    abilities.append("solution_evaluation")
-    servers.append("COMMON")
-    score = int(score_result.get("score", 50)) if isinstance(score_result, dict) else int(score_result)
-    
-    # Execute ATLAS server ability
-    escalation = await _atlas_call("escalation_decision", query=state["query"], score=score)
-    abilities.append("escalation_decision")
-    servers.append("ATLAS")
-    
-    # update_payload (STATE management)
-    abilities.append("update_payload")
-    
-    # Escalate on critical auth issues regardless of score
-    ql = str(state.get("query", "")).lower()
-    is_auth_critical = ("critical" in ql) and any(k in ql for k in ["2fa", "auth", "code", "password", "reset"]) 
-    if is_auth_critical:
-        route = "update"
-    else:
-        if score < 50:
-            route = "update"
-        elif score < 80:
-            route = "do"
-        elif score < 95:
-            route = "create"
-        else:
-            route = "do"
-    
-    # LLM-style decision rationale (COMMON)
-    rationale = await _common_call("decision_rationale", score=score, priority=state.get("priority", ""))
-    abilities.append("decision_rationale")
-    servers.append("COMMON")
-    reason = rationale if isinstance(rationale, str) and rationale else ("Score < 50 → escalate" if route == "update" else ("50 ≤ score < 80 → perform actions (DO)" if route == "do" else "80 ≤ score < 95 → generate response (CREATE)"))
-    decision_details = f"Score {score} - {'Escalate' if route=='update' else 'No escalation required'}; reason: {reason}"
-    updates: Dict[str, Any] = {"solution_score": score, "escalation_path": escalation, "route": route, "escalate": route == "update", "decision_reason": reason}
-    _audit = add_audit(state, "DECIDE", abilities, servers, extras={"decision_details": decision_details})
-    updates["audit_log"] = _audit["audit_log"]
-    return updates
-
-async def update_node(state: AgentState):
-    abilities = []
-    servers = []
-    
-    # Execute ATLAS server abilities
-    await _atlas_call("update_ticket", ticket_id=state["ticket_id"], status="in_progress", priority=state["priority"])
-    abilities.append("update_ticket")
-    servers.append("ATLAS")
-    
-    await _atlas_call("close_ticket", ticket_id=state["ticket_id"])
-    abilities.append("close_ticket")
-    servers.append("ATLAS")
-    
-    status = "escalated" if bool(state.get("escalate")) else "resolved"
-    updates: Dict[str, Any] = {"status": status}
-    _audit = add_audit(state, "UPDATE", abilities, servers)
-    updates["audit_log"] = _audit["audit_log"]
-    return updates
-
-async def create_node(state: AgentState):
-    abilities = []
-    servers = []
-    
-    # Execute COMMON server ability
-    summary = await _common_call(
-        "response_generation",
-        query=state["query"],
-        solution=state.get("retrieved_data", {}),
-        customer_name=state["customer_name"],
-        entities=state.get("entities", {}),
-        solution_score=state.get("solution_score", 0),
-    )
-    abilities.append("response_generation")
-    servers.append("COMMON")
-    
-    updates: Dict[str, Any] = {"solution_summary": summary}
-    _audit = add_audit(state, "CREATE", abilities, servers)
-    updates["audit_log"] = _audit["audit_log"]
-    return updates
-
-async def do_node(state: AgentState):
-    abilities = []
-    servers = []
-    
-    # Execute ATLAS server abilities
-    await _atlas_call("execute_api_calls", ticket_id=state["ticket_id"], action_type="standard")
-    abilities.append("execute_api_calls")
-    servers.append("ATLAS")
-    
-    await _atlas_call("trigger_notifications", customer_email=state["email"], notification_type="update")
-    abilities.append("trigger_notifications")
-    servers.append("ATLAS")
-    
-    updates: Dict[str, Any] = add_audit(state, "DO", abilities, servers)
-    # Log actions explicitly for visibility
-    do_actions = [
-        {"stage": "DO", "action": "execute_api_calls", "status": "Completed"},
-        {"stage": "DO", "action": "trigger_notifications", "status": "Completed"},
-    ]
-    updates["audit_log"] = updates["audit_log"] + do_actions
-    return updates
-
-async def complete_node(state: AgentState):
-    abilities = ["output_payload"]
-    servers = []
-    
-    if not state["status"]:
-        updates: Dict[str, Any] = {"status": "resolved"}
-    else:
-        updates = {}
-    
-    _audit = add_audit(state, "COMPLETE", abilities, servers)
-    updates["audit_log"] = _audit["audit_log"]
-    return updates
-
-def decide_router(state: AgentState):
-    # Route based on the decision made in decide_node
-    route = state.get("route", "")
-    if route == "update":
-        return "UPDATE"
-    elif route == "create":
-        return "CREATE"
-    elif route == "do":
-        return "DO"
-    else:
-        # Default fallback - check if escalated
-        if state.get("escalate", False):
-            return "UPDATE"
-        else:
-            return "DO"
-
-# Build the graph
-workflow = StateGraph(state_schema=AgentState)
-
-workflow.add_node("INTAKE", intake_node)
-workflow.add_node("UNDERSTAND", understand_node)
-workflow.add_node("PREPARE", prepare_node)
-workflow.add_node("RETRIEVE", retrieve_node)
-workflow.add_node("DECIDE", decide_node)
-workflow.add_node("ASK", ask_node)
-workflow.add_node("WAIT", wait_node)
-workflow.add_node("UPDATE", update_node)
-workflow.add_node("CREATE", create_node)
-workflow.add_node("DO", do_node)
-workflow.add_node("COMPLETE", complete_node)
-
-# Deterministic edges
-workflow.add_edge(START, "INTAKE")
-workflow.add_edge("INTAKE", "UNDERSTAND")
-workflow.add_edge("UNDERSTAND", "PREPARE")
-workflow.add_edge("PREPARE", "ASK")
-workflow.add_edge("ASK", "WAIT")
-workflow.add_edge("WAIT", "RETRIEVE")
-workflow.add_edge("RETRIEVE", "DECIDE")
-
-# Conditional from DECIDE (non-deterministic): either go to ASK or continue
-workflow.add_conditional_edges(
-    "DECIDE",
-    decide_router,
-    {
-        "UPDATE": "UPDATE",
-        "CREATE": "CREATE",
-        "DO": "DO",
-    }
-)
-
-# Ensure we execute all remaining stages in order
-workflow.add_edge("UPDATE", "CREATE")
-workflow.add_edge("CREATE", "DO")
-workflow.add_edge("DO", "COMPLETE")
-workflow.add_edge("COMPLETE", END)
-
-# Compile with checkpointer for persistence
-checkpointer = MemorySaver()
-graph = workflow.compile(checkpointer=checkpointer)
\ No newline at end of file
+"""
+LangGraph Agent for Customer Support Workflows
+"""
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.types import interrupt
+from datetime import datetime, timedelta
+from schemas.agent_state import AgentState
+from typing import Any, Dict
+from clients.common_client import CommonClient
+from clients.atlas_client import AtlasClient
+from agent.checkpoint import MeteredMemorySaver
+from agent.concurrency import AdaptiveLimiter
+from agent.audit import build_audit_sink
+from agent.deferred import build_deferred
+from agent.dedupe import REUSED_FIELDS, build_dedupe_index
+from agent.entity_classifier import build_entity_fast_path
+from agent.latency_budget import build_latency_budget
+from agent.outbox import build_outbox
+from agent.response_cache import build_response_cache, customer_slots, template_key
+from agent.profiling import PROFILER
+from agent.memory import MEMORY, memory_every_from_env
+from agent.graph_builder import build_workflow, load_workflow_config, route_plans, skipped_abilities, stage_specs
+from clients.llm import load_llm_config
+from clients.settings import env_flag
+from agent.scratch import SCRATCH, thread_id_of
+import asyncio
+import time
+
+
+_COMMON = CommonClient()
+_ATLAS = AtlasClient()
+
+# Adaptive in-flight limits on the COMMON/ATLAS call paths (set ADAPTIVE_CONCURRENCY=0 to disable)
+_CONCURRENCY_CFG = {k: v for k, v in load_llm_config().get("adaptive_concurrency", {}).items() if k != "enabled"}
+_CONCURRENCY_ON = env_flag("ADAPTIVE_CONCURRENCY", bool(load_llm_config().get("adaptive_concurrency", {}).get("enabled", False)))
+_LIMITS = {name: AdaptiveLimiter(name, **_CONCURRENCY_CFG) for name in ("COMMON", "ATLAS")}
+
+# Near-duplicate reuse of recently resolved tickets (set DEDUPE=0 to disable)
+_DEDUPE = build_dedupe_index()
+
+def dedupe_metrics() -> Dict[str, Any]:
+    return _DEDUPE.snapshot() if _DEDUPE is not None else {"enabled": False}
+
+# Audit entries go to a batched background sink instead of the checkpointed state (AUDIT_SINK=0 keeps them in state)
+_AUDIT = build_audit_sink()
+
+def audit_metrics() -> Dict[str, Any]:
+    return _AUDIT.snapshot() if _AUDIT is not None else {"enabled": False}
+
+def flush_audit_sink() -> None:
+    """Wait for queued entries to be written (the sink also closes atexit, which multiprocessing children skip)."""
+    if _AUDIT is not None:
+        _AUDIT.flush()
+
+# Distilled local entity classifier; confident predictions skip the UNDERSTAND LLM calls (ENTITY_CLASSIFIER=0 disables)
+_ENTITIES = build_entity_fast_path()
+
+def entity_classifier_metrics() -> Dict[str, Any]:
+    return _ENTITIES.snapshot() if _ENTITIES is not None else {"enabled": False}
+
+def flush_entity_labels() -> None:
+    """Wait for buffered teacher labels to be appended (also done atexit, which multiprocessing children skip)."""
+    if _ENTITIES is not None:
+        _ENTITIES.flush_labels()
+
+# Parameterized response_generation templates keyed by issue, KB article and route (RESPONSE_CACHE=0 disables)
+_RESPONSES = build_response_cache()
+
+def response_cache_metrics() -> Dict[str, Any]:
+    return _RESPONSES.snapshot() if _RESPONSES is not None else {"enabled": False}
+
+# Per-ticket deadline; optional abilities fall back to their non-LLM results when it runs short
+_BUDGET = build_latency_budget()
+
+def latency_budget_metrics() -> Dict[str, Any]:
+    return _BUDGET.snapshot() if _BUDGET is not None else {"enabled": False}
+
+# Ticket-system writes recorded durably and pushed, coalesced, by a background flusher (OUTBOX=1 enables)
+_OUTBOX = build_outbox(lambda writes: _ATLAS.execute("apply_ticket_writes", {"writes": writes}))
+
+def outbox_metrics() -> Dict[str, Any]:
+    return _OUTBOX.snapshot() if _OUTBOX is not None else {"enabled": False}
+
+def flush_outbox() -> None:
+    """Push recorded writes that are due (the outbox also closes atexit, which multiprocessing children skip)."""
+    if _OUTBOX is not None:
+        _OUTBOX.flush()
+
+# Abilities feeding only the output and audit run in the background, joined when their field is read (DEFERRED_ABILITIES=0 inlines them)
+_DEFERRED = build_deferred()
+
+def deferred_metrics() -> Dict[str, Any]:
+    return _DEFERRED.snapshot() if _DEFERRED is not None else {"enabled": False}
+
+def memory_metrics() -> Dict[str, Any]:
+    return MEMORY.report() if MEMORY.enabled else {"enabled": False}
+
+def concurrency_metrics(history: int | None = 20) -> Dict[str, Any]:
+    if not _CONCURRENCY_ON:
+        return {"enabled": False}
+    return {name: limiter.snapshot(history) for name, limiter in _LIMITS.items()}
+
+# What each DECIDE outcome runs after it: stages and, per stage, abilities (config `route_plans`)
+_SPECS = stage_specs(load_workflow_config())
+ROUTE_PLANS = route_plans(_SPECS)
+
+def _planned(state: AgentState, stage: str) -> list:
+    return ROUTE_PLANS.get(decide_router(state), {}).get(stage, [])
+
+def _common_state(**kwargs) -> Dict[str, Any]:
+    return {
+        "query": kwargs.get("query", ""),
+        "retrieved_data": kwargs.get("retrieved_data", {}),
+        "priority": kwargs.get("priority", ""),
+        "customer_name": kwargs.get("customer_name", ""),
+        "entities": kwargs.get("entities", {}),
+        "solution_score": kwargs.get("solution_score", 0),
+    }
+
+async def _common_call(ability: str, **kwargs):
+    state_like = _common_state(**kwargs)
+    if not _CONCURRENCY_ON:
+        return await asyncio.to_thread(PROFILER.offload(_COMMON.execute), ability, state_like)
+    return await _LIMITS["COMMON"].run(ability, lambda: asyncio.to_thread(PROFILER.offload(_COMMON.execute), ability, state_like))
+
+async def _atlas_call(ability: str, **kwargs):
+    state_like: Dict[str, Any] = {
+        "query": kwargs.get("query", ""),
+        "ticket_id": kwargs.get("ticket_id", ""),
+        "customer_email": kwargs.get("customer_email", ""),
+        "solution_score": kwargs.get("score", 0),
+        "entities": kwargs.get("entities", {}),
+    }
+    if not _CONCURRENCY_ON:
+        return await asyncio.to_thread(PROFILER.offload(_ATLAS.execute), ability, state_like)
+    return await _LIMITS["ATLAS"].run(ability, lambda: asyncio.to_thread(PROFILER.offload(_ATLAS.execute), ability, state_like))
+
+def _defer(config: RunnableConfig, ability: str, **kwargs) -> bool:
+    """Launch a COMMON ability off the critical path; False when it is not deferred and must be awaited inline."""
+    thread_id = thread_id_of(config)
+    if _DEFERRED is None or not _DEFERRED.defers(ability) or not thread_id:
+        return False
+    _DEFERRED.launch(thread_id, ability, lambda: _common_call(ability, **kwargs))
+    return True
+
+async def _ticket_writes(state: AgentState, writes: list) -> list:
+    """Apply ticket writes [(ability, args)] in order, or record them in the outbox; returns the outboxed abilities."""
+    if _OUTBOX is None:
+        for ability, args in writes:
+            await _atlas_call(ability, ticket_id=state["ticket_id"], **args)
+        return []
+    await asyncio.to_thread(_OUTBOX.record, state["ticket_id"], writes)
+    return [ability for ability, _ in writes]
+
+def _budget_allows(ability: str, budget: Dict[str, Any], degraded: Dict[str, str], mode: str, paused_s: float = 0.0) -> bool:
+    """Whether an optional ability still fits the ticket's latency budget; if not, records how it is degraded."""
+    if _BUDGET is None or _BUDGET.allows(ability, budget, paused_s):
+        return True
+    degraded[ability] = mode
+    return False
+
+def _degraded_extras(budget: Dict[str, Any], degraded: Dict[str, str], paused_s: float = 0.0) -> Dict[str, Any]:
+    if not degraded:
+        return {}
+    return {"status": "Degraded", "degraded": degraded, "budget_remaining_s": round(_BUDGET.remaining_s(budget, paused_s), 3)}
+
+def _audit_entry(state: AgentState, stage: str, abilities: list, servers: list, extras: dict | None = None) -> Dict[str, Any]:
+    offset_ms = (len(state.get("audit_log", [])) + state.get("audit_ref", {}).get("entries", 0)) * 3
+    ts = (datetime.now() + timedelta(milliseconds=offset_ms)).isoformat(timespec="milliseconds")
+    new_entry = {
+        "stage": stage,
+        "timestamp": ts,
+        "abilities_executed": abilities,
+        "mcp_client": [s for s in servers if s],
+        "status": "Completed",
+    }
+    if extras:
+        new_entry.update(extras)
+    return new_entry
+
+def _audit_update(state: AgentState, entries: list) -> Dict[str, Any]:
+    """State update for new audit entries: the entries themselves, or with the sink only a count and stage status."""
+    if _AUDIT is None:
+        return {"audit_log": entries}
+    run_id = state.get("audit_ref", {}).get("run_id", "")
+    _AUDIT.emit(state["ticket_id"], entries, run_id)
+    return {"audit_ref": {"run_id": run_id, "entries": len(entries), "stages": {entries[0]["stage"]: entries[0].get("status", "Completed")}}}
+
+def add_audit(state: AgentState, stage: str, abilities: list, servers: list, extras: dict | None = None):
+    return _audit_update(state, [_audit_entry(state, stage, abilities, servers, extras)])
+
+def audit_log_of(state: Dict[str, Any]) -> list:
+    """The ticket's audit log: from state, or reconstructed from the sink for the state's run (else the latest run)."""
+    if _AUDIT is None:
+        return list(state.get("audit_log", []))
+    return _AUDIT.ticket_log(state["ticket_id"], state.get("audit_ref", {}).get("run_id"))
+
+async def intake_node(state: AgentState):
+    abilities = ["accept_payload"]
+    servers = []
+    updates: Dict[str, Any] = {"started_at": time.time()}
+    if _BUDGET is None:
+        updates.update(add_audit(state, "INTAKE", abilities, servers))
+        return updates
+    # `latency_budget` arrives holding only the payload's hints (sla_in_hours, deadline)
+    budget = _BUDGET.start(state["priority"], state.get("latency_budget"))
+    updates["latency_budget"] = budget
+    updates.update(add_audit(state, "INTAKE", abilities, servers, extras={"budget_s": budget["budget_s"]}))
+    return updates
+
+def _missing_info(structured: Dict[str, Any], extracted: Dict[str, Any]) -> list:
+    required_keys = ["issue_type", "affected_component"]
+    missing = [k for k in required_keys if not extracted.get(k)]
+    # Domain-specific required IDs
+    issue_type_val = str(extracted.get("issue_type", "")).lower()
+    if issue_type_val == "delivery" and not structured.get("order_number"):
+        missing.append("order_number")
+    if issue_type_val == "payment" and not (structured.get("transaction_reference") or extracted.get("transaction_reference")):
+        missing.append("transaction_reference")
+    return missing
+
+async def understand_node(state: AgentState, config: RunnableConfig):
+    abilities = []
+    servers = []
+    # Near-duplicate of a recently resolved ticket: reuse its entities, KB hit and decision
+    match = _DEDUPE.lookup(state["query"], state.get("priority", "")) if _DEDUPE is not None else None
+    if match is not None:
+        reused = match["result"]
+        extracted = dict(reused.get("entities") or {})
+        structured = {"entities": extracted, **extracted}
+        updates = {**reused, "structured_data": structured, "entities": extracted, "missing_info": _missing_info(structured, extracted), "reused_from": match["ticket_id"]}
+        updates.update(add_audit(state, "UNDERSTAND", abilities, servers, extras={"status": "Reused", "reused_from": match["ticket_id"], "similarity": match["similarity"]}))
+        return updates
+
+    prediction = _ENTITIES.predict(state["query"]) if _ENTITIES is not None else None
+    if prediction is not None and prediction.confident and not prediction.shadow:
+        extracted = prediction.entities
+        structured = {"entities": extracted, **extracted}
+        SCRATCH.update(thread_id_of(config), parsed_request=dict(structured))
+        updates = {"structured_data": structured, "entities": extracted, "missing_info": _missing_info(structured, extracted)}
+        updates.update(add_audit(state, "UNDERSTAND", abilities, servers, extras={"entity_source": "classifier", "confidence": prediction.confidence}))
+        return updates
+
+    structured = await _common_call("parse_request_text", query=state["query"])
+    abilities.append("parse_request_text")
+    servers.append("COMMON")
+    SCRATCH.update(thread_id_of(config), parsed_request=dict(structured))
+    
+
+    entities = await _atlas_call("extract_entities", query=state["query"]) 
+    abilities.append("extract_entities")
+    servers.append("ATLAS")
+    
+    # Merge results; prefer ATLAS LLM entities if they include required keys
+    extracted = {}
+    if isinstance(entities, dict):
+        atlas_extracted = entities.get("entities", entities)
+        if isinstance(atlas_extracted, dict) and atlas_extracted.get("issue_type"):
+            extracted = atlas_extracted
+    elif isinstance(entities, list):
+        extracted = entities[0] if entities and isinstance(entities[0], dict) else {}
+    # Only LLM output counts as a teacher label / agreement sample, not the keyword fallback below
+    if _ENTITIES is not None and extracted:
+        _ENTITIES.observe(state["query"], prediction, extracted)
+    # Fallback entity inference if extractor returned nothing
+    if not extracted:
+        ql = str(state["query"]).lower()
+        inferred = {}
+        if "password" in ql or "reset" in ql:
+            inferred = {"issue_type": "Password Reset", "product": "User Account"}
+        elif "software" in ql:
+            inferred = {"product": "Software", "issue_type": "General Issue"}
+        extracted = inferred
+    structured["entities"] = extracted
+    structured.update(extracted)
+    # Identify missing info for potential clarification
+    missing = _missing_info(structured, extracted)
+    updates = {"structured_data": structured, "entities": extracted, "missing_info": missing}
+    updates.update(add_audit(state, "UNDERSTAND", abilities, servers))
+    return updates
+
+async def prepare_node(state: AgentState, config: RunnableConfig):
+    abilities = []
+    servers = []
+    
+    # Execute COMMON server abilities
+    norm = await _common_call("normalize_fields", priority=state["priority"], ticket_id=state["ticket_id"])
+    abilities.append("normalize_fields")
+    servers.append("COMMON")
+    
+    # Execute ATLAS server ability
+    enrich = await _atlas_call("enrich_records", ticket_id=state["ticket_id"], customer_email=state["email"])
+    abilities.append("enrich_records")
+    servers.append("ATLAS")
+    
+    # Execute COMMON server ability
+    flags = await _common_call("add_flags_calculations", priority=state["priority"], query=state["query"])
+    abilities.append("add_flags_calculations")
+    servers.append("COMMON")
+    
+    # A customer SLA from enrichment can only tighten the ticket's deadline
+    budget = _BUDGET.tighten(state.get("latency_budget", {}), enrich.get("sla_in_hours")) if _BUDGET is not None else {}
+    degraded: Dict[str, str] = {}
+
+    # LLM-based entity normalization (COMMON); optional, skipped when the budget is short
+    norm_entities = None
+    if _budget_allows("entity_normalization", budget, degraded, "skipped"):
+        norm_entities = await _common_call("entity_normalization", entities=state.get("structured_data", {}).get("entities", {}))
+        abilities.append("entity_normalization")
+        servers.append("COMMON")
+    
+    # Carry forward or update missing_info depending on enrichment results
+    current_missing = list(state.get("missing_info", []))
+    # Merge normalized entities back into structured state
+    structured = dict(state.get("structured_data", {}))
+    if isinstance(norm_entities, dict) and norm_entities.get("entities"):
+        structured["entities"] = norm_entities["entities"]
+        structured.update(norm_entities["entities"])  # flatten top-level shortcuts
+    # Derive SLA risk heuristically: escalate for critical auth
+    ql = str(state.get("query", "")).lower()
+    sla_risk = "high" if ("critical" in ql or norm.get("priority", "").upper() == "CRITICAL") else flags.get("sla_risk", "low")
+    flags["sla_risk"] = sla_risk
+    SCRATCH.update(thread_id_of(config), normalized_fields=norm, enriched_data=enrich)
+    updates = {"priority": norm.get("priority", state["priority"]), "flags": flags, "missing_info": current_missing, "structured_data": structured}
+    if budget:
+        updates["latency_budget"] = budget
+    updates.update(add_audit(state, "PREPARE", abilities, servers, extras=_degraded_extras(budget, degraded)))
+    return updates
+
+async def ask_node(state: AgentState):
+    abilities = []
+    servers = []
+    
+    # Only ask if required fields are missing
+    missing = state.get("missing_info", [])
+    if not missing:
+        _audit = add_audit(state, "ASK", abilities, servers, extras={"status": "Skipped", "reason": "No missing information"})
+        return _audit
+    
+    # Execute ATLAS server ability
+    question = await _atlas_call("clarify_question", query=state["query"], structured_data=state.get("structured_data", {}), missing_info=state.get("missing_info", []))
+    abilities.append("clarify_question")
+    servers.append("ATLAS")
+    
+    # Start of the customer's turn: time until the reply does not count against the latency budget
+    updates: Dict[str, Any] = {"clarification_question": question["question"], "asked_at": time.time()}
+    _audit = add_audit(state, "ASK", abilities, servers)
+    updates.update(_audit)
+    return updates
+
+async def wait_node(state: AgentState):
+    abilities = []
+    servers = []
+    
+    # Use the actual user response from ASK stage (matches schema field name)
+    user_response = state.get("customer_response", "").strip()
+    paused_s = 0.0
+
+    # Pause at a checkpointed interrupt until the customer replies; resuming the thread
+    # with Command(resume=reply) continues from here without re-running earlier stages
+    if not user_response and state.get("missing_info"):
+        reply = interrupt({"question": state.get("clarification_question", ""), "missing_info": state.get("missing_info", [])})
+        user_response = str(reply or "").strip()
+        if state.get("asked_at"):
+            paused_s = max(0.0, time.time() - state["asked_at"])
+
+    # If no response yet, mark awaiting and don't call external ability
+    if not user_response:
+        abilities.append("store_answer")
+        structured = {**state.get("structured_data", {}), "customer_answer": ""}
+        if state.get("missing_info"):
+            updates: Dict[str, Any] = {"structured_data": structured, "status": "awaiting_customer"}
+            _audit = add_audit(state, "WAIT", abilities, servers)
+            updates.update(_audit)
+            return updates
+        else:
+            _audit = add_audit(state, "WAIT", abilities, servers, extras={"status": "Skipped", "reason": "No clarification required"})
+            return _audit
+
+    # Execute ATLAS server ability with real user input
+    answer = await _atlas_call("extract_answer", customer_response=user_response)
+    abilities.append("extract_answer")
+    servers.append("ATLAS")
+    
+    # store_answer (STATE management)
+    abilities.append("store_answer")
+    structured = {**state["structured_data"], "customer_answer": answer["answer"]}
+    updates: Dict[str, Any] = {"structured_data": structured, "status": "received_customer_reply", "customer_response": user_response}
+    if paused_s:
+        updates["paused_s"] = paused_s
+    _audit = add_audit(state, "WAIT", abilities, servers)
+    updates.update(_audit)
+    return updates
+
+async def retrieve_node(state: AgentState, config: RunnableConfig):
+    abilities = []
+    servers = []
+    if state.get("reused_from"):
+        return add_audit(state, "RETRIEVE", abilities, servers, extras={"status": "Reused", "reused_from": state["reused_from"]})
+    
+    budget = state.get("latency_budget", {})
+    degraded: Dict[str, str] = {}
+
+    # Optionally generate a semantic query (COMMON); the raw query when the budget is short
+    # Reads UNDERSTAND's entities, not PREPARE's normalized copy, so RETRIEVE can run alongside ASK
+    if _budget_allows("generate_semantic_query", budget, degraded, "fallback"):
+        semantic = await _common_call("generate_semantic_query", query=state["query"], entities=state.get("entities", {}))
+        abilities.append("generate_semantic_query")
+        servers.append("COMMON")
+    else:
+        semantic = _COMMON.fallback("generate_semantic_query", _common_state(query=state["query"]))
+
+    # Execute ATLAS server ability using semantic query when present
+    effective_query = semantic.get("semantic_query") if isinstance(semantic, dict) and semantic.get("semantic_query") else state["query"]
+    SCRATCH.update(thread_id_of(config), semantic_query=effective_query)
+    data = await _atlas_call("knowledge_base_search", query=effective_query)
+    abilities.append("knowledge_base_search")
+    servers.append("ATLAS")
+    
+    # store_data (STATE management)
+    abilities.append("store_data")
+    # Ensure we always have a meaningful KB hit in demos
+    if not data or not data.get("data"):
+        data = {"data": "To reset your password, use the latest reset link; if it fails, request a new link."}
+
+    # Summarize retrieval (COMMON); the extractive summary when the budget is short, and until a deferred summary is joined
+    deferred = []
+    summary = _COMMON.fallback("summarize_retrieval", _common_state(retrieved_data=data))
+    if _budget_allows("summarize_retrieval", budget, degraded, "fallback"):
+        if _defer(config, "summarize_retrieval", retrieved_data=data):
+            deferred.append("summarize_retrieval")
+        else:
+            summary = await _common_call("summarize_retrieval", retrieved_data=data)
+        abilities.append("summarize_retrieval")
+        servers.append("COMMON")
+
+    updates: Dict[str, Any] = {"retrieved_data": data, "retrieval_summary": summary}
+    extras = {**_degraded_extras(budget, degraded), **({"deferred": deferred} if deferred else {})}
+    _audit = add_audit(state, "RETRIEVE", abilities, servers, extras=extras)
+    updates.update(_audit)
+    return updates
+
+async def decide_node(state: AgentState, config: RunnableConfig):
+    abilities = []
+    servers = []
+    if state.get("reused_from"):
+        decision_details = f"Score {state.get('solution_score', 0)} - reused decision from {state['reused_from']}; reason: {state.get('decision_reason', '')}"
+        return add_audit(state, "DECIDE", abilities, servers, extras={"status": "Reused", "reused_from": state["reused_from"], "decision_details": decision_details})
+    
+    # Execute COMMON server ability
+    score_result = await _common_call("solution_evaluation", query=state["query"], priority=state.get("priority", ""), retrieved_data=state.get("retrieved_data", {}))
+    abilities.append("solution_evaluation")
+    servers.append("COMMON")
+    score = int(score_result.get("score", 50)) if isinstance(score_result, dict) else int(score_result)
+    SCRATCH.update(thread_id_of(config), evaluation=score_result if isinstance(score_result, dict) else {"score": score})
+    
+    # Execute ATLAS server ability
+    escalation = await _atlas_call("escalation_decision", query=state["query"], score=score)
+    abilities.append("escalation_decision")
+    servers.append("ATLAS")
+    
+    # update_payload (STATE management)
+    abilities.append("update_payload")
+    
+    # Escalate on critical auth issues regardless of score
+    ql = str(state.get("query", "")).lower()
+    is_auth_critical = ("critical" in ql) and any(k in ql for k in ["2fa", "auth", "code", "password", "reset"]) 
+    if is_auth_critical:
+        route = "update"
+    else:
+        if score < 50:
+            route = "update"
+        elif score < 80:
+            route = "do"
+        elif score < 95:
+            route = "create"
+        else:
+            route = "do"
+    
+    # LLM-style decision rationale (COMMON); the route rule below stands in when the budget is short,
+    # and until a deferred rationale is joined
+    budget, paused_s = state.get("latency_budget", {}), state.get("paused_s", 0.0)
+    degraded: Dict[str, str] = {}
+    deferred = []
+    rationale = ""
+    if _budget_allows("decision_rationale", budget, degraded, "fallback", paused_s):
+        if _defer(config, "decision_rationale", score=score, priority=state.get("priority", "")):
+            deferred.append("decision_rationale")
+        else:
+            rationale = await _common_call("decision_rationale", score=score, priority=state.get("priority", ""))
+        abilities.append("decision_rationale")
+        servers.append("COMMON")
+    reason = rationale if isinstance(rationale, str) and rationale else ("Score < 50 → escalate" if route == "update" else ("50 ≤ score < 80 → perform actions (DO)" if route == "do" else "80 ≤ score < 95 → generate response (CREATE)"))
+    decision_details = f"Score {score} - {'Escalate' if route=='update' else 'No escalation required'}; reason: {reason}"
+    updates: Dict[str, Any] = {"solution_score": score, "escalation_path": escalation, "route": route, "escalate": route == "update", "decision_reason": reason}
+    _audit = add_audit(state, "DECIDE", abilities, servers, extras={"decision_details": decision_details, **_degraded_extras(budget, degraded, paused_s), **({"deferred": deferred} if deferred else {})})
+    updates.update(_audit)
+    return updates
+
+async def update_node(state: AgentState):
+    abilities = []
+    servers = []
+    planned = _planned(state, "UPDATE")
+    
+    # Execute ATLAS server abilities the route's plan asks for (escalations stay open)
+    writes = []
+    if "update_ticket" in planned:
+        writes.append(("update_ticket", {"status": "in_progress", "priority": state["priority"]}))
+    if "close_ticket" in planned:
+        writes.append(("close_ticket", {}))
+    outboxed = await _ticket_writes(state, writes)
+    for ability, _ in writes:
+        abilities.append(ability)
+        servers.append("ATLAS")
+    
+    status = "escalated" if bool(state.get("escalate")) else "resolved"
+    updates: Dict[str, Any] = {"status": status}
+    _audit = add_audit(state, "UPDATE", abilities, servers, extras={"outbox": outboxed} if outboxed else None)
+    updates.update(_audit)
+    return updates
+
+async def create_node(state: AgentState):
+    abilities = []
+    servers = []
+    if "response_generation" not in _planned(state, "CREATE"):
+        return add_audit(state, "CREATE", abilities, servers, extras={"status": "Skipped", "reason": "Not in route plan"})
+    key = template_key(state)
+    slots = customer_slots(state)
+    cached = _RESPONSES.get(key, slots) if _RESPONSES is not None else None
+    if cached is not None:
+        abilities.append("response_generation")
+        updates: Dict[str, Any] = {"solution_summary": cached}
+        updates.update(add_audit(state, "CREATE", abilities, servers, extras={"response_cache": "hit"}))
+        return updates
+
+    # Execute COMMON server ability
+    summary = await _common_call(
+        "response_generation",
+        query=state["query"],
+        solution=state.get("retrieved_data", {}),
+        customer_name=state["customer_name"],
+        entities=state.get("entities", {}),
+        solution_score=state.get("solution_score", 0),
+    )
+    abilities.append("response_generation")
+    servers.append("COMMON")
+    if _RESPONSES is not None and isinstance(summary, str):
+        _RESPONSES.put(key, summary, slots, state["query"])
+
+    updates: Dict[str, Any] = {"solution_summary": summary}
+    _audit = add_audit(state, "CREATE", abilities, servers)
+    updates.update(_audit)
+    return updates
+
+async def do_node(state: AgentState):
+    abilities = []
+    servers = []
+    planned = _planned(state, "DO")
+    
+    # Execute ATLAS server abilities the route's plan asks for
+    outboxed = []
+    if "execute_api_calls" in planned:
+        outboxed = await _ticket_writes(state, [("execute_api_calls", {"action_type": "standard"})])
+        abilities.append("execute_api_calls")
+        servers.append("ATLAS")
+    
+    if "trigger_notifications" in planned:
+        await _atlas_call("trigger_notifications", customer_email=state["email"], notification_type="update")
+        abilities.append("trigger_notifications")
+        servers.append("ATLAS")
+    
+    # Log actions explicitly for visibility
+    do_actions = [{"stage": "DO", "action": a, "status": "Recorded" if a in outboxed else "Completed"} for a in abilities]
+    return _audit_update(state, [_audit_entry(state, "DO", abilities, servers, extras={"outbox": outboxed} if outboxed else None), *do_actions])
+
+async def complete_node(state: AgentState, config: RunnableConfig):
+    abilities = ["output_payload"]
+    servers = []
+    # Stage scratch is never checkpointed; drop it once the ticket is finalized
+    SCRATCH.release(thread_id_of(config))
+    # Deferred abilities were joined on entry (COMPLETE reads their fields); split wall time from work
+    timing: Dict[str, Any] = {}
+    if _DEFERRED is not None:
+        joined = _DEFERRED.joined(thread_id_of(config))
+        _DEFERRED.release(thread_id_of(config))
+        critical_path_s = time.time() - (state.get("started_at") or time.time()) - state.get("paused_s", 0.0)
+        timing = {"deferred": joined, "timing": _DEFERRED.timing(critical_path_s, joined)}
+    if _BUDGET is not None:
+        _BUDGET.finish(state.get("latency_budget", {}), state.get("paused_s", 0.0))
+    # Index freshly analysed tickets (not reuses, to avoid chains) for near-duplicate reuse
+    if _DEDUPE is not None and not state.get("reused_from") and state.get("route"):
+        _DEDUPE.add(state["ticket_id"], state["query"], {f: state.get(f) for f in REUSED_FIELDS}, state.get("priority", ""))
+    
+    if not state["status"]:
+        updates: Dict[str, Any] = {"status": "resolved"}
+    else:
+        updates = {}
+    
+    # Calls the route's plan avoided compared with running every stage after its entry point
+    avoided = skipped_abilities(_SPECS, decide_router(state))
+    _audit = add_audit(state, "COMPLETE", abilities, servers, extras={"route_plan": list(ROUTE_PLANS.get(decide_router(state), {})), "avoided_calls": len(avoided), "avoided": avoided, **timing})
+    updates.update(_audit)
+    return updates
+
+def decide_router(state: AgentState):
+    # Route based on the decision made in decide_node
+    route = state.get("route", "")
+    if route == "update":
+        return "UPDATE"
+    elif route == "create":
+        return "CREATE"
+    elif route == "do":
+        return "DO"
+    else:
+        # Default fallback - check if escalated
+        if state.get("escalate", False):
+            return "UPDATE"
+        else:
+            return "DO"
+
+def _stage(name: str, fn):
+    # Instrumented for `--profile` and memory tracking; both wrappers are passthroughs when disabled.
+    # A stage reading a deferred ability's field joins it first (inputs undeclared: reads everything)
+    if _DEFERRED is not None:
+        spec = next((s for s in _SPECS if s.name == name), None)
+        reads = _DEFERRED.abilities.values() if spec is None or spec.inputs is None else spec.inputs
+        fn = _DEFERRED.node(reads, fn)
+    return PROFILER.node(name, MEMORY.node(name, fn))
+
+NODES = {
+    "INTAKE": intake_node,
+    "UNDERSTAND": understand_node,
+    "PREPARE": prepare_node,
+    "RETRIEVE": retrieve_node,
+    "DECIDE": decide_node,
+    "ASK": ask_node,
+    "WAIT": wait_node,
+    "UPDATE": update_node,
+    "CREATE": create_node,
+    "DO": do_node,
+    "COMPLETE": complete_node,
+}
+ROUTERS = {"DECIDE": decide_router}
+
+# Edges come from config/workflow_config.json: stages with no data dependency between them
+# (RETRIEVE alongside ASK/WAIT) run in parallel and join before DECIDE. PARALLEL_STAGES=0 chains them.
+# After DECIDE each route runs only the stages and abilities of its plan.
+workflow = build_workflow(AgentState, NODES, ROUTERS, parallel=env_flag("PARALLEL_STAGES", True), wrap=_stage)
+
+# Compile with checkpointer for persistence
+checkpointer = MeteredMemorySaver()
+graph = workflow.compile(checkpointer=checkpointer)
+
+# Long-running processes (frontend.py, service.py) opt in with MEMORY_TRACK_EVERY=<tickets>
+if memory_every_from_env() > 0:
+    MEMORY.start(memory_every_from_env(), checkpoint_report=checkpointer.store_report, log=True)
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""
+Compile the stage graph from `config/workflow_config.json`: dependencies between stages are
+inferred from their declared state inputs/outputs, so independent stages run as parallel branches
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from langgraph.graph import END, START, StateGraph
+
+from clients.settings import load_workflow_config
+
+
+@dataclass(frozen=True)
+class StageSpec:
+    name: str
+    # None means undeclared: the stage is treated as reading/writing every field (fully ordered)
+    inputs: Optional[FrozenSet[str]]
+    outputs: Optional[FrozenSet[str]]
+    after: Tuple[str, ...] = ()
+    routes: Tuple[str, ...] = ()
+    abilities: Tuple[str, ...] = ()
+    # Router only: per route, the (stage, abilities) to run after it, in order
+    plans: Tuple[Tuple[str, Tuple[Tuple[str, Tuple[str, ...]], ...]], ...] = ()
+
+
+def stage_specs(config: Dict[str, Any]) -> List[StageSpec]:
+    specs = []
+    for stage in config["stages"]:
+        inputs, outputs = stage.get("inputs"), stage.get("outputs")
+        specs.append(StageSpec(
+            name=stage["name"],
+            inputs=frozenset(inputs) if inputs is not None else None,
+            outputs=frozenset(outputs) if outputs is not None else None,
+            after=tuple(stage.get("after", ())),
+            routes=tuple(stage.get("routes", ())),
+            abilities=tuple(stage.get("abilities", ())),
+            plans=tuple(
+                (route, tuple((name, tuple(abilities)) for name, abilities in steps.items()))
+                for route, steps in stage.get("route_plans", {}).items()
+            ),
+        ))
+    return specs
+
+
+def _overlaps(a: Optional[FrozenSet[str]], b: Optional[FrozenSet[str]]) -> bool:
+    if a is None or b is None:
+        return True
+    return bool(a & b)
+
+
+def _conflicts(earlier: StageSpec, later: StageSpec) -> bool:
+    """Read-after-write, write-after-read or write-after-write on any state field."""
+    return (
+        _overlaps(earlier.outputs, later.inputs)
+        or _overlaps(earlier.inputs, later.outputs)
+        or _overlaps(earlier.outputs, later.outputs)
+    )
+
+
+def infer_dependencies(specs: List[StageSpec], parallel: bool = True) -> Dict[str, Set[str]]:
+    """Direct predecessors per stage, after transitive reduction. Config order breaks ties:
+    a stage can only depend on stages listed before it. With `parallel=False` the result is
+    the plain config-order chain."""
+    names = [s.name for s in specs]
+    known = set(names)
+    deps: Dict[str, Set[str]] = {}
+    for i, spec in enumerate(specs):
+        unknown = set(spec.after) - known
+        if unknown:
+            raise ValueError(f"Stage {spec.name} is declared after unknown stages {sorted(unknown)}")
+        if not parallel:
+            deps[spec.name] = {names[i - 1]} if i else set()
+            continue
+        deps[spec.name] = set(spec.after) | {e.name for e in specs[:i] if _conflicts(e, spec)}
+
+    ancestors: Dict[str, Set[str]] = {}
+    for name in names:
+        ancestors[name] = set(deps[name])
+        for d in deps[name]:
+            ancestors[name] |= ancestors[d]
+    return {name: {d for d in deps[name] if not any(d in ancestors[o] for o in deps[name] if o != d)} for name in names}
+
+
+def route_plans(specs: List[StageSpec]) -> Dict[str, Dict[str, List[str]]]:
+    """Per route of the routing stage: the tail stages it runs, in order, with the abilities each runs.
+
+    A route without a configured plan runs the whole tail from its entry stage, every ability,
+    as a plain chain would. The last tail stage (COMPLETE) always ends every plan.
+    """
+    router = next((i for i, s in enumerate(specs) if s.routes), None)
+    if router is None:
+        return {}
+    tail = specs[router + 1:]
+    by_name = {s.name: s for s in tail}
+    configured = dict(specs[router].plans)
+    plans: Dict[str, Dict[str, List[str]]] = {}
+    for route in specs[router].routes:
+        if route not in configured:
+            if route not in by_name:
+                raise ValueError(f"Route {route} of {specs[router].name} is neither a stage after it nor has a route plan")
+            start = next(i for i, s in enumerate(tail) if s.name == route)
+            plans[route] = {s.name: list(s.abilities) for s in tail[start:]}
+            continue
+        steps: Dict[str, List[str]] = {}
+        for name, abilities in configured[route]:
+            if name not in by_name:
+                raise ValueError(f"Route plan {route} names {name}, which is not a stage after {specs[router].name}")
+            unknown = set(abilities) - set(by_name[name].abilities)
+            if unknown:
+                raise ValueError(f"Route plan {route} gives {name} abilities it does not have: {sorted(unknown)}")
+            steps[name] = list(abilities)
+        if tail and tail[-1].name not in steps:
+            steps[tail[-1].name] = list(tail[-1].abilities)
+        plans[route] = steps
+    return plans
+
+
+def skipped_abilities(specs: List[StageSpec], route: str) -> List[str]:
+    """Abilities the fixed tail (entry stage onwards, every ability) would run that `route`'s plan does not."""
+    plans = route_plans(specs)
+    router = next(i for i, s in enumerate(specs) if s.routes)
+    tail = specs[router + 1:]
+    start = next((i for i, s in enumerate(tail) if s.name == route), len(tail))
+    planned = [a for abilities in plans.get(route, {}).values() for a in abilities]
+    skipped = []
+    for spec in tail[start:]:
+        for ability in spec.abilities:
+            if ability in planned:
+                planned.remove(ability)
+            else:
+                skipped.append(ability)
+    return skipped
+
+
+def plan(specs: List[StageSpec], parallel: bool = True) -> Dict[str, Any]:
+    """Inferred edges and the stages that can run together in each superstep (before routing)."""
+    router = next((i for i, s in enumerate(specs) if s.routes), len(specs) - 1)
+    head, tail = specs[:router + 1], specs[router + 1:]
+    deps = infer_dependencies(head, parallel)
+    levels: Dict[str, int] = {}
+    for spec in head:
+        levels[spec.name] = 1 + max((levels[d] for d in deps[spec.name]), default=-1)
+    steps: List[List[str]] = [[] for _ in range(max(levels.values(), default=-1) + 1)]
+    for name, level in levels.items():
+        steps[level].append(name)
+    return {
+        "dependencies": {k: sorted(v) for k, v in deps.items()},
+        "parallel_steps": steps,
+        "router": head[-1].name if head and head[-1].routes else None,
+        "routes": list(head[-1].routes) if head else [],
+        "tail": [s.name for s in tail],
+        "route_plans": route_plans(specs),
+    }
+
+
+def build_workflow(
+    state_schema: Any,
+    nodes: Dict[str, Callable],
+    routers: Dict[str, Callable],
+    config: Optional[Dict[str, Any]] = None,
+    parallel: bool = True,
+    wrap: Callable[[str, Callable], Callable] = lambda name, fn: fn,
+) -> StateGraph:
+    """Build (not compile) the StateGraph for the configured stages.
+
+    Stages up to the first one with `routes` are wired from inferred dependencies; stages with
+    several predecessors join on all of them. After the routing stage, each route follows its plan
+    (`route_plans`); the router's answer is re-read after every tail stage to pick the next one.
+    """
+    specs = stage_specs(config or load_workflow_config())
+    missing = [s.name for s in specs if s.name not in nodes]
+    if missing:
+        raise ValueError(f"No node registered for stages {missing}")
+    layout = plan(specs, parallel)
+    deps = layout["dependencies"]
+
+    workflow = StateGraph(state_schema=state_schema)
+    for spec in specs:
+        workflow.add_node(spec.name, wrap(spec.name, nodes[spec.name]))
+
+    depended_on = {d for v in deps.values() for d in v}
+    for name, preds in deps.items():
+        if not preds:
+            workflow.add_edge(START, name)
+        elif len(preds) == 1:
+            workflow.add_edge(preds[0], name)
+        else:
+            workflow.add_edge(preds, name)
+        if name not in depended_on and name != layout["router"]:
+            workflow.add_edge(name, END)
+
+    tail = layout["tail"]
+    if layout["router"] is None:
+        for a, b in zip(tail, tail[1:]):
+            workflow.add_edge(a, b)
+        if tail:
+            workflow.add_edge(tail[-1], END)
+        return workflow
+
+    router = layout["router"]
+    if router not in routers:
+        raise ValueError(f"No router registered for stage {router}")
+    choose = routers[router]
+    plans = {route: list(steps) for route, steps in layout["route_plans"].items()}
+    workflow.add_conditional_edges(router, lambda state: plans[choose(state)][0], sorted({p[0] for p in plans.values()}))
+
+    def successor(stage: str) -> Callable[[Any], str]:
+        def pick(state: Any) -> str:
+            steps = plans[choose(state)]
+            i = steps.index(stage)
+            return steps[i + 1] if i + 1 < len(steps) else END
+        return pick
+
+    for stage in tail[:-1]:
+        targets = sorted({steps[steps.index(stage) + 1] for steps in plans.values() if stage in steps[:-1]})
+        if targets:
+            workflow.add_conditional_edges(stage, successor(stage), targets)
+    workflow.add_edge(tail[-1], END)
+    return workflow
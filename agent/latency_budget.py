@@ -0,0 +1,101 @@
+"""
+Per-ticket latency budget: a processing deadline derived from the priority class and `sla_in_hours`,
+against which optional abilities are skipped or swapped for their non-LLM fallbacks
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from agent.scheduler import SlaPolicy
+from clients.settings import env_flag, load_section
+
+_DEFAULT_BUDGET_S = {"Critical": 8.0, "High": 15.0, "Medium": 30.0, "Low": 60.0}
+
+
+class LatencyBudget:
+    """Abilities are tagged `required` or `optional`; an optional one runs only while at least its
+    `min_remaining_s` of the ticket's budget is left. Required abilities always run."""
+
+    def __init__(self, config: Dict[str, Any], policy: Optional[SlaPolicy] = None):
+        self.policy = policy or SlaPolicy()
+        self.budget_s: Dict[str, float] = {k: float(v) for k, v in (config.get("budget_s") or _DEFAULT_BUDGET_S).items()}
+        self.min_budget_s = float(config.get("min_budget_s", 2.0))
+        self.required = set(config.get("required", []))
+        self.optional: Dict[str, float] = {k: float(v) for k, v in config.get("optional", {}).items()}
+        both = self.required & set(self.optional)
+        if both:
+            raise ValueError(f"Abilities tagged both required and optional: {sorted(both)}")
+        self._lock = threading.Lock()
+        self._abilities: Dict[str, Dict[str, int]] = {}
+        self._tickets = {"finished": 0, "over_budget": 0}
+
+    def tag(self, ability: str) -> str:
+        return "optional" if ability in self.optional else "required"
+
+    def budget_for(self, priority: str, sla_in_hours: Any = None) -> float:
+        """Class budget, scaled down by how much a customer `sla_in_hours` tightens the class SLA."""
+        name = self.policy.classify({"priority": priority})
+        budget = self.budget_s.get(name, self.budget_s.get(self.policy.default_class, 30.0))
+        class_sla = float(self.policy.classes[name].get("sla_hours", 24))
+        if sla_in_hours and float(sla_in_hours) < class_sla:
+            budget *= float(sla_in_hours) / class_sla
+        return max(self.min_budget_s, budget)
+
+    def start(self, priority: str, hints: Optional[Dict[str, Any]] = None, now: Optional[float] = None) -> Dict[str, Any]:
+        """Budget state for a new ticket; `hints` may carry the payload's `sla_in_hours` or an absolute `deadline`."""
+        now = time.time() if now is None else now
+        hints = hints or {}
+        budget = self.budget_for(priority, hints.get("sla_in_hours"))
+        deadline = now + budget
+        if hints.get("deadline"):
+            deadline = min(deadline, float(hints["deadline"]))
+        return {"priority": priority, "budget_s": round(deadline - now, 3), "started_at": now, "deadline": deadline}
+
+    def tighten(self, budget: Dict[str, Any], sla_in_hours: Any) -> Dict[str, Any]:
+        """Apply an `sla_in_hours` learnt after INTAKE (enrich_records); the deadline only ever moves earlier."""
+        if not budget or not sla_in_hours:
+            return budget
+        deadline = min(budget["deadline"], budget["started_at"] + self.budget_for(budget.get("priority", ""), sla_in_hours))
+        return {**budget, "budget_s": round(deadline - budget["started_at"], 3), "deadline": deadline}
+
+    @staticmethod
+    def remaining_s(budget: Dict[str, Any], paused_s: float = 0.0, now: Optional[float] = None) -> Optional[float]:
+        """Seconds left, not counting time spent waiting for the customer; None without a budget."""
+        if not budget:
+            return None
+        now = time.time() if now is None else now
+        return budget["deadline"] + paused_s - now
+
+    def allows(self, ability: str, budget: Dict[str, Any], paused_s: float = 0.0) -> bool:
+        """Whether `ability` should run now, counting the outcome for optional abilities."""
+        if ability not in self.optional:
+            return True
+        remaining = self.remaining_s(budget, paused_s)
+        ok = remaining is None or remaining >= self.optional[ability]
+        with self._lock:
+            c = self._abilities.setdefault(ability, {"ran": 0, "degraded": 0})
+            c["ran" if ok else "degraded"] += 1
+        return ok
+
+    def finish(self, budget: Dict[str, Any], paused_s: float = 0.0) -> None:
+        remaining = self.remaining_s(budget, paused_s)
+        with self._lock:
+            self._tickets["finished"] += 1
+            self._tickets["over_budget"] += int(remaining is not None and remaining < 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_s": dict(self.budget_s),
+                "optional_min_remaining_s": dict(self.optional),
+                "tickets": dict(self._tickets),
+                "abilities": {k: dict(v) for k, v in sorted(self._abilities.items())},
+            }
+
+
+def build_latency_budget() -> Optional[LatencyBudget]:
+    cfg = load_section("latency_budget")
+    if not env_flag("LATENCY_BUDGET", bool(cfg.get("enabled", False))):
+        return None
+    return LatencyBudget(cfg)
@@ -0,0 +1,181 @@
+"""
+Memory growth tracking across tickets: tracemalloc snapshots every N tickets, growth by
+module and by graph stage, and checkpoint store size per thread
+"""
+
+import gc
+import os
+import sys
+import sysconfig
+import threading
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from agent.profiling import wrap_node
+
+_ROOT = Path(__file__).resolve().parent.parent
+_STDLIB = Path(sysconfig.get_paths()["stdlib"]).resolve()
+
+
+def module_of(filename: str) -> str:
+    """Group a source file into a module: repo modules by dotted path, packages by top-level name."""
+    if filename.startswith("<"):
+        return filename
+    path = Path(filename)
+    try:
+        rel = path.resolve().relative_to(_ROOT)
+        if rel.parts and rel.parts[0] not in (".venv", "venv"):
+            return ".".join(rel.with_suffix("").parts)
+    except ValueError:
+        pass
+    parts = path.parts
+    if "site-packages" in parts:
+        idx = parts.index("site-packages")
+        return parts[idx + 1].split(".")[0] if idx + 1 < len(parts) else "site-packages"
+    try:
+        rel = path.resolve().relative_to(_STDLIB)
+        return f"stdlib:{rel.parts[0].split('.')[0]}"
+    except ValueError:
+        return path.stem
+
+
+def _slope(xs: List[float], ys: List[float]) -> float:
+    n = len(xs)
+    mx, my = sum(xs) / n, sum(ys) / n
+    var = sum((x - mx) ** 2 for x in xs)
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var if var else 0.0
+
+
+class MemoryTracker:
+    def __init__(self):
+        self.enabled = False
+        self.every = 0
+        self.tickets = 0
+        self._lock = threading.Lock()
+        self._stage_bytes: Dict[str, int] = defaultdict(int)
+        self._stage_calls: Dict[str, int] = defaultdict(int)
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._samples: List[Dict[str, Any]] = []
+        self._last_diff: Dict[str, float] = {}
+        self._checkpoint_report: Callable[[], Dict[str, Any]] = lambda: {}
+        self.log = False
+
+    def start(self, every: int, frames: int = 1, checkpoint_report: Optional[Callable[[], Dict[str, Any]]] = None, log: bool = False) -> None:
+        """Start tracing; with `log`, a one-line summary goes to stderr at each snapshot."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.every = max(1, every)
+        self.enabled = True
+        self.log = log
+        if checkpoint_report is not None:
+            self._checkpoint_report = checkpoint_report
+        self._snapshot()
+
+    def node(self, stage: str, fn: Callable) -> Callable:
+        """Wrap a graph node to charge the traced-memory delta across it to the stage (exact when sequential)."""
+
+        async def _run(*args):
+            if not self.enabled:
+                return await fn(*args)
+            before = tracemalloc.get_traced_memory()[0]
+            try:
+                return await fn(*args)
+            finally:
+                with self._lock:
+                    self._stage_bytes[stage] += tracemalloc.get_traced_memory()[0] - before
+                    self._stage_calls[stage] += 1
+
+        return wrap_node(fn, _run)
+
+    def ticket_done(self) -> None:
+        """Count a ticket whose run ended (completed, failed or paused for a reply)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.tickets += 1
+            due = self.tickets % self.every == 0
+        if due:
+            self._snapshot()
+
+    def _snapshot(self) -> None:
+        # Measure what is retained, not cyclic garbage still waiting for a full collection
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        current, peak = tracemalloc.get_traced_memory()
+        checkpoint = self._checkpoint_report()
+        with self._lock:
+            if self._previous is not None:
+                by_module: Dict[str, int] = defaultdict(int)
+                for stat in snapshot.compare_to(self._previous, "filename"):
+                    by_module[module_of(stat.traceback[0].filename)] += stat.size_diff
+                self._last_diff = {k: v for k, v in by_module.items() if v}
+            if self._baseline is None:
+                self._baseline = snapshot
+            self._previous = snapshot
+            self._samples.append({
+                "tickets": self.tickets,
+                "traced_kb": round(current / 1024, 1),
+                "peak_kb": round(peak / 1024, 1),
+                "checkpoint_kb": round(checkpoint.get("total_bytes", 0) / 1024, 1),
+            })
+            top = sorted(self._last_diff.items(), key=lambda kv: -kv[1])[:3]
+        if self.log:
+            growth = ", ".join(f"{k} {v / 1024:+.1f}KB" for k, v in top) or "-"
+            print(
+                f"[memory] tickets={self.tickets} traced={current / 1024:.0f}KB "
+                f"checkpoints={checkpoint.get('threads', 0)} threads/{checkpoint.get('total_bytes', 0) / 1024:.0f}KB top growth: {growth}",
+                file=sys.stderr,
+            )
+
+    def growth_by_module(self, top: int = 15) -> Dict[str, float]:
+        """Growth since the first snapshot, grouped by module (KB)."""
+        with self._lock:
+            baseline, latest = self._baseline, self._previous
+        if baseline is None or latest is None or baseline is latest:
+            return {}
+        by_module: Dict[str, int] = defaultdict(int)
+        for stat in latest.compare_to(baseline, "filename"):
+            by_module[module_of(stat.traceback[0].filename)] += stat.size_diff
+        ranked = sorted(by_module.items(), key=lambda kv: -abs(kv[1]))[:top]
+        return {k: round(v / 1024, 1) for k, v in ranked}
+
+    def steady_state_kb_per_ticket(self, warmup: int = 1) -> Optional[float]:
+        """Slope of traced memory over tickets, ignoring the first `warmup` snapshots; None if too few."""
+        with self._lock:
+            samples = self._samples[warmup:]
+        if len(samples) < 3:
+            return None
+        return round(_slope([s["tickets"] for s in samples], [s["traced_kb"] for s in samples]), 3)
+
+    def report(self, warmup: int = 1) -> Dict[str, Any]:
+        with self._lock:
+            stages = {k: {"calls": self._stage_calls[k], "retained_kb": round(v / 1024, 1)} for k, v in self._stage_bytes.items()}
+            samples = list(self._samples)
+            last_diff = {k: round(v / 1024, 1) for k, v in sorted(self._last_diff.items(), key=lambda kv: -abs(kv[1]))[:10]}
+        return {
+            "every": self.every,
+            "tickets": self.tickets,
+            "snapshots": samples,
+            "steady_state_kb_per_ticket": self.steady_state_kb_per_ticket(warmup),
+            "growth_by_module_kb": self.growth_by_module(),
+            "last_interval_by_module_kb": last_diff,
+            "growth_by_stage_kb": stages,
+            "checkpoint_store": self._checkpoint_report(),
+        }
+
+    def stop(self) -> None:
+        self.enabled = False
+        tracemalloc.stop()
+
+
+def memory_every_from_env() -> int:
+    return int(os.getenv("MEMORY_TRACK_EVERY", "0") or 0)
+
+
+MEMORY = MemoryTracker()
@@ -0,0 +1,295 @@
+"""
+Durable outbox for ticket-system writes: UPDATE/DO record update_ticket, close_ticket and
+execute_api_calls in a local SQLite table and return at once; a background flusher merges each
+ticket's writes and pushes them in bulk, retrying with backoff under stable idempotency keys
+
+    python -m agent.outbox [--path .outbox.db] [--drain]
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from clients.settings import env_flag, load_section
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id TEXT NOT NULL,
+    op TEXT NOT NULL,
+    args TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    visible_at REAL NOT NULL,
+    lease_token TEXT,
+    idempotency_key TEXT,
+    sent_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_visible ON outbox (status, visible_at, ticket_id);
+"""
+
+# Writes that only set ticket fields; a ticket's run of them collapses into one final-state write
+STATE_OPS = ("update_ticket", "close_ticket")
+
+
+@dataclass
+class OutboxRow:
+    id: int
+    ticket_id: str
+    op: str
+    args: Dict[str, Any]
+    attempts: int
+
+
+def _key(ticket_id: str, op: str, ids: List[int]) -> str:
+    # Same rows -> same key on every retry, so the ticket system can drop a write it already applied
+    return f"{ticket_id}:{op}:" + hashlib.sha1(",".join(map(str, sorted(ids))).encode()).hexdigest()[:12]
+
+
+def coalesce(rows: List[OutboxRow]) -> List[Dict[str, Any]]:
+    """One write per ticket for its update/close rows (fields merged in order, closed if any close),
+    plus one per execute_api_calls row. Each write carries the row ids it settles."""
+    tickets: Dict[str, List[OutboxRow]] = {}
+    for row in sorted(rows, key=lambda r: r.id):
+        tickets.setdefault(row.ticket_id, []).append(row)
+    writes: List[Dict[str, Any]] = []
+    for ticket_id, ticket_rows in tickets.items():
+        state_rows = [r for r in ticket_rows if r.op in STATE_OPS]
+        if state_rows:
+            fields: Dict[str, Any] = {}
+            for r in state_rows:
+                fields.update(r.args)
+                if r.op == "close_ticket":
+                    fields["status"] = "closed"
+            ids = [r.id for r in state_rows]
+            writes.append({"op": "set_ticket_state", "ticket_id": ticket_id, "fields": fields, "row_ids": ids, "idempotency_key": _key(ticket_id, "set_ticket_state", ids)})
+        for r in ticket_rows:
+            if r.op not in STATE_OPS:
+                writes.append({"op": r.op, "ticket_id": ticket_id, "fields": r.args, "row_ids": [r.id], "idempotency_key": _key(ticket_id, r.op, [r.id])})
+    return writes
+
+
+class Outbox:
+    """`record` is a synchronous insert (durable once it returns). The flusher claims whole tickets'
+    pending rows under a lease, so several processes can share one outbox file, and pushes the
+    coalesced writes in one call. `push(writes)` returns a per-write error (None when applied)."""
+
+    def __init__(self, path: str, push: Callable[[List[Dict[str, Any]]], List[Optional[str]]],
+                 flush_interval_ms: float = 200, batch_tickets: int = 200, max_attempts: int = 8,
+                 backoff_ms: float = 500, max_backoff_ms: float = 60000, lease_s: float = 30, start: bool = True):
+        self.path = path
+        self.push = push
+        self.flush_interval_s = flush_interval_ms / 1000
+        self.batch_tickets = batch_tickets
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_ms / 1000
+        self.max_backoff_s = max_backoff_ms / 1000
+        self.lease_s = lease_s
+        self.owner = uuid.uuid4().hex[:12]
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # One connection shared by node threads and the flusher; transactions must not interleave
+        self._db = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._stats = {"recorded": 0, "writes": 0, "rows_settled": 0, "pushes": 0, "push_ms": 0.0, "retries": 0, "dead": 0, "push_errors": 0}
+        self._stats_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name="outbox-flusher", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _tx(self, fn):
+        with self._db:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self._conn)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return out
+
+    def _count(self, key: str, n: float = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def record(self, ticket_id: str, writes: List[Tuple[str, Dict[str, Any]]]) -> List[int]:
+        """Durably queue a ticket's writes [(op, args)], in order."""
+        now = time.time()
+        ids = self._tx(lambda c: [
+            c.execute("INSERT INTO outbox (ticket_id, op, args, created_at, visible_at) VALUES (?, ?, ?, ?, ?)",
+                      (ticket_id, op, json.dumps(args, default=str), now, now)).lastrowid
+            for op, args in writes
+        ])
+        self._count("recorded", len(ids))
+        return ids
+
+    def _claim(self) -> Tuple[str, List[OutboxRow]]:
+        """Lease all open rows of up to `batch_tickets` tickets. A ticket is only due once every open
+        row of it is visible: a row backing off (or leased by a live flusher) holds back the ticket's
+        newer rows too, so writes are never applied out of order."""
+        now = time.time()
+        token = uuid.uuid4().hex
+
+        def claim(c) -> List[OutboxRow]:
+            tickets = [r[0] for r in c.execute(
+                "SELECT ticket_id FROM outbox WHERE status IN ('pending', 'leased') GROUP BY ticket_id HAVING MAX(visible_at)<=? ORDER BY MIN(id) LIMIT ?",
+                (now, self.batch_tickets),
+            )]
+            if not tickets:
+                return []
+            marks = ",".join("?" * len(tickets))
+            rows = c.execute(
+                f"SELECT id, ticket_id, op, args, attempts FROM outbox WHERE status IN ('pending', 'leased') AND ticket_id IN ({marks}) ORDER BY id",
+                tickets,
+            ).fetchall()
+            c.executemany("UPDATE outbox SET status='leased', lease_token=?, visible_at=? WHERE id=?",
+                          [(token, now + self.lease_s, r[0]) for r in rows])
+            return [OutboxRow(r[0], r[1], r[2], json.loads(r[3]), r[4]) for r in rows]
+
+        return token, self._tx(claim)
+
+    def _settle(self, token: str, writes: List[Dict[str, Any]], errors: List[Optional[str]]) -> None:
+        now = time.time()
+
+        def settle(c) -> None:
+            for write, error in zip(writes, errors):
+                marks = ",".join("?" * len(write["row_ids"]))
+                if error is None:
+                    c.execute(f"UPDATE outbox SET status='sent', sent_at=?, idempotency_key=?, lease_token=NULL WHERE lease_token=? AND id IN ({marks})",
+                              (now, write["idempotency_key"], token, *write["row_ids"]))
+                    continue
+                for row_id, attempts in c.execute(f"SELECT id, attempts FROM outbox WHERE lease_token=? AND id IN ({marks})", (token, *write["row_ids"])).fetchall():
+                    attempts += 1
+                    if attempts >= self.max_attempts:
+                        c.execute("UPDATE outbox SET status='dead', attempts=?, error=?, lease_token=NULL WHERE id=?", (attempts, error, row_id))
+                        self._count("dead")
+                    else:
+                        delay = min(self.max_backoff_s, self.backoff_s * 2 ** (attempts - 1))
+                        c.execute("UPDATE outbox SET status='pending', attempts=?, error=?, visible_at=?, lease_token=NULL WHERE id=?",
+                                  (attempts, error, now + delay, row_id))
+                        self._count("retries")
+
+        self._tx(settle)
+
+    def run_once(self) -> int:
+        """Claim, coalesce, push and settle one batch; returns the number of rows settled or retried."""
+        token, rows = self._claim()
+        if not rows:
+            return 0
+        writes = coalesce(rows)
+        started = time.perf_counter()
+        try:
+            errors = list(self.push([{k: v for k, v in w.items() if k != "row_ids"} for w in writes]))
+        except Exception as exc:
+            self._count("push_errors")
+            errors = [f"{type(exc).__name__}: {exc}"] * len(writes)
+        self._count("push_ms", (time.perf_counter() - started) * 1000)
+        self._count("pushes")
+        self._settle(token, writes, errors)
+        ok = [w for w, e in zip(writes, errors) if e is None]
+        self._count("writes", len(ok))
+        self._count("rows_settled", sum(len(w["row_ids"]) for w in ok))
+        return len(rows)
+
+    def _run(self) -> None:
+        while not self._closed:
+            try:
+                if self.run_once():
+                    continue
+            except Exception:
+                pass  # sqlite busy or similar: rows stay leased/pending and are picked up next cycle
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Push everything currently due from the calling thread; False if rows are still due at `timeout`."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not self.run_once():
+                return True
+        return False
+
+    def close(self, timeout: float = 10.0) -> None:
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._db:
+            self._conn.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._db:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = self._conn.execute("SELECT MIN(created_at) FROM outbox WHERE status IN ('pending', 'leased')").fetchone()[0]
+        with self._stats_lock:
+            s = dict(self._stats)
+        return {
+            "path": self.path,
+            **s,
+            "push_ms": round(s["push_ms"], 2),
+            # Rows folded into another ticket write: round-trips the coalescing saved
+            "coalesced": s["rows_settled"] - s["writes"],
+            "mean_writes_per_push": round(s["writes"] / s["pushes"], 1) if s["pushes"] else 0.0,
+            "rows": counts,
+            "oldest_pending_s": round(time.time() - oldest, 3) if oldest else 0.0,
+        }
+
+
+def build_outbox(push: Callable[[List[Dict[str, Any]]], List[Optional[str]]]) -> Optional[Outbox]:
+    cfg = load_section("outbox")
+    if not env_flag("OUTBOX", bool(cfg.get("enabled", False))):
+        return None
+    return Outbox(
+        os.getenv("OUTBOX_PATH", cfg.get("path", ".outbox.db")),
+        push,
+        flush_interval_ms=float(cfg.get("flush_interval_ms", 200)),
+        batch_tickets=int(cfg.get("batch_tickets", 200)),
+        max_attempts=int(cfg.get("max_attempts", 8)),
+        backoff_ms=float(cfg.get("backoff_ms", 500)),
+        max_backoff_ms=float(cfg.get("max_backoff_ms", 60000)),
+        lease_s=float(cfg.get("lease_s", 30)),
+    )
+
+
+def main() -> None:
+    cfg = load_section("outbox")
+    parser = ArgumentParser(description="Outbox row counts; --drain pushes everything due now")
+    parser.add_argument("--path", default=os.getenv("OUTBOX_PATH", cfg.get("path", ".outbox.db")))
+    parser.add_argument("--drain", action="store_true")
+    args = parser.parse_args()
+    push = None
+    if args.drain:
+        from clients.atlas_client import AtlasClient
+
+        atlas = AtlasClient()
+        push = lambda writes: atlas.execute("apply_ticket_writes", {"writes": writes})
+    outbox = Outbox(args.path, push or (lambda writes: ["not draining"] * len(writes)), start=False)
+    try:
+        if args.drain:
+            outbox.flush(timeout=60)
+        print(json.dumps(outbox.snapshot(), indent=2))
+    finally:
+        with outbox._db:
+            outbox._conn.close()
+
+
+if __name__ == "__main__":
+    main()
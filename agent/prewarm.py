@@ -0,0 +1,244 @@
+"""
+Startup prewarming and readiness: build the graph and clients, open provider connections, load the
+KB index and parse prompt templates before the first ticket; readiness flips only once that is done
+
+    python -m agent.prewarm                                        # prewarm once and print step timings
+    python -m agent.prewarm bench --input config/x.json [--fake-llm] # first-ticket latency, cold vs prewarmed
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from clients.settings import env_flag, load_section
+
+
+def prewarm_enabled() -> bool:
+    return env_flag("PREWARM", bool(load_section("prewarm").get("enabled", False)))
+
+
+class Readiness:
+    """cold -> warming -> ready. A failed step is reported but does not hold readiness back:
+    the ticket path itself still works, only its first call pays the setup."""
+
+    def __init__(self):
+        self.state = "cold"
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.warm_ms: Optional[float] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._event.is_set()
+
+    def mark_ready(self) -> None:
+        with self._lock:
+            self.state = "ready"
+        self._event.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+    async def wait_async(self, poll_s: float = 0.05) -> None:
+        while not self._event.is_set():
+            await asyncio.sleep(poll_s)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "ready": self.ready,
+                "warm_ms": self.warm_ms,
+                "steps": {k: dict(v) for k, v in self.steps.items()},
+            }
+
+
+READINESS = Readiness()
+
+
+def _warm_graph() -> Dict[str, Any]:
+    import agent.graph  # noqa: F401  compiles the graph and constructs the COMMON/ATLAS clients
+
+    return {}
+
+
+def _warm_knowledge_base() -> Dict[str, Any]:
+    from clients.knowledge_base import get_knowledge_base
+
+    kb = get_knowledge_base()
+    # Sharded: loads every shard's files in its worker process
+    return {"files": len(kb.paths), "articles": kb.article_count()}
+
+
+def _warm_prompts() -> Dict[str, Any]:
+    from clients.atlas_client import PROMPTS as ATLAS_PROMPTS
+    from clients.common_client import PROMPTS as COMMON_PROMPTS
+    from clients.llm import prompt_template
+
+    templates = [*COMMON_PROMPTS.values(), *ATLAS_PROMPTS.values()]
+    for text in templates:
+        prompt = prompt_template(text)
+        # First render pulls in LangChain's message/formatting code paths
+        prompt.invoke({name: "" for name in prompt.input_variables}).to_string()
+    return {"templates": len(templates)}
+
+
+def _ping_provider(name: str) -> Dict[str, Any]:
+    from clients.llm import LIMITER, get_llm, rate_limit_enabled
+
+    llm = get_llm(name)
+    if llm is None:
+        return {"skipped": "unavailable"}
+    if rate_limit_enabled():
+        LIMITER.acquire(name, 4)
+    started = time.perf_counter()
+    llm.invoke("Reply with OK.")
+    return {"ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+def _warm_providers() -> Dict[str, Any]:
+    """One tiny request per available provider, so the HTTP/TLS connections used by tickets are open."""
+    from clients.llm import load_llm_config, provider_available
+
+    names = [n for n in load_llm_config().get("providers", {}) if provider_available(n)]
+    out: Dict[str, Any] = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(names))) as pool:
+        futures = {n: pool.submit(_ping_provider, n) for n in names}
+        for name, fut in futures.items():
+            try:
+                out[name] = fut.result()
+            except Exception as exc:
+                out[name] = {"error": f"{type(exc).__name__}: {exc}"}
+    return out
+
+
+def prewarm(ping_providers: Optional[bool] = None, readiness: Readiness = READINESS) -> Dict[str, Any]:
+    """Run the warm-up steps (KB, prompts and provider pings in parallel, after the graph build) and mark ready."""
+    if ping_providers is None:
+        ping_providers = bool(load_section("prewarm").get("ping_providers", True))
+    with readiness._lock:
+        if readiness.state in ("warming", "ready"):
+            already = True
+        else:
+            readiness.state = "warming"
+            already = False
+    if already:
+        readiness.wait()
+        return readiness.snapshot()
+
+    started = time.perf_counter()
+
+    def run(name: str, fn: Callable[[], Dict[str, Any]]) -> None:
+        t0 = time.perf_counter()
+        try:
+            detail = fn()
+            step: Dict[str, Any] = {"ms": round((time.perf_counter() - t0) * 1000, 1), **detail}
+        except Exception as exc:
+            step = {"ms": round((time.perf_counter() - t0) * 1000, 1), "error": f"{type(exc).__name__}: {exc}"}
+        with readiness._lock:
+            readiness.steps[name] = step
+
+    run("graph", _warm_graph)
+    parallel = {"knowledge_base": _warm_knowledge_base, "prompts": _warm_prompts}
+    if ping_providers:
+        parallel["providers"] = _warm_providers
+    with ThreadPoolExecutor(max_workers=len(parallel)) as pool:
+        list(pool.map(lambda item: run(*item), parallel.items()))
+    readiness.warm_ms = round((time.perf_counter() - started) * 1000, 1)
+    readiness.mark_ready()
+    return readiness.snapshot()
+
+
+def cold_warm_latency(seconds: List[float]) -> Dict[str, Any]:
+    """First ticket vs the median of the rest (seconds in, ms out)."""
+    if not seconds:
+        return {}
+    rest = seconds[1:]
+    out: Dict[str, Any] = {"first_ms": round(seconds[0] * 1000, 1)}
+    if rest:
+        steady = statistics.median(rest)
+        out["steady_p50_ms"] = round(steady * 1000, 1)
+        out["first_over_steady"] = round(seconds[0] / steady, 2) if steady else None
+    return out
+
+
+# -- cold vs warm benchmark ---------------------------------------------------------------------
+def _probe(input_path: str, tickets: int, warm: bool) -> Dict[str, Any]:
+    """Runs in a fresh process: optional prewarm, then `tickets` sequential runs of the input."""
+    t0 = time.perf_counter()
+    from agent.graph import checkpointer
+    from agent.runner import run_ticket
+
+    import_ms = (time.perf_counter() - t0) * 1000
+    report: Dict[str, Any] = {"import_ms": round(import_ms, 1)}
+    if warm:
+        report["prewarm"] = prewarm()
+    payload = json.loads(Path(input_path).read_text(encoding="utf-8"))
+
+    async def _run() -> List[float]:
+        seconds: List[float] = []
+        for i in range(tickets):
+            ticket = {**payload, "ticket_id": f"{payload['ticket_id']}-probe-{i}"}
+            started = time.perf_counter()
+            await run_ticket(ticket, ticket.get("customer_response", ""))
+            seconds.append(time.perf_counter() - started)
+            checkpointer.delete_thread(ticket["ticket_id"])
+        return seconds
+
+    seconds = asyncio.run(_run())
+    report["latency"] = cold_warm_latency(seconds)
+    # Imports + optional prewarm + first ticket: when the process could first have answered
+    report["first_result_ms"] = round((time.perf_counter() - t0 - sum(seconds[1:])) * 1000, 1)
+    return report
+
+
+def bench(input_path: str, tickets: int = 5, fake_llm: bool = False) -> Dict[str, Any]:
+    """First-ticket latency in a fresh process without and with prewarm (caches off so runs are comparable)."""
+    env = {**os.environ, "DEDUPE": "0", "RESPONSE_CACHE": "0", "ENTITY_CLASSIFIER": "0", "PREWARM": "0"}
+    if fake_llm:
+        env["LLM_FAKE_PROVIDERS"] = "1"
+    out: Dict[str, Any] = {}
+    for mode in ("cold", "warm"):
+        cmd = [sys.executable, "-m", "agent.prewarm", "_probe", "--input", input_path, "--tickets", str(tickets)]
+        if mode == "warm":
+            cmd.append("--warm")
+        proc = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True)
+        out[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+    cold, warm = out["cold"]["latency"], out["warm"]["latency"]
+    out["first_ticket_ms_saved"] = round(cold["first_ms"] - warm["first_ms"], 1)
+    return out
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    sub = parser.add_subparsers(dest="command")
+    b = sub.add_parser("bench", help="First-ticket latency in fresh processes, cold vs prewarmed")
+    b.add_argument("--input", required=True)
+    b.add_argument("--tickets", type=int, default=5)
+    b.add_argument("--fake-llm", action="store_true")
+    p = sub.add_parser("_probe")
+    p.add_argument("--input", required=True)
+    p.add_argument("--tickets", type=int, default=5)
+    p.add_argument("--warm", action="store_true")
+    parser.add_argument("--no-ping", action="store_true", help="Skip the provider connection requests")
+    args = parser.parse_args()
+    if args.command == "bench":
+        print(json.dumps(bench(args.input, args.tickets, args.fake_llm), indent=2))
+    elif args.command == "_probe":
+        print(json.dumps(_probe(args.input, args.tickets, args.warm)))
+    else:
+        print(json.dumps(prewarm(ping_providers=not args.no_ping), indent=2))
+
+
+if __name__ == "__main__":
+    main()
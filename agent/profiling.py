@@ -0,0 +1,207 @@
+"""
+Per-stage profiler for graph nodes: CPU vs await time per stage and sampled stacks
+written as flamegraph-compatible folded files
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+_STAGE: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("profiled_stage", default=None)
+_IDLE_FRAMES = {"select", "poll", "epoll", "kqueue", "_run_once"}
+_OUTSIDE = "(langgraph)"
+
+
+def wrap_node(fn: Callable, run: Callable[..., Awaitable[Any]]) -> Callable:
+    """Node wrapper that keeps `fn`'s signature: LangGraph only passes `config` to nodes that declare it."""
+    if "config" in inspect.signature(fn).parameters:
+        @functools.wraps(fn)
+        async def wrapper(state, config):
+            return await run(state, config)
+    else:
+        @functools.wraps(fn)
+        async def wrapper(state):
+            return await run(state)
+    return wrapper
+
+
+class _StepTimer:
+    """Drives a node coroutine step by step, charging loop-thread CPU of each step to the stage."""
+
+    def __init__(self, profiler: "StageProfiler", stage: str, coro):
+        self.profiler = profiler
+        self.stage = stage
+        self.coro = coro
+        self.cpu = 0.0
+
+    def __await__(self):
+        send, error = None, None
+        tid = threading.get_ident()
+        while True:
+            token = _STAGE.set(self.stage)
+            self.profiler._active[tid] = self.stage
+            started = time.thread_time()
+            try:
+                yielded = self.coro.throw(error) if error is not None else self.coro.send(send)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.cpu += time.thread_time() - started
+                self.profiler._active.pop(tid, None)
+                _STAGE.reset(token)
+            try:
+                send, error = (yield yielded), None
+            except GeneratorExit:
+                self.coro.close()
+                raise
+            except BaseException as exc:
+                send, error = None, exc
+
+
+class StageProfiler:
+    def __init__(self, interval_s: float = 0.005):
+        self.enabled = False
+        self.interval_s = interval_s
+        self._active: Dict[int, str] = {}
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(lambda: {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "offloaded_cpu_s": 0.0})
+        self._stacks: Dict[str, Counter] = defaultdict(Counter)
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread: Optional[int] = None
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    # -- instrumentation -------------------------------------------------
+    def node(self, stage: str, fn: Callable) -> Callable:
+        """Wrap an async graph node; a no-op passthrough unless profiling is enabled."""
+
+        async def _run(*args):
+            if not self.enabled:
+                return await fn(*args)
+            started = time.perf_counter()
+            timer = _StepTimer(self, stage, fn(*args))
+            try:
+                return await timer
+            finally:
+                self._record(stage, wall=time.perf_counter() - started, cpu=timer.cpu)
+
+        return wrap_node(fn, _run)
+
+    def offload(self, fn: Callable) -> Callable:
+        """Wrap a function passed to asyncio.to_thread so its thread CPU is charged to the calling stage."""
+        if not self.enabled:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            stage = _STAGE.get()
+            if stage is None:
+                return fn(*args, **kwargs)
+            tid = threading.get_ident()
+            self._active[tid] = stage
+            started = time.thread_time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._active.pop(tid, None)
+                self._record(stage, offloaded_cpu=time.thread_time() - started)
+        return wrapper
+
+    def _record(self, stage: str, wall: float = 0.0, cpu: float = 0.0, offloaded_cpu: float = 0.0) -> None:
+        with self._lock:
+            s = self._stats[stage]
+            if wall:
+                s["calls"] += 1
+            s["wall_s"] += wall
+            s["cpu_s"] += cpu
+            s["offloaded_cpu_s"] += offloaded_cpu
+
+    # -- sampling --------------------------------------------------------
+    def start(self) -> None:
+        self.enabled = True
+        self._loop_thread = threading.get_ident()
+        self._started = time.perf_counter()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="stage-profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self._elapsed += time.perf_counter() - self._started
+        self.enabled = False
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            frames = sys._current_frames()
+            active = dict(self._active)
+            for tid, frame in frames.items():
+                if tid == own:
+                    continue
+                stage = active.get(tid)
+                if stage is None:
+                    if tid != self._loop_thread or frame.f_code.co_name in _IDLE_FRAMES:
+                        continue
+                    stage = _OUTSIDE
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{Path(code.co_filename).stem}:{code.co_name}")
+                    frame = frame.f_back
+                with self._lock:
+                    self._stacks[stage][";".join(reversed(stack))] += 1
+
+    # -- reporting -------------------------------------------------------
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {k: dict(v) for k, v in self._stats.items()}
+            samples = {k: sum(v.values()) for k, v in self._stacks.items()}
+        stages = {}
+        for stage, s in stats.items():
+            stages[stage] = {
+                "calls": int(s["calls"]),
+                "wall_ms": round(s["wall_s"] * 1000, 2),
+                "cpu_ms": round(s["cpu_s"] * 1000, 2),
+                "await_ms": round(max(0.0, s["wall_s"] - s["cpu_s"]) * 1000, 2),
+                "offloaded_cpu_ms": round(s["offloaded_cpu_s"] * 1000, 2),
+                "samples": samples.get(stage, 0),
+            }
+        node_wall = sum(s["wall_s"] for s in stats.values())
+        return {
+            "interval_ms": self.interval_s * 1000,
+            "profiled_ms": round(self._elapsed * 1000, 2),
+            # Time not inside any node: LangGraph scheduling/checkpointing (only meaningful for sequential runs)
+            "outside_nodes_ms": round(max(0.0, self._elapsed - node_wall) * 1000, 2),
+            "stages": stages,
+            "outside_nodes_samples": samples.get(_OUTSIDE, 0),
+        }
+
+    def write(self, out_dir: str) -> Dict[str, Any]:
+        """Write <STAGE>.folded per stage, merged.folded (stage as root frame) and summary.json."""
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            stacks = {k: Counter(v) for k, v in self._stacks.items()}
+        merged = []
+        for stage, counter in sorted(stacks.items()):
+            lines = [f"{stack} {count}" for stack, count in counter.most_common()]
+            name = stage.strip("()") if stage == _OUTSIDE else stage
+            (out / f"{name}.folded").write_text("\n".join(lines) + "\n", encoding="utf-8")
+            merged.extend(f"{stage};{line}" for line in lines)
+        (out / "merged.folded").write_text("\n".join(merged) + "\n", encoding="utf-8")
+        summary = self.summary()
+        (out / "summary.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        return summary
+
+
+PROFILER = StageProfiler()
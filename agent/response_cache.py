@@ -0,0 +1,126 @@
+"""
+Template-level cache for response_generation: replies for the same issue, KB article and route
+are stored with the customer-specific slots parameterized and re-filled for later tickets
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from string import Template
+from typing import Any, Dict, Optional, Tuple
+
+from clients.settings import env_flag, load_section
+
+_IDENTIFIER_RE = re.compile(r"[\w-]*\d[\w-]*\d[\w-]*|\S+@\S+")
+# Shorter slot values are not parameterized (too likely to be ordinary words); a reply quoting one is not cached
+_MIN_SLOT_LEN = 3
+
+
+def template_key(state: Dict[str, Any]) -> Tuple[str, str, str, str]:
+    entities = state.get("entities") or {}
+    retrieved = state.get("retrieved_data") or {}
+    article = str(retrieved.get("article_id") or retrieved.get("data", ""))[:200]
+    return (
+        str(entities.get("issue_type", "")).strip().lower(),
+        str(entities.get("affected_component", "")).strip().lower(),
+        article,
+        str(state.get("route", "")),
+    )
+
+
+def customer_slots(state: Dict[str, Any]) -> Dict[str, str]:
+    name = str(state.get("customer_name", "")).strip()
+    slots = {"customer_name": name, "email": str(state.get("email", "")), "ticket_id": str(state.get("ticket_id", ""))}
+    slots["first_name"] = name.split()[0] if name else ""
+    return {k: v for k, v in slots.items() if v}
+
+
+def _whole_word(value: str) -> "re.Pattern[str]":
+    # Word boundaries, also for values that start or end with a non-word character
+    return re.compile(rf"(?<!\w){re.escape(value)}(?!\w)")
+
+
+def parameterize(text: str, slots: Dict[str, str]) -> str:
+    """Turn a generated reply into a `string.Template`, replacing whole-word slot values (longest first)."""
+    template = text.replace("$", "$$")
+    for name, value in sorted(slots.items(), key=lambda kv: -len(kv[1])):
+        if len(value) >= _MIN_SLOT_LEN:
+            template = _whole_word(value.replace("$", "$$")).sub(lambda _: "${" + name + "}", template)
+    return template
+
+
+class ResponseTemplateCache:
+    def __init__(self, capacity: int = 256, ttl_s: float = 3600.0, max_uses: int = 50):
+        self.capacity = capacity
+        self.ttl_s = ttl_s
+        self.max_uses = max_uses
+        self._entries: "OrderedDict[Tuple[str, ...], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"lookups": 0, "hits": 0, "stored": 0, "rejected": 0, "refreshed": 0, "expired": 0, "evicted": 0}
+
+    def get(self, key: Tuple[str, ...], slots: Dict[str, str]) -> Optional[str]:
+        with self._lock:
+            self._counts["lookups"] += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["stored_at"] > self.ttl_s:
+                del self._entries[key]
+                self._counts["expired"] += 1
+                return None
+            if not entry["slots"] <= slots.keys():
+                return None  # this ticket cannot fill every slot the template needs
+            entry["uses"] += 1
+            if entry["uses"] >= self.max_uses:
+                # Serve this one, then force a fresh generation for the next ticket
+                del self._entries[key]
+                self._counts["refreshed"] += 1
+            else:
+                self._entries.move_to_end(key)
+            self._counts["hits"] += 1
+            template = entry["template"]
+        return Template(template).substitute(slots)
+
+    def put(self, key: Tuple[str, ...], text: str, slots: Dict[str, str], query: str = "") -> bool:
+        """Store `text` as a template; refused if it quotes identifiers from this customer's query."""
+        if not text or not key[0]:
+            return False
+        ticket_specific = set(_IDENTIFIER_RE.findall(query)) - set(slots.values())
+        too_short = [v for v in slots.values() if len(v) < _MIN_SLOT_LEN]
+        if any(token in text for token in ticket_specific) or any(_whole_word(v).search(text) for v in too_short):
+            with self._lock:
+                self._counts["rejected"] += 1
+            return False
+        template = parameterize(text, slots)
+        used = {m.group("braced") for m in Template.pattern.finditer(template) if m.group("braced")}
+        with self._lock:
+            self._entries[key] = {"template": template, "slots": used, "uses": 0, "stored_at": time.time()}
+            self._entries.move_to_end(key)
+            self._counts["stored"] += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self._counts["evicted"] += 1
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            size = len(self._entries)
+        return {
+            "size": size,
+            "max_uses": self.max_uses,
+            **counts,
+            "hit_rate": round(counts["hits"] / counts["lookups"], 3) if counts["lookups"] else 0.0,
+        }
+
+
+def build_response_cache() -> Optional[ResponseTemplateCache]:
+    cfg = load_section("response_cache")
+    if not env_flag("RESPONSE_CACHE", bool(cfg.get("enabled", False))):
+        return None
+    return ResponseTemplateCache(
+        capacity=int(cfg.get("capacity", 256)),
+        ttl_s=float(cfg.get("ttl_s", 3600)),
+        max_uses=int(cfg.get("max_uses", 50)),
+    )
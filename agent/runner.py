@@ -0,0 +1,141 @@
+"""
+Run, pause and resume tickets on the compiled graph
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langgraph.types import Command
+
+from agent.graph import audit_log_of, checkpointer, graph
+from agent.memory import MEMORY
+from agent.scheduler import EdfQueue, SlaPolicy
+from schemas.agent_state import new_agent_state
+
+
+def thread_config(ticket_id: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": ticket_id}}
+
+
+def ticket_state(ticket_id: str) -> Dict[str, Any]:
+    return graph.get_state(thread_config(ticket_id)).values
+
+
+def final_output_for(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Final structured payload plus logs, as printed by `main.py --json`."""
+    logs = audit_log_of(state)
+    priority_score = {"critical": 98, "high": 90, "medium": 80}.get(str(state.get("priority", "")).lower(), 70)
+    return {
+        "final_payload": {
+            "ticket_id": state.get("ticket_id"),
+            "customer_name": state.get("customer_name"),
+            "email": state.get("email"),
+            "query": state.get("query"),
+            "priority": state.get("priority"),
+            "entities": state.get("structured_data", {}).get("entities", state.get("entities", {})),
+            "normalized_fields": {
+                "priority_score": priority_score,
+                "sla_risk": state.get("flags", {}).get("sla_risk", "Low").title(),
+                "ticket_status": state.get("status", "resolved").title(),
+            },
+            "retrieved_info": [
+                {
+                    "source": "Knowledge Base",
+                    "content": state.get("retrieved_data", {}).get("data", "")
+                }
+            ],
+            "decision": {
+                "solution_score": state.get("solution_score", 0),
+                "escalated": bool(state.get("escalate", False)),
+                "assigned_to": "Automated Resolution" if not state.get("escalate", False) else str(state.get("escalation_path", "")),
+                "reason": state.get("decision_reason", ""),
+                "reused_from": state.get("reused_from") or None
+            },
+            "response": state.get("solution_summary", ""),
+            "retrieval_summary": state.get("retrieval_summary", ""),
+            "actions_taken": [a.get("action", "").replace("_", " ").title() for a in logs if a.get("stage")=="DO" and a.get("action")]
+        },
+        "logs": logs
+    }
+
+
+def pending_clarification(ticket_id: str) -> Optional[Dict[str, Any]]:
+    """Interrupt payload if the ticket is paused at WAIT, otherwise None."""
+    snapshot = graph.get_state(thread_config(ticket_id))
+    if not snapshot.next or not snapshot.interrupts:
+        return None
+    value = snapshot.interrupts[0].value
+    return value if isinstance(value, dict) else {"question": str(value)}
+
+
+async def run_ticket(payload: Dict[str, Any], customer_response: str = "") -> Dict[str, Any]:
+    """Run a new ticket until it completes or pauses for a customer reply."""
+    config = thread_config(payload["ticket_id"])
+    async for _ in graph.astream(new_agent_state(payload, customer_response), config=config):
+        pass
+    return graph.get_state(config).values
+
+
+async def resume_ticket(ticket_id: str, customer_response: str) -> Dict[str, Any]:
+    """Continue a ticket paused at WAIT from its checkpoint; earlier stages are not re-run."""
+    config = thread_config(ticket_id)
+    async for _ in graph.astream(Command(resume=customer_response), config=config):
+        pass
+    return graph.get_state(config).values
+
+
+async def stream_ticket(ticket_id: str, graph_input: Any) -> AsyncIterator[Dict[str, Any]]:
+    """Yield an event per completed stage, and an `interrupt` event if the ticket pauses at WAIT.
+
+    `graph_input` is a fresh state from `new_agent_state` or a `Command(resume=...)`.
+    """
+    async for chunk in graph.astream(graph_input, config=thread_config(ticket_id), stream_mode="updates"):
+        for stage, update in chunk.items():
+            if stage == "__interrupt__":
+                value = update[0].value if update else {}
+                yield {"event": "interrupt", "stage": "WAIT", **(value if isinstance(value, dict) else {"question": str(value)})}
+                continue
+            update = update or {}
+            if update.get("audit_log"):
+                status = update["audit_log"][-1].get("status")
+            else:
+                status = update.get("audit_ref", {}).get("stages", {}).get(stage)
+            yield {"event": "stage", "stage": stage, "status": status or "Completed"}
+
+
+async def run_batch(payloads: List[Dict[str, Any]], concurrency: int = 8, policy: Optional[SlaPolicy] = None, release: bool = True, keep_output: bool = True) -> Dict[str, Any]:
+    """Run many tickets with `concurrency` in flight, admitted earliest SLA deadline first.
+
+    With `release`, checkpoints of finished tickets are dropped once their output is captured;
+    tickets awaiting a customer reply keep theirs so they can be resumed. `keep_output=False`
+    keeps only status and timings per ticket (memory benchmarks, where outputs would dominate).
+    """
+    queue = EdfQueue(policy=policy)
+    for payload in payloads:
+        queue.push_nowait(payload, payload)
+    results: List[Dict[str, Any]] = []
+
+    async def _worker() -> None:
+        while not queue.empty():
+            admission, payload = await queue.pop()
+            started = time.time()
+            entry = {"ticket_id": payload["ticket_id"], "priority_class": admission.priority_class, "order": len(results)}
+            results.append(entry)
+            try:
+                state = await run_ticket(payload, payload.get("customer_response", ""))
+                clarification = pending_clarification(payload["ticket_id"])
+                entry["status"] = "awaiting_customer" if clarification else "completed"
+                if keep_output:
+                    entry["output"] = {"clarification": clarification} if clarification else await asyncio.to_thread(final_output_for, state)
+            except Exception as exc:
+                entry["status"] = "failed"
+                entry["error"] = f"{type(exc).__name__}: {exc}"
+            if release and entry["status"] != "awaiting_customer":
+                checkpointer.delete_thread(payload["ticket_id"])
+            MEMORY.ticket_done()
+            entry["seconds"] = round(time.time() - started, 3)
+            entry["met_deadline"] = time.time() <= admission.deadline
+
+    await asyncio.gather(*(_worker() for _ in range(max(1, concurrency))))
+    return {"tickets": results, "queue_wait": queue.metrics.snapshot()}
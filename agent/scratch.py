@@ -0,0 +1,39 @@
+"""
+Per-thread scratch space for transient stage data that is kept out of checkpoints
+"""
+
+import threading
+from typing import Any, Dict
+
+from langchain_core.runnables import RunnableConfig
+
+from schemas.agent_state import StageScratch
+
+
+def thread_id_of(config: RunnableConfig | None) -> str:
+    return str(((config or {}).get("configurable") or {}).get("thread_id", ""))
+
+
+class ScratchStore:
+    def __init__(self):
+        self._data: Dict[str, StageScratch] = {}
+        self._lock = threading.Lock()
+
+    def get(self, thread_id: str) -> StageScratch:
+        with self._lock:
+            return dict(self._data.get(thread_id, {}))  # type: ignore[return-value]
+
+    def update(self, thread_id: str, **values: Any) -> None:
+        with self._lock:
+            self._data.setdefault(thread_id, {}).update(values)  # type: ignore[typeddict-item]
+
+    def release(self, thread_id: str) -> None:
+        with self._lock:
+            self._data.pop(thread_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+SCRATCH = ScratchStore()
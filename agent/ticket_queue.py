@@ -0,0 +1,236 @@
+"""
+Durable local ticket queue (SQLite) shared by worker processes
+
+Delivery is at-least-once: a claimed ticket is leased for `visibility_s` seconds and becomes
+visible to other workers again if it is neither acked nor its lease extended before then.
+Methods are safe to call from worker threads (`asyncio.to_thread`); one lock serialises use of the connection.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from agent.scheduler import SlaPolicy
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ticket_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'ready',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    visible_at REAL NOT NULL,
+    lease_token TEXT,
+    lease_owner TEXT,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT,
+    priority_class TEXT,
+    deadline REAL,
+    sort_key REAL
+);
+"""
+
+_COLUMNS = {"priority_class": "TEXT", "deadline": "REAL", "sort_key": "REAL"}
+
+
+@dataclass
+class Lease:
+    id: int
+    ticket_id: str
+    payload: Dict[str, Any]
+    token: str
+    attempts: int
+    enqueued_at: float
+    priority_class: str = ""
+    deadline: float = 0.0
+
+
+class TicketQueue:
+    def __init__(self, path: str, max_attempts: int = 3, policy: Optional[SlaPolicy] = None):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.policy = policy or SlaPolicy()
+        self._db = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(ticket_queue)")}
+        for name, kind in _COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE ticket_queue ADD COLUMN {name} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ticket_queue_edf ON ticket_queue (status, sort_key, id)")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _tx(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def enqueue(self, payload: Dict[str, Any], delay_s: float = 0.0) -> int:
+        return self.enqueue_many([payload], delay_s)[0]
+
+    def enqueue_many(self, payloads: List[Dict[str, Any]], delay_s: float = 0.0) -> List[int]:
+        now = time.time()
+        with self._db:
+            return self._enqueue(payloads, now, delay_s)
+
+    def _enqueue(self, payloads: List[Dict[str, Any]], now: float, delay_s: float) -> List[int]:
+        conn = self._tx()
+        try:
+            ids = []
+            for p in payloads:
+                admission = self.policy.admit(p, now)
+                ids.append(conn.execute(
+                    "INSERT INTO ticket_queue (ticket_id, payload, enqueued_at, visible_at, priority_class, deadline, sort_key) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (str(p["ticket_id"]), json.dumps(p), now, now + delay_s, admission.priority_class, admission.deadline, admission.sort_key),
+                ).lastrowid)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    def claim(self, owner: str, limit: int, visibility_s: float) -> List[Lease]:
+        """Lease up to `limit` visible tickets (ready or lease expired), earliest effective deadline first."""
+        if limit <= 0:
+            return []
+        with self._db:
+            return self._claim(owner, limit, visibility_s, time.time())
+
+    def _claim(self, owner: str, limit: int, visibility_s: float, now: float) -> List[Lease]:
+        conn = self._tx()
+        try:
+            # Expired leases that already used every attempt are dead-lettered instead of redelivered
+            conn.execute(
+                "UPDATE ticket_queue SET status='dead', error=COALESCE(error, 'visibility timeout'), finished_at=? "
+                "WHERE status='leased' AND visible_at<=? AND attempts>=?",
+                (now, now, self.max_attempts),
+            )
+            rows = conn.execute(
+                "SELECT id, ticket_id, payload, attempts, enqueued_at, priority_class, deadline FROM ticket_queue "
+                "WHERE status IN ('ready', 'leased') AND visible_at<=? ORDER BY sort_key, id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            leases = []
+            for row_id, ticket_id, payload, attempts, enqueued_at, priority_class, deadline in rows:
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE ticket_queue SET status='leased', attempts=attempts+1, visible_at=?, lease_token=?, lease_owner=?, started_at=? WHERE id=?",
+                    (now + visibility_s, token, owner, now, row_id),
+                )
+                leases.append(Lease(row_id, ticket_id, json.loads(payload), token, attempts + 1, enqueued_at, priority_class or "", deadline or 0.0))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return leases
+
+    def extend(self, lease: Lease, visibility_s: float) -> bool:
+        """Heartbeat: push the lease deadline out. False if the lease was lost to another worker."""
+        with self._db:
+            cur = self._conn.execute(
+                "UPDATE ticket_queue SET visible_at=? WHERE id=? AND lease_token=? AND status='leased'",
+                (time.time() + visibility_s, lease.id, lease.token),
+            )
+        return cur.rowcount == 1
+
+    def ack(self, lease: Lease, result: Optional[Dict[str, Any]] = None) -> bool:
+        with self._db:
+            cur = self._conn.execute(
+                "UPDATE ticket_queue SET status='done', finished_at=?, result=?, lease_token=NULL WHERE id=? AND lease_token=?",
+                (time.time(), json.dumps(result) if result is not None else None, lease.id, lease.token),
+            )
+        return cur.rowcount == 1
+
+    def nack(self, lease: Lease, error: str, retry_delay_s: float = 1.0) -> bool:
+        """Return a failed ticket for redelivery, or dead-letter it once attempts are exhausted."""
+        now = time.time()
+        status = "dead" if lease.attempts >= self.max_attempts else "ready"
+        with self._db:
+            cur = self._conn.execute(
+                "UPDATE ticket_queue SET status=?, visible_at=?, error=?, lease_token=NULL, finished_at=? WHERE id=? AND lease_token=?",
+                (status, now + retry_delay_s, error, now if status == "dead" else None, lease.id, lease.token),
+            )
+        return cur.rowcount == 1
+
+    def release(self, lease: Lease) -> bool:
+        """Give a lease back without spending an attempt (a ticket cut off by a worker's drain)."""
+        with self._db:
+            cur = self._conn.execute(
+                "UPDATE ticket_queue SET status='ready', visible_at=?, attempts=MAX(attempts-1, 0), lease_token=NULL WHERE id=? AND lease_token=?",
+                (time.time(), lease.id, lease.token),
+            )
+        return cur.rowcount == 1
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM ticket_queue GROUP BY status").fetchall())
+        expired = self._conn.execute(
+            "SELECT COUNT(*) FROM ticket_queue WHERE status='leased' AND visible_at<=?", (now,)
+        ).fetchone()[0]
+        redelivered = self._conn.execute("SELECT COUNT(*) FROM ticket_queue WHERE attempts>1").fetchone()[0]
+        return {
+            "ready": counts.get("ready", 0),
+            "leased": counts.get("leased", 0),
+            "expired_leases": expired,
+            "done": counts.get("done", 0),
+            "dead": counts.get("dead", 0),
+            "redelivered": redelivered,
+        }
+
+    def wait_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Queue wait (enqueue to last claim) per priority class, and tickets claimed after their SLA deadline."""
+        rows = self._conn.execute(
+            "SELECT COALESCE(priority_class, ''), started_at - enqueued_at, started_at > deadline, sort_key < deadline AND started_at >= sort_key "
+            "FROM ticket_queue WHERE started_at IS NOT NULL ORDER BY priority_class, started_at - enqueued_at"
+        ).fetchall()
+        out: Dict[str, Dict[str, Any]] = {}
+        for name in dict.fromkeys(r[0] for r in rows):
+            waits = [r[1] for r in rows if r[0] == name]
+            pick = lambda pct: round(waits[min(len(waits) - 1, int(round(pct / 100 * (len(waits) - 1))))] * 1000, 1)
+            out[name or "unclassified"] = {
+                "dispatched": len(waits),
+                "missed_deadline": sum(1 for r in rows if r[0] == name and r[2]),
+                "promoted": sum(1 for r in rows if r[0] == name and r[3]),
+                "wait_p50_ms": pick(50),
+                "wait_p95_ms": pick(95),
+                "wait_p99_ms": pick(99),
+            }
+        return out
+
+    def pending(self) -> int:
+        with self._db:
+            return self._conn.execute("SELECT COUNT(*) FROM ticket_queue WHERE status IN ('ready', 'leased')").fetchone()[0]
+
+    def payload(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        """Payload of the ticket's latest queue entry, or None if it was never enqueued."""
+        with self._db:
+            row = self._conn.execute("SELECT payload FROM ticket_queue WHERE ticket_id=? ORDER BY id DESC LIMIT 1", (ticket_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def results(self, ticket_id: str) -> List[Dict[str, Any]]:
+        rows = self._conn.execute(
+            "SELECT id, status, attempts, enqueued_at, started_at, finished_at, result, error FROM ticket_queue WHERE ticket_id=? ORDER BY id",
+            (ticket_id,),
+        ).fetchall()
+        return [
+            {
+                "id": r[0], "status": r[1], "attempts": r[2], "enqueued_at": r[3], "started_at": r[4],
+                "finished_at": r[5], "result": json.loads(r[6]) if r[6] else None, "error": r[7],
+            }
+            for r in rows
+        ]
+
+
+def default_queue_path() -> str:
+    return os.getenv("TICKET_QUEUE_DB", ".ticket_queue.db")
@@ -0,0 +1,89 @@
+"""
+Offline stand-in for a chat model provider, used to exercise routing,
+failover and load behaviour without network access or API keys
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Any, Dict
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+
+class FakeProviderError(RuntimeError):
+    pass
+
+
+class FakeRateLimitError(FakeProviderError):
+    status_code = 429
+
+
+_ENTITY_RULES = [
+    (("2fa", "authenticator", "otp", "code"), {"issue_type": "Authentication", "affected_component": "Two-Factor Authentication", "request_type": "account access recovery"}),
+    (("password", "reset"), {"issue_type": "Authentication", "affected_component": "Password Reset", "request_type": "account access recovery"}),
+    (("transfer", "bank", "beneficiary", "credited"), {"issue_type": "Banking", "affected_component": "Transfers", "request_type": "transaction trace"}),
+    (("payment", "charge", "refund", "invoice"), {"issue_type": "Payment", "affected_component": "Billing", "request_type": "refund"}),
+    (("delivery", "courier", "transit", "shipment", "package"), {"issue_type": "Delivery", "affected_component": "Shipping", "request_type": "delivery status"}),
+]
+
+
+def _prompt_text(prompt: Any) -> str:
+    if hasattr(prompt, "to_string"):
+        return prompt.to_string()
+    if isinstance(prompt, list):
+        return "\n".join(str(getattr(m, "content", m)) for m in prompt)
+    return str(prompt)
+
+
+def _fake_entities(text: str) -> Dict[str, Any]:
+    # Only look at the customer query, not at the guidance in the prompt itself
+    lowered = text.rsplit("Query:", 1)[-1].lower()
+    for keywords, entities in _ENTITY_RULES:
+        if any(k in lowered for k in keywords):
+            return {**entities, "problem_description": [f"{entities['affected_component']} issue"]}
+    return {"issue_type": "General Issue", "affected_component": "General", "problem_description": [], "request_type": "information"}
+
+
+def _fake_reply(name: str, text: str) -> str:
+    if "JSON" in text:
+        return json.dumps({"entities": _fake_entities(text), "score": 75, "reason": f"fake provider {name}"})
+    if "Original:" in text:
+        return text.split("Original:", 1)[1].split("\n", 1)[0].strip()
+    return f"[{name}] Thanks for reaching out, we are looking into this and will follow up shortly."
+
+
+def build_fake_llm(name: str, latency_ms: float = 50, jitter_ms: float = 0, fail_rate: float = 0.0, throttle_rate: float = 0.0, seed: int | None = None, connect_ms: float = 0):
+    rng = random.Random(seed)
+    # `connect_ms` is charged once, to the first call, like opening the provider's HTTP/TLS connection
+    unconnected = threading.Lock()
+    connected = [connect_ms <= 0]
+
+    def _delay() -> float:
+        setup = 0.0
+        if not connected[0]:
+            with unconnected:
+                if not connected[0]:
+                    connected[0] = True
+                    setup = connect_ms
+        return (setup + max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms))) / 1000
+
+    def _respond(prompt: Any) -> AIMessage:
+        if rng.random() < fail_rate:
+            raise FakeProviderError(f"Injected failure from fake provider '{name}'")
+        if rng.random() < throttle_rate:
+            raise FakeRateLimitError(f"429 Too Many Requests (injected by fake provider '{name}')")
+        return AIMessage(content=_fake_reply(name, _prompt_text(prompt)))
+
+    def _invoke(prompt: Any) -> AIMessage:
+        time.sleep(_delay())
+        return _respond(prompt)
+
+    async def _ainvoke(prompt: Any) -> AIMessage:
+        await asyncio.sleep(_delay())
+        return _respond(prompt)
+
+    return RunnableLambda(_invoke, afunc=_ainvoke, name=f"fake:{name}")
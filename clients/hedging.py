@@ -0,0 +1,165 @@
+"""
+Hedged LLM requests: when the primary provider is slower than its recent
+latency percentile, the same prompt is sent to a secondary provider and the
+first valid response wins.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            return len(self._samples.get(key, ()))
+
+    def percentile(self, key: str, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if not samples:
+            return None
+        idx = int(round(pct / 100 * (len(samples) - 1)))
+        return samples[min(len(samples) - 1, max(0, idx))]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            keys = list(self._samples)
+        out = {}
+        for key in keys:
+            out[key] = {
+                "count": self.count(key),
+                "p50_ms": round((self.percentile(key, 50) or 0) * 1000, 1),
+                "p95_ms": round((self.percentile(key, 95) or 0) * 1000, 1),
+                "p99_ms": round((self.percentile(key, 99) or 0) * 1000, 1),
+            }
+        return out
+
+
+class HedgeStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_ability: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, ability: str, primary: str, winner: Optional[str], hedged: bool, abandoned: int) -> None:
+        with self._lock:
+            s = self._by_ability.setdefault(ability, {
+                "requests": 0, "hedged": 0, "primary_wins": 0, "secondary_wins": 0,
+                "failures": 0, "abandoned": 0, "wins": {},
+            })
+            s["requests"] += 1
+            s["abandoned"] += abandoned
+            if hedged:
+                s["hedged"] += 1
+            if winner is None:
+                s["failures"] += 1
+                return
+            if winner == primary:
+                s["primary_wins"] += 1
+            else:
+                s["secondary_wins"] += 1
+            if hedged:
+                s["wins"][winner] = s["wins"].get(winner, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            out = {}
+            for ability, s in self._by_ability.items():
+                out[ability] = {
+                    **s,
+                    "wins": dict(s["wins"]),
+                    "hedge_rate": round(s["hedged"] / s["requests"], 3) if s["requests"] else 0.0,
+                    "secondary_win_rate": round(s["secondary_wins"] / s["hedged"], 3) if s["hedged"] else 0.0,
+                }
+            return out
+
+
+class HedgedInvoker:
+    """Runs `call(provider)` against a primary and, if needed, a secondary provider.
+
+    The hedge fires once the primary has been outstanding longer than its
+    observed latency percentile (or immediately if the primary fails first).
+    Sync callers run on a dedicated thread pool; threads cannot be interrupted,
+    so a losing sync call is cancelled if still queued and otherwise abandoned
+    with its result discarded. Async callers get real task cancellation.
+    """
+
+    def __init__(
+        self,
+        latency: LatencyTracker,
+        percentile: float = 95.0,
+        min_delay: float = 0.2,
+        initial_delay: float = 2.0,
+        min_samples: int = 20,
+        max_workers: int = 16,
+    ):
+        self.latency = latency
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.stats = HedgeStats()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+
+    def hedge_delay(self, primary: str) -> float:
+        if self.latency.count(primary) < self.min_samples:
+            return self.initial_delay
+        observed = self.latency.percentile(primary, self.percentile)
+        return max(self.min_delay, observed if observed is not None else self.initial_delay)
+
+    def invoke(self, ability: str, call: Callable[[str], Any], primary: str, secondary: str) -> Any:
+        futures = {self._pool.submit(call, primary): primary}
+        done, _ = wait(futures, timeout=self.hedge_delay(primary))
+        if not done or next(iter(done)).exception() is not None:
+            futures[self._pool.submit(call, secondary)] = secondary
+        hedged = len(futures) > 1
+        pending = set(futures)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    self.stats.record(ability, primary, futures[fut], hedged, len(pending))
+                    return fut.result()
+                error = fut.exception()
+        self.stats.record(ability, primary, None, hedged, 0)
+        assert error is not None
+        raise error
+
+    async def ainvoke(
+        self, ability: str, call: Callable[[str], Awaitable[Any]], primary: str, secondary: str
+    ) -> Any:
+        tasks = {asyncio.ensure_future(call(primary)): primary}
+        pending = set(tasks)
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_delay(primary))
+            if not done or next(iter(done)).exception() is not None:
+                tasks[asyncio.ensure_future(call(secondary))] = secondary
+                pending = set(tasks)
+            hedged = len(tasks) > 1
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.stats.record(ability, primary, tasks[task], hedged, len(pending))
+                        return task.result()
+                    error = task.exception()
+            self.stats.record(ability, primary, None, hedged, 0)
+            assert error is not None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
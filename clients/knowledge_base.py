@@ -0,0 +1,358 @@
+"""
+Knowledge base articles from KB_PATHS / KB_PATH, parsed once per file version instead of on every search.
+Large corpora are split into shards searched in parallel, one worker process per shard
+
+    python -m clients.knowledge_base bench [--files 400 --articles 50 | --kb-paths DIR] [--workers 1,2,4]
+"""
+
+import atexit
+import heapq
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from clients.settings import env_flag, load_section
+
+DEFAULT_KB_PATH = "config/knowledge_base.json"
+
+# (score, file index, article index, id, content): sorting ascending on (-score, file, article)
+# keeps the single-threaded rule that the first article in KB_PATHS order wins a tie
+Hit = Tuple[int, int, int, str, str]
+
+
+def kb_paths(spec: Optional[str] = None) -> List[Path]:
+    """`;`-separated files or directories (all *.json inside), in order; missing entries are skipped."""
+    spec = spec or os.getenv("KB_PATHS") or os.getenv("KB_PATH") or DEFAULT_KB_PATH
+    paths: List[Path] = []
+    for p in spec.split(";"):
+        pp = Path(p.strip())
+        if not pp.exists():
+            continue
+        if pp.is_dir():
+            paths.extend(sorted(pp.glob("*.json")))
+        else:
+            paths.append(pp)
+    return paths
+
+
+def _signature(paths: List[Path]) -> Tuple:
+    out = []
+    for p in paths:
+        st = p.stat()
+        out.append((str(p), st.st_mtime_ns, st.st_size))
+    return tuple(out)
+
+
+def _parse(file: Path) -> List[Dict[str, Any]]:
+    data = json.loads(file.read_text(encoding="utf-8"))
+    return [
+        {"id": art.get("id", ""), "content": art.get("content", ""), "tags": tuple(str(t).lower() for t in art.get("tags", []))}
+        for art in data.get("articles", [])
+    ]
+
+
+def _query_text(query: str, entities: Dict[str, Any]) -> Tuple[str, str]:
+    return str(query).lower(), " ".join([str(v).lower() for v in (entities or {}).values() if isinstance(v, str)])
+
+
+def _scan(articles: List[Dict[str, Any]], file_index: int, q: str, ent_text: str, k: int) -> List[Hit]:
+    """Best `k` articles of one file by tag hits in the query plus tag hits in the entity values."""
+    hits: List[Hit] = []
+    for i, art in enumerate(articles):
+        hit = sum(1 for t in art["tags"] if t in q) + sum(1 for t in art["tags"] if t in ent_text)
+        if hit > 0:
+            hits.append((hit, file_index, i, art["id"], art["content"]))
+    return heapq.nsmallest(k, hits, key=lambda h: (-h[0], h[1], h[2]))
+
+
+def _merge(parts: List[List[Hit]], k: int) -> List[Hit]:
+    return heapq.nsmallest(k, (h for part in parts for h in part), key=lambda h: (-h[0], h[1], h[2]))
+
+
+def _result(hits: List[Hit]) -> Dict[str, Any]:
+    if not hits:
+        return {"data": "", "article_id": ""}
+    return {"data": hits[0][4], "article_id": hits[0][3]}
+
+
+class KnowledgeBase:
+    def __init__(self, paths: List[Path]):
+        self.paths = paths
+        self.signature = _signature(paths)
+        self.files: List[List[Dict[str, Any]]] = [_parse(file) for file in paths]
+        self.articles: List[Dict[str, Any]] = [art for arts in self.files for art in arts]
+
+    def article_count(self) -> int:
+        return len(self.articles)
+
+    def top_k(self, query: str, entities: Dict[str, Any], k: int = 5) -> List[Hit]:
+        q, ent_text = _query_text(query, entities)
+        return _merge([_scan(arts, i, q, ent_text, k) for i, arts in enumerate(self.files)], k)
+
+    def search(self, query: str, entities: Dict[str, Any]) -> Dict[str, Any]:
+        """Best article by tag hits in the query plus tag hits in the entity values (first wins ties)."""
+        if not self.paths:
+            return {"data": ""}
+        return _result(self.top_k(query, entities, 1))
+
+
+# -- sharded search -----------------------------------------------------------------------------
+# Per worker process: path -> (signature, parsed articles) for the files of its shard
+_SHARD_FILES: Dict[str, Tuple[Tuple, List[Dict[str, Any]]]] = {}
+
+
+def _search_shard(files: List[Tuple[int, str, int, int]], q: str, ent_text: str, k: int) -> Tuple[int, List[Hit]]:
+    """Runs in a shard's process: (re)parse changed files, forget ones moved away, scan the rest."""
+    wanted = {path for _, path, _, _ in files}
+    for path in [p for p in _SHARD_FILES if p not in wanted]:
+        del _SHARD_FILES[path]
+    parts: List[List[Hit]] = []
+    count = 0
+    for index, path, mtime_ns, size in files:
+        cached = _SHARD_FILES.get(path)
+        if cached is None or cached[0] != (mtime_ns, size):
+            cached = ((mtime_ns, size), _parse(Path(path)))
+            _SHARD_FILES[path] = cached
+        count += len(cached[1])
+        if k:
+            parts.append(_scan(cached[1], index, q, ent_text, k))
+    return count, _merge(parts, k) if k else []
+
+
+class ShardedKnowledgeBase:
+    """KB files split into `workers` shards by size, each pinned to its own single-process executor so a
+    file is parsed by exactly one process. Queries fan out to every shard and the top-k lists are merged.
+
+    `update` takes the current file list: new files go to the lightest shard, removed files are dropped,
+    and while the heaviest shard exceeds `rebalance_ratio` x the mean, files move to the lightest one.
+    """
+
+    def __init__(self, workers: int, top_k: int = 5, rebalance_ratio: float = 1.25, start_method: str = "spawn"):
+        self.workers = max(1, workers)
+        self.k = top_k
+        self.rebalance_ratio = rebalance_ratio
+        ctx = multiprocessing.get_context(start_method)
+        self._pools = [ProcessPoolExecutor(max_workers=1, mp_context=ctx) for _ in range(self.workers)]
+        self.paths: List[Path] = []
+        self.signature: Tuple = ()
+        self._assignment: Dict[str, int] = {}
+        self._shards: List[List[Tuple[int, str, int, int]]] = [[] for _ in range(self.workers)]
+        self._stats = {"searches": 0, "rebalances": 0, "files_moved": 0, "search_ms": 0.0}
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _loads(self, sizes: Dict[str, int]) -> List[int]:
+        loads = [0] * self.workers
+        for path, shard in self._assignment.items():
+            loads[shard] += sizes[path]
+        return loads
+
+    def update(self, paths: List[Path], signature: Tuple) -> None:
+        if signature == self.signature:
+            return
+        sizes = {path: size for path, _, size in signature}
+        self._assignment = {p: s for p, s in self._assignment.items() if p in sizes}
+        loads = self._loads(sizes)
+        # Largest new files first onto the lightest shard
+        for path in sorted((p for p in sizes if p not in self._assignment), key=lambda p: -sizes[p]):
+            shard = loads.index(min(loads))
+            self._assignment[path] = shard
+            loads[shard] += sizes[path]
+        # Removals can still leave a shard heavy: move files from the heaviest to the lightest shard,
+        # each time the one closest to half their gap, so as few parsed files as possible change owner
+        mean = sum(loads) / self.workers
+        moved = 0
+        while mean and max(loads) > self.rebalance_ratio * mean:
+            hi, lo = loads.index(max(loads)), loads.index(min(loads))
+            gap = loads[hi] - loads[lo]
+            movable = [p for p, shard in self._assignment.items() if shard == hi and sizes[p] < gap]
+            if not movable:
+                break
+            path = min(movable, key=lambda p: abs(sizes[p] - gap / 2))
+            self._assignment[path] = lo
+            loads[hi] -= sizes[path]
+            loads[lo] += sizes[path]
+            moved += 1
+        if moved:
+            with self._lock:
+                self._stats["rebalances"] += 1
+                self._stats["files_moved"] += moved
+        shards: List[List[Tuple[int, str, int, int]]] = [[] for _ in range(self.workers)]
+        for index, (path, mtime_ns, size) in enumerate(signature):
+            shards[self._assignment[path]].append((index, path, mtime_ns, size))
+        self._shards, self.paths, self.signature = shards, paths, signature
+
+    def _fan_out(self, q: str, ent_text: str, k: int) -> List[Tuple[int, List[Hit]]]:
+        shards = self._shards
+        futures = [pool.submit(_search_shard, files, q, ent_text, k) for pool, files in zip(self._pools, shards) if files]
+        return [f.result() for f in futures]
+
+    def article_count(self) -> int:
+        """Loads every shard (used to prewarm the workers) and returns the total article count."""
+        return sum(count for count, _ in self._fan_out("", "", 0))
+
+    def top_k(self, query: str, entities: Dict[str, Any], k: Optional[int] = None) -> List[Hit]:
+        started = time.perf_counter()
+        q, ent_text = _query_text(query, entities)
+        k = self.k if k is None else k
+        hits = _merge([part for _, part in self._fan_out(q, ent_text, k)], k)
+        with self._lock:
+            self._stats["searches"] += 1
+            self._stats["search_ms"] += (time.perf_counter() - started) * 1000
+        return hits
+
+    def search(self, query: str, entities: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.paths:
+            return {"data": ""}
+        return _result(self.top_k(query, entities))
+
+    def close(self, cancel_futures: bool = True) -> None:
+        for pool in self._pools:
+            pool.shutdown(wait=False, cancel_futures=cancel_futures)
+
+    def snapshot(self) -> Dict[str, Any]:
+        sizes = {path: size for path, _, size in self.signature}
+        with self._lock:
+            s = dict(self._stats)
+        return {
+            "workers": self.workers,
+            "files": len(self.signature),
+            "shard_files": [len(files) for files in self._shards],
+            "shard_bytes": self._loads(sizes),
+            **s,
+            "search_ms": round(s["search_ms"], 2),
+            "mean_search_ms": round(s["search_ms"] / s["searches"], 3) if s["searches"] else 0.0,
+        }
+
+
+def _shard_workers(cfg: Dict[str, Any]) -> int:
+    """KB_SHARD_WORKERS or `workers` if set, else the CPU count capped at `max_workers`: each process
+    that searches a sharded KB (every worker.py process, say) starts shard processes of its own."""
+    explicit = int(os.getenv("KB_SHARD_WORKERS") or cfg.get("workers") or 0)
+    return explicit or min(os.cpu_count() or 1, int(cfg.get("max_workers", 4)))
+
+
+_LOCK = threading.Lock()
+_LOADED: Dict[str, KnowledgeBase] = {}
+_SHARDED: Optional[ShardedKnowledgeBase] = None
+
+
+def get_knowledge_base(spec: Optional[str] = None):
+    """The KB for the current paths; re-parsed only when a file is added, removed or modified.
+
+    With sharding enabled and at least `min_files` files, one ShardedKnowledgeBase is kept and
+    re-balanced in place as files change, so its worker processes keep what they already parsed.
+    """
+    global _SHARDED
+    paths = kb_paths(spec)
+    key = ";".join(str(p) for p in paths)
+    signature = _signature(paths)
+    cfg = load_section("knowledge_base").get("sharding", {})
+    with _LOCK:
+        if env_flag("KB_SHARDING", bool(cfg.get("enabled", False))) and len(paths) >= int(cfg.get("min_files", 32)):
+            if _SHARDED is None:
+                _SHARDED = ShardedKnowledgeBase(
+                    _shard_workers(cfg),
+                    top_k=int(cfg.get("top_k", 5)),
+                    rebalance_ratio=float(cfg.get("rebalance_ratio", 1.25)),
+                    start_method=cfg.get("start_method", "spawn"),
+                )
+            _SHARDED.update(paths, signature)
+            return _SHARDED
+        if _SHARDED is not None:
+            # Fell below `min_files`: stop the shard processes once searches already queued finish
+            _SHARDED.close(cancel_futures=False)
+            _SHARDED = None
+        kb = _LOADED.get(key)
+        if kb is None or kb.signature != signature:
+            kb = KnowledgeBase(paths)
+            _LOADED.clear()
+            _LOADED[key] = kb
+        return kb
+
+
+def kb_metrics() -> Dict[str, Any]:
+    return _SHARDED.snapshot() if _SHARDED is not None else {"sharded": False}
+
+
+# -- benchmark ----------------------------------------------------------------------------------
+_VOCAB = [f"{a}{b}" for a in ("pay", "ship", "auth", "refund", "order", "card", "login", "item", "bank", "app")
+          for b in ("ment", "ing", "er", "code", "fail", "delay", "reset", "error", "link", "part")]
+
+
+def _synthetic_corpus(root: Path, files: int, articles: int, seed: int = 7) -> None:
+    rnd = random.Random(seed)
+    for f in range(files):
+        arts = [
+            {"id": f"KB_{f:04d}_{a:03d}", "content": " ".join(rnd.choices(_VOCAB, k=30)), "tags": rnd.sample(_VOCAB, 6)}
+            for a in range(articles)
+        ]
+        (root / f"product_{f:04d}.json").write_text(json.dumps({"articles": arts}), encoding="utf-8")
+
+
+def bench(paths: List[Path], workers: List[int], queries: int = 50, seed: int = 11) -> Dict[str, Any]:
+    """Mean search latency single-process vs sharded at each worker count, checking identical answers."""
+    rnd = random.Random(seed)
+    qs = [(" ".join(rnd.choices(_VOCAB, k=6)), {"issue_type": rnd.choice(_VOCAB)}) for _ in range(queries)]
+
+    def timed(kb) -> Tuple[float, List[Any]]:
+        kb.search(*qs[0])  # warm: parse / load shards
+        out, ms = [], []
+        for q, ents in qs:
+            t0 = time.perf_counter()
+            out.append(kb.search(q, ents))
+            ms.append((time.perf_counter() - t0) * 1000)
+        return statistics.mean(ms), out
+
+    base_ms, expected = timed(KnowledgeBase(paths))
+    report: Dict[str, Any] = {"cpus": os.cpu_count(), "files": len(paths), "single_process_ms": round(base_ms, 2), "sharded": {}}
+    for n in workers:
+        kb = ShardedKnowledgeBase(n)
+        kb.update(paths, _signature(paths))
+        try:
+            ms, got = timed(kb)
+        finally:
+            kb.close()
+        report["sharded"][str(n)] = {"mean_ms": round(ms, 2), "speedup": round(base_ms / ms, 2), "same_results": got == expected}
+    report["articles"] = KnowledgeBase(paths).article_count()
+    return report
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("bench", help="Single-process vs sharded search latency per worker count")
+    b.add_argument("--kb-paths", default=None, help="Benchmark these KB_PATHS instead of a synthetic corpus")
+    b.add_argument("--files", type=int, default=400)
+    b.add_argument("--articles", type=int, default=50)
+    b.add_argument("--workers", default=None, help="Comma-separated worker counts (default 1,2,4,... up to the CPU count)")
+    b.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    cpus = os.cpu_count() or 1
+    workers = [int(w) for w in args.workers.split(",")] if args.workers else sorted({1, *[2 ** i for i in range(1, 8) if 2 ** i <= cpus], cpus})
+    tmp = None
+    try:
+        if args.kb_paths:
+            paths = kb_paths(args.kb_paths)
+        else:
+            tmp = Path(tempfile.mkdtemp(prefix="kb-bench-"))
+            _synthetic_corpus(tmp, args.files, args.articles)
+            paths = kb_paths(str(tmp))
+        print(json.dumps(bench(paths, workers, args.queries), indent=2))
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
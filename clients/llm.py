@@ -0,0 +1,238 @@
+"""
+Shared LLM provider registry and invocation path for COMMON and ATLAS abilities
+"""
+
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_groq import ChatGroq
+from pydantic import SecretStr
+
+from clients.fake_llm import build_fake_llm
+from clients.hedging import HedgedInvoker, LatencyTracker
+from clients.prompt_budget import PromptBudget
+from clients.rate_limit import MemoryBucketStore, RateLimiter, SqliteBucketStore, estimate_tokens
+from clients.router import ProviderRouter
+from clients.settings import env_flag
+
+load_dotenv()
+
+
+@lru_cache(maxsize=1)
+def load_llm_config() -> Dict[str, Any]:
+    path = Path(os.getenv("LLM_CONFIG_PATH", "config/llm_config.json"))
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _provider_spec(name: str) -> Dict[str, Any]:
+    spec = load_llm_config().get("providers", {}).get(name)
+    if spec is None:
+        raise ValueError(f"Unknown LLM provider '{name}'")
+    return spec
+
+
+def fake_mode() -> bool:
+    return env_flag("LLM_FAKE_PROVIDERS", bool(load_llm_config().get("fake", {}).get("enabled", False)))
+
+
+def _fake_profile(name: str) -> Dict[str, Any]:
+    profile = {k: v for k, v in load_llm_config().get("fake", {}).items() if k != "enabled"}
+    profile.update(_provider_spec(name).get("fake", {}))
+    overrides = os.getenv("LLM_FAKE_PROFILE")
+    if overrides:
+        profile.update(json.loads(overrides).get(name, {}))
+    return profile
+
+
+def provider_available(name: str) -> bool:
+    kind = _provider_spec(name).get("kind", name)
+    if kind == "fake" or fake_mode():
+        return True
+    if kind == "groq":
+        return bool(os.getenv("GROQ_API_KEY"))
+    if kind == "gemini":
+        return bool(os.getenv("GOOGLE_API_KEY"))
+    return False
+
+
+@lru_cache(maxsize=None)
+def prompt_template(template: str) -> ChatPromptTemplate:
+    """Parse an ability's prompt template once; the templates are constants shared by every call."""
+    return ChatPromptTemplate.from_template(template)
+
+
+@lru_cache(maxsize=None)
+def get_llm(name: str):
+    spec = _provider_spec(name)
+    kind = spec.get("kind", name)
+    if kind == "fake" or fake_mode():
+        return build_fake_llm(name, **_fake_profile(name))
+    model = spec.get("model")
+    if spec.get("model_env"):
+        model = os.getenv(spec["model_env"], model)
+    kwargs: Dict[str, Any] = {"model": model}
+    if "temperature" in spec:
+        kwargs["temperature"] = spec["temperature"]
+    if kind == "groq":
+        groq_key = os.getenv("GROQ_API_KEY")
+        if not groq_key:
+            return None
+        return ChatGroq(api_key=SecretStr(groq_key), **kwargs)
+    if kind == "gemini":
+        return ChatGoogleGenerativeAI(google_api_key=os.getenv("GOOGLE_API_KEY"), **kwargs)
+    raise ValueError(f"Unknown kind '{kind}' for LLM provider '{name}'")
+
+
+_HEDGE_CFG = load_llm_config().get("hedging", {})
+LATENCY = LatencyTracker(window=int(_HEDGE_CFG.get("window", 200)))
+HEDGER = HedgedInvoker(
+    LATENCY,
+    percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", _HEDGE_CFG.get("percentile", 95))),
+    min_delay=float(_HEDGE_CFG.get("min_delay_ms", 200)) / 1000,
+    initial_delay=float(_HEDGE_CFG.get("initial_delay_ms", 2000)) / 1000,
+    min_samples=int(_HEDGE_CFG.get("min_samples", 20)),
+    max_workers=int(_HEDGE_CFG.get("max_workers", 16)),
+)
+ROUTER = ProviderRouter(load_llm_config().get("routing", {}), provider_available)
+
+_RATE_CFG = load_llm_config().get("rate_limits", {})
+LIMITER = RateLimiter(
+    _RATE_CFG.get("providers", {}),
+    SqliteBucketStore(os.environ["LLM_RATE_LIMIT_DB"]) if os.getenv("LLM_RATE_LIMIT_DB") else MemoryBucketStore(),
+)
+
+BUDGET = PromptBudget(
+    load_llm_config().get("prompt_budgets", {}),
+    enabled=env_flag("LLM_PROMPT_BUDGET", bool(load_llm_config().get("prompt_budgets", {}).get("enabled", False))),
+)
+
+
+_THROTTLES = {"count": 0}
+_THROTTLES_LOCK = threading.Lock()
+_THROTTLE_MARKERS = ("429", "rate limit", "rate_limit", "too many requests", "resource_exhausted", "resource exhausted")
+
+
+def is_throttle_error(exc: BaseException) -> bool:
+    """True for provider 429 / quota-exhausted errors (Groq, Gemini or the fake provider)."""
+    if getattr(exc, "status_code", None) == 429 or getattr(exc, "code", None) == 429:
+        return True
+    text = f"{type(exc).__name__} {exc}".lower()
+    return any(marker in text for marker in _THROTTLE_MARKERS)
+
+
+def throttle_count() -> int:
+    """Provider throttling errors seen by this process, including ones absorbed by failover."""
+    return _THROTTLES["count"]
+
+
+def _record_failure(name: str, seconds: float, exc: BaseException) -> None:
+    ROUTER.record(name, seconds, ok=False)
+    if is_throttle_error(exc):
+        with _THROTTLES_LOCK:
+            _THROTTLES["count"] += 1
+
+
+def rate_limit_enabled() -> bool:
+    # Fake providers are not throttled unless LLM_RATE_LIMIT explicitly asks for it
+    return env_flag("LLM_RATE_LIMIT", bool(_RATE_CFG.get("enabled", False)) and not fake_mode())
+
+
+def hedging_enabled(ability: str) -> bool:
+    if not env_flag("LLM_HEDGING", bool(_HEDGE_CFG.get("enabled", False))):
+        return False
+    return ability in _HEDGE_CFG.get("idempotent_abilities", [])
+
+
+def _attempts(ability: str, provider: str) -> List[Tuple[str, Optional[str]]]:
+    """Pair up routed candidates as (primary, hedge partner) attempts, healthiest first."""
+    candidates = ROUTER.candidates(ability, provider)
+    if not candidates:
+        return [(provider, None)]
+    if not hedging_enabled(ability):
+        return [(c, None) for c in candidates]
+    return [(candidates[i], candidates[i + 1] if i + 1 < len(candidates) else None) for i in range(0, len(candidates), 2)]
+
+
+def invoke_chain(ability: str, prompt, parser, inputs: Dict[str, Any], provider: str) -> Any:
+    """Invoke `prompt | llm | parser` on the healthiest eligible provider, hedging and failing over as configured."""
+    prompt_value, prompt_tokens = BUDGET.render(ability, prompt, inputs)
+
+    def call(name: str) -> Any:
+        ROUTER.acquire(name)
+        if rate_limit_enabled():
+            LIMITER.acquire(name, prompt_tokens)
+        chain = get_llm(name) | parser
+        started = time.perf_counter()
+        try:
+            result = chain.invoke(prompt_value)
+        except Exception as exc:
+            _record_failure(name, time.perf_counter() - started, exc)
+            raise
+        elapsed = time.perf_counter() - started
+        ROUTER.record(name, elapsed, ok=True)
+        LATENCY.record(name, elapsed)
+        return result
+
+    error: Optional[BaseException] = None
+    for primary, partner in _attempts(ability, provider):
+        try:
+            if partner is None:
+                return call(primary)
+            return HEDGER.invoke(ability, call, primary, partner)
+        except Exception as exc:
+            error = exc
+    assert error is not None
+    raise error
+
+
+async def ainvoke_llm(ability: str, messages, provider: str, parser=None) -> Any:
+    """Async counterpart of `invoke_chain` for callers that already build message lists."""
+    prompt_tokens = estimate_tokens("\n".join(str(getattr(m, "content", m)) for m in messages))
+    BUDGET.observe(ability, prompt_tokens, prompt_tokens)
+
+    async def call(name: str) -> Any:
+        ROUTER.acquire(name)
+        if rate_limit_enabled():
+            await LIMITER.aacquire(name, prompt_tokens)
+        runnable = get_llm(name) if parser is None else get_llm(name) | parser
+        started = time.perf_counter()
+        try:
+            result = await runnable.ainvoke(messages)
+        except Exception as exc:
+            _record_failure(name, time.perf_counter() - started, exc)
+            raise
+        elapsed = time.perf_counter() - started
+        ROUTER.record(name, elapsed, ok=True)
+        LATENCY.record(name, elapsed)
+        return result
+
+    error: Optional[BaseException] = None
+    for primary, partner in _attempts(ability, provider):
+        try:
+            if partner is None:
+                return await call(primary)
+            return await HEDGER.ainvoke(ability, call, primary, partner)
+        except Exception as exc:
+            error = exc
+    assert error is not None
+    raise error
+
+
+def llm_metrics() -> Dict[str, Any]:
+    return {
+        "latency": LATENCY.snapshot(),
+        "hedging": HEDGER.stats.snapshot(),
+        "routing": ROUTER.snapshot(),
+        "rate_limits": LIMITER.snapshot(),
+        "prompt_tokens": BUDGET.snapshot(),
+    }
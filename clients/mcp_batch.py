@@ -0,0 +1,169 @@
+"""
+Client-side micro-batching for the FastMCP servers: tool calls made within `window_ms` of each other
+share one `batch` request (see mcp_servers/batch.py) over a single long-lived session
+
+    python -m clients.mcp_batch bench --url http://localhost:5002/mcp/ --tool extract_answer \\
+        --args '{"customer_response": "order 123"}' --calls 500 --concurrency 50
+"""
+
+import asyncio
+import json
+import time
+from argparse import ArgumentParser
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastmcp import Client
+
+from clients.settings import load_section
+
+
+class McpToolError(RuntimeError):
+    """One invocation in a batch failed on the server; the others are unaffected."""
+
+
+class McpBatcher:
+    """`await call(tool, args)` queues the call; the queue is sent as one batch when `window_ms` has passed
+    since its first call or it reaches `max_batch`. Results and errors are routed back per call.
+
+    Bound to the event loop it is first used on. `target` is a server URL or a FastMCP instance.
+    """
+
+    def __init__(self, target: Any, window_ms: Optional[float] = None, max_batch: Optional[int] = None):
+        cfg = load_section("mcp_batch")
+        self.target = target
+        self.window_s = float(cfg.get("window_ms", 5) if window_ms is None else window_ms) / 1000
+        self.max_batch = int(max_batch or cfg.get("max_batch", 32))
+        self._client: Optional[Client] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._pending: List[Tuple[str, Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._sending: Set[asyncio.Task] = set()
+        self._stats = {"calls": 0, "batches": 0, "item_errors": 0, "batch_errors": 0, "largest_batch": 0}
+
+    async def _connect(self) -> Client:
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._client is None:
+                client = Client(self.target)
+                await client.__aenter__()
+                self._client = client
+        return self._client
+
+    async def call(self, tool: str, args: Optional[Dict[str, Any]] = None) -> Any:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((tool, args or {}, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_s, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: List[Tuple[str, Dict[str, Any], asyncio.Future]]) -> None:
+        self._stats["calls"] += len(batch)
+        self._stats["batches"] += 1
+        self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+        try:
+            client = await self._connect()
+            res = await client.call_tool("batch", {"calls": [{"tool": t, "args": a} for t, a, _ in batch]})
+            # structured_content, not .data: results are plain JSON whatever each tool's return type
+            items = res.structured_content["result"]
+        except Exception as exc:
+            self._stats["batch_errors"] += 1
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+        for (_, _, fut), item in zip(batch, items):
+            if fut.done():
+                continue
+            if item.get("ok"):
+                fut.set_result(item.get("result"))
+            else:
+                self._stats["item_errors"] += 1
+                fut.set_exception(McpToolError(item.get("error", "unknown error")))
+
+    async def aclose(self) -> None:
+        self._flush()
+        if self._sending:
+            await asyncio.gather(*list(self._sending), return_exceptions=True)
+        if self._client is not None:
+            await self._client.__aexit__(None, None, None)
+            self._client = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        s = dict(self._stats)
+        return {
+            **s,
+            "mean_batch": round(s["calls"] / s["batches"], 1) if s["batches"] else 0.0,
+            "window_ms": self.window_s * 1000,
+            "max_batch": self.max_batch,
+        }
+
+
+# -- benchmark ----------------------------------------------------------------------------------
+def _summary(latencies: List[float], wall_s: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    pick = lambda pct: round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] * 1000, 2)
+    return {"wall_s": round(wall_s, 3), "calls_per_s": round(len(ordered) / wall_s, 1), "p50_ms": pick(50), "p95_ms": pick(95)}
+
+
+async def _drive(call, calls: int, concurrency: int) -> Dict[str, Any]:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one() -> None:
+        async with sem:
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return _summary(latencies, time.perf_counter() - started)
+
+
+async def bench(target: Any, tool: str, args: Dict[str, Any], calls: int = 500, concurrency: int = 50,
+                window_ms: Optional[float] = None, max_batch: Optional[int] = None) -> Dict[str, Any]:
+    """The same calls, one request each over one session vs micro-batched."""
+    async with Client(target) as client:
+        single = await _drive(lambda: client.call_tool(tool, args), calls, concurrency)
+    batcher = McpBatcher(target, window_ms, max_batch)
+    try:
+        batched = await _drive(lambda: batcher.call(tool, args), calls, concurrency)
+    finally:
+        await batcher.aclose()
+    batched["batcher"] = batcher.snapshot()
+    return {"tool": tool, "calls": calls, "concurrency": concurrency, "single": single, "batched": batched,
+            "throughput_x": round(batched["calls_per_s"] / single["calls_per_s"], 2)}
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("bench", help="Per-call requests vs micro-batched, against a running server")
+    b.add_argument("--url", required=True)
+    b.add_argument("--tool", required=True)
+    b.add_argument("--args", default="{}", help="Tool arguments as JSON")
+    b.add_argument("--calls", type=int, default=500)
+    b.add_argument("--concurrency", type=int, default=50)
+    b.add_argument("--window-ms", type=float, default=None)
+    b.add_argument("--max-batch", type=int, default=None)
+    args = parser.parse_args()
+    report = asyncio.run(bench(args.url, args.tool, json.loads(args.args), args.calls, args.concurrency, args.window_ms, args.max_batch))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Prompt size accounting and context compaction.
+
+Abilities interpolate whole dicts (KB hits, entities, decisions) into their
+prompts. For abilities with a configured budget, each structured variable is
+reduced to its selected fields, long strings are truncated and the result is
+rendered as compact JSON instead of a Python repr. If the rendered prompt is
+still over budget, string limits are halved until it fits.
+"""
+
+import json
+import threading
+from collections import deque
+from typing import Any, Dict, Tuple
+
+from clients.rate_limit import estimate_tokens
+
+_EMPTY = (None, "", [], {})
+
+
+def compact_value(value: Any, fields=None, max_chars: int = 600, max_items: int = 5) -> Any:
+    if isinstance(value, dict):
+        return {
+            k: compact_value(v, None, max_chars, max_items)
+            for k, v in value.items()
+            if (not fields or k in fields) and v not in _EMPTY
+        }
+    if isinstance(value, (list, tuple)):
+        return [compact_value(v, None, max_chars, max_items) for v in list(value)[:max_items]]
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars].rstrip() + "…"
+    return value
+
+
+def render_compact(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class TokenHistogram:
+    BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+    def __init__(self, window: int = 500):
+        self.count = 0
+        self.total = 0
+        self.buckets = [0] * (len(self.BUCKETS) + 1)
+        self._recent: deque = deque(maxlen=window)
+
+    def add(self, tokens: int) -> None:
+        self.count += 1
+        self.total += tokens
+        self._recent.append(tokens)
+        for i, edge in enumerate(self.BUCKETS):
+            if tokens <= edge:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        recent = sorted(self._recent)
+        labels = [f"<={b}" for b in self.BUCKETS] + [f">{self.BUCKETS[-1]}"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 1) if self.count else 0.0,
+            "p50": recent[len(recent) // 2] if recent else 0,
+            "p95": recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0,
+            "histogram": {label: n for label, n in zip(labels, self.buckets) if n},
+        }
+
+
+class PromptBudget:
+    def __init__(self, config: Dict[str, Any], enabled: bool = True):
+        self.abilities: Dict[str, Dict[str, Any]] = config.get("abilities", {})
+        self.min_chars = int(config.get("min_chars", 80))
+        self.enabled = enabled
+        self._raw: Dict[str, TokenHistogram] = {}
+        self._sent: Dict[str, TokenHistogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, ability: str, raw_tokens: int, sent_tokens: int) -> None:
+        with self._lock:
+            self._raw.setdefault(ability, TokenHistogram()).add(raw_tokens)
+            self._sent.setdefault(ability, TokenHistogram()).add(sent_tokens)
+
+    def _compact_inputs(self, spec: Dict[str, Any], inputs: Dict[str, Any], max_chars: int) -> Dict[str, Any]:
+        out = dict(inputs)
+        for var, var_spec in spec.get("variables", {}).items():
+            if var in out:
+                limit = min(max_chars, int(var_spec.get("max_chars", max_chars)))
+                out[var] = render_compact(compact_value(out[var], var_spec.get("fields"), limit, int(var_spec.get("max_items", 5))))
+        return out
+
+    def render(self, ability: str, prompt, inputs: Dict[str, Any]) -> Tuple[Any, int]:
+        """Render `prompt` for `inputs`, compacted to the ability's budget; returns (prompt_value, tokens)."""
+        prompt_value = prompt.invoke(inputs)
+        raw_tokens = estimate_tokens(prompt_value.to_string())
+        spec = self.abilities.get(ability)
+        if not self.enabled or not spec:
+            self.observe(ability, raw_tokens, raw_tokens)
+            return prompt_value, raw_tokens
+        budget = int(spec.get("max_tokens", 0))
+        max_chars = int(spec.get("max_chars", 600))
+        while True:
+            compacted = prompt.invoke(self._compact_inputs(spec, inputs, max_chars))
+            tokens = estimate_tokens(compacted.to_string())
+            if not budget or tokens <= budget or max_chars <= self.min_chars:
+                break
+            max_chars = max(self.min_chars, max_chars // 2)
+        if tokens >= raw_tokens:
+            compacted, tokens = prompt_value, raw_tokens
+        self.observe(ability, raw_tokens, tokens)
+        return compacted, tokens
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for ability, raw in self._raw.items():
+                sent = self._sent[ability]
+                saved = 1 - sent.total / raw.total if raw.total else 0.0
+                out[ability] = {"raw": raw.snapshot(), "sent": sent.snapshot(), "savings": round(saved, 3)}
+            return out
@@ -0,0 +1,114 @@
+"""
+Requests-per-minute / tokens-per-minute budgets per LLM provider.
+
+Buckets are reservation based: each caller debits its cost immediately and
+is told how long to wait before its slot comes up. Later callers see the
+accumulated debt and wait longer, so callers are served in arrival order and
+the fleet as a whole runs at the configured rate instead of failing with 429s.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting English prompts
+    return max(1, (len(text) + 3) // 4)
+
+
+def _reserve(tokens: float, updated: float, amount: float, per_minute: float, now: float) -> Tuple[float, float]:
+    rate = per_minute / 60.0
+    tokens = min(per_minute, tokens + max(0.0, now - updated) * rate) - amount
+    return tokens, (0.0 if tokens >= 0 else -tokens / rate)
+
+
+class MemoryBucketStore:
+    def __init__(self):
+        self._state: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str, amount: float, per_minute: float) -> float:
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._state.get(key, (per_minute, now))
+            tokens, wait = _reserve(tokens, updated, amount, per_minute, now)
+            self._state[key] = (tokens, now)
+        return wait
+
+
+class SqliteBucketStore:
+    """Bucket state shared by every process pointing at the same database file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS llm_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def reserve(self, key: str, amount: float, per_minute: float) -> float:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM llm_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (per_minute, now)
+            tokens, wait = _reserve(tokens, updated, amount, per_minute, now)
+            conn.execute("INSERT OR REPLACE INTO llm_buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, Dict[str, Any]], store):
+        self.limits = limits
+        self.store = store
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, provider: str, tokens: int) -> float:
+        spec = self.limits.get(provider, {})
+        wait = 0.0
+        if spec.get("rpm"):
+            wait = max(wait, self.store.reserve(f"{provider}:rpm", 1, float(spec["rpm"])))
+        if spec.get("tpm"):
+            cost = tokens + int(spec.get("output_tokens", 0))
+            wait = max(wait, self.store.reserve(f"{provider}:tpm", cost, float(spec["tpm"])))
+        with self._lock:
+            s = self._stats.setdefault(provider, {"requests": 0, "tokens": 0, "throttled": 0, "wait_s": 0.0, "max_wait_s": 0.0})
+            s["requests"] += 1
+            s["tokens"] += tokens
+            if wait > 0:
+                s["throttled"] += 1
+                s["wait_s"] += wait
+                s["max_wait_s"] = max(s["max_wait_s"], wait)
+        return wait
+
+    def acquire(self, provider: str, tokens: int) -> None:
+        wait = self.reserve(provider, tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, provider: str, tokens: int) -> None:
+        wait = self.reserve(provider, tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                p: {**s, "wait_s": round(s["wait_s"], 3), "max_wait_s": round(s["max_wait_s"], 3)}
+                for p, s in self._stats.items()
+            }
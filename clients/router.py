@@ -0,0 +1,168 @@
+"""
+Latency-aware provider routing with per-model circuit breakers
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._state = self.CLOSED
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def try_acquire(self) -> bool:
+        """Closed circuits always admit; half-open ones admit a single recovery probe."""
+        with self._lock:
+            state = self._refresh()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.trips += 1
+                self._state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class ProviderHealth:
+    def __init__(self, window: int = 50):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def record(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self._samples.append((seconds, ok))
+            self.requests += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = list(self._samples)
+        if not samples:
+            return {"samples": 0, "p50_ms": 0.0, "error_rate": 0.0}
+        latencies = sorted(s for s, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            "samples": len(samples),
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+            "error_rate": round(errors / len(samples), 3),
+        }
+
+
+class ProviderRouter:
+    """Orders the eligible providers of an ability from healthiest to least healthy.
+
+    Health is the rolling p50 latency inflated by the rolling error rate.
+    Providers with too few samples keep their configured order behind the
+    measured ones, and providers with an open circuit are left out entirely.
+    """
+
+    def __init__(self, config: Dict[str, Any], available: Callable[[str], bool]):
+        self.available = available
+        self.abilities: Dict[str, List[str]] = config.get("abilities", {})
+        self.fallbacks: Dict[str, List[str]] = config.get("fallbacks", {})
+        self.min_samples = int(config.get("min_samples", 5))
+        self.error_penalty = float(config.get("error_penalty", 4.0))
+        self._window = int(config.get("window", 50))
+        self._threshold = int(config.get("failure_threshold", 3))
+        self._cooldown = float(config.get("cooldown_s", 30))
+        self._health: Dict[str, ProviderHealth] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._routed: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def health(self, provider: str) -> ProviderHealth:
+        with self._lock:
+            if provider not in self._health:
+                self._health[provider] = ProviderHealth(self._window)
+            return self._health[provider]
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            if provider not in self._breakers:
+                self._breakers[provider] = CircuitBreaker(self._threshold, self._cooldown)
+            return self._breakers[provider]
+
+    def _score(self, provider: str) -> Optional[float]:
+        stats = self.health(provider).stats()
+        if stats["samples"] < self.min_samples:
+            return None
+        return stats["p50_ms"] * (1 + self.error_penalty * stats["error_rate"])
+
+    def candidates(self, ability: str, preferred: str) -> List[str]:
+        pool = self.abilities.get(ability) or [preferred, *self.fallbacks.get(preferred, [])]
+        pool = [p for i, p in enumerate(pool) if p not in pool[:i] and self.available(p)]
+        pool = [p for p in pool if self.breaker(p).state != CircuitBreaker.OPEN]
+        scores = {p: self._score(p) for p in pool}
+        ranked = sorted(pool, key=lambda p: (scores[p] is None, scores[p] or 0.0, pool.index(p)))
+        if ranked:
+            with self._lock:
+                routed = self._routed.setdefault(ability, {})
+                routed[ranked[0]] = routed.get(ranked[0], 0) + 1
+        return ranked
+
+    def acquire(self, provider: str) -> None:
+        if not self.breaker(provider).try_acquire():
+            raise CircuitOpenError(f"Circuit open for LLM provider '{provider}'")
+
+    def record(self, provider: str, seconds: float, ok: bool) -> None:
+        self.health(provider).record(seconds, ok)
+        if ok:
+            self.breaker(provider).record_success()
+        else:
+            self.breaker(provider).record_failure()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            providers = sorted(set(self._health) | set(self._breakers))
+            routed = {k: dict(v) for k, v in self._routed.items()}
+        return {
+            "providers": {
+                p: {**self.health(p).stats(), "requests": self.health(p).requests,
+                    "circuit": self.breaker(p).state, "trips": self.breaker(p).trips}
+                for p in providers
+            },
+            "routed": routed,
+        }
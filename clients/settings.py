@@ -0,0 +1,33 @@
+"""
+Shared config helpers: the workflow config file (`WORKFLOW_CONFIG_PATH`) and env on/off overrides
+"""
+
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict
+
+
+def env_flag(name: str, default: bool) -> bool:
+    """`1/true/yes/on` (any case) in env var `name` turns a feature on, any other value off; unset keeps `default`."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def workflow_config_path() -> Path:
+    return Path(os.getenv("WORKFLOW_CONFIG_PATH", "config/workflow_config.json"))
+
+
+@lru_cache(maxsize=1)
+def load_workflow_config() -> Dict[str, Any]:
+    return json.loads(workflow_config_path().read_text(encoding="utf-8"))
+
+
+def load_section(name: str) -> Dict[str, Any]:
+    """One top-level section of the workflow config; {} if the section or the file is missing."""
+    if not workflow_config_path().exists():
+        return {}
+    return load_workflow_config().get(name, {})
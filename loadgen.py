@@ -0,0 +1,388 @@
+"""
+Synthetic ticket load generator: payloads built from the `loadgen` templates in
+config/workflow_config.json, replayed open-loop at a target QPS against the graph or the HTTP service
+
+    python loadgen.py sample --count 5
+    python loadgen.py run --target graph --qps 1,2,4,8 --duration 30 --fake-llm
+    python loadgen.py run --target http --url http://localhost:8000 --qps 5,10,20 --slo-ms 8000
+
+Arrivals follow a fixed schedule whether or not earlier tickets have finished, and latency is
+measured from each ticket's scheduled start (coordinated-omission corrected). `service_ms` is the
+uncorrected time from the actual send, i.e. what a closed-loop client would have reported.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from clients.settings import load_section
+
+FIRST_NAMES = ["Amit", "Sarah", "Michael", "Priya", "Rohit", "Elena", "James", "Fatima", "Wei", "Lucas", "Aisha", "Noah"]
+LAST_NAMES = ["Patel", "Johnson", "Chen", "Sharma", "Garcia", "Okafor", "Smith", "Nakamura", "Rossi", "Khan"]
+TERMINAL_EVENTS = ("completed", "failed", "awaiting_customer")
+
+
+def _weighted(rng: random.Random, weights: Dict[str, float]) -> str:
+    keys = list(weights)
+    return rng.choices(keys, weights=[weights[k] for k in keys])[0]
+
+
+class TicketSynthesizer:
+    """Draws category, priority and query length from the configured distributions and fills the templates."""
+
+    def __init__(self, config: Dict[str, Any], seed: int = 7, mix: Optional[Dict[str, float]] = None, prefix: str = "LG"):
+        self.config = config
+        self.categories = config["categories"]
+        self.mix = mix or config.get("mix") or {name: 1.0 for name in self.categories}
+        unknown = set(self.mix) - set(self.categories)
+        if unknown:
+            raise ValueError(f"Unknown ticket categories {sorted(unknown)}")
+        self.priorities = config.get("priorities", {"Medium": 1.0})
+        self.words = config.get("query_words", {})
+        self.identifier_rate = float(config.get("identifier_rate", 0.7))
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.count = 0
+
+    def _slots(self, category: Dict[str, Any]) -> Dict[str, str]:
+        rng = self.rng
+        return {
+            "item": rng.choice(category.get("items", ["an item"])),
+            "app": rng.choice(category.get("apps", ["authenticator"])),
+            "date": f"{rng.randint(1, 28)} {rng.choice(['March', 'June', 'August', 'October'])}",
+            "days": str(rng.randint(2, 9)),
+            "amount": f"${rng.randint(20, 50000):,}",
+            "order": f"ORD-{rng.randint(10000, 99999)}",
+            "txn": f"TXN{rng.randint(10 ** 7, 10 ** 8 - 1)}",
+        }
+
+    def _target_words(self) -> int:
+        median = float(self.words.get("median", 45))
+        sigma = float(self.words.get("sigma", 0.6))
+        n = int(round(self.rng.lognormvariate(math.log(median), sigma)))
+        return max(int(self.words.get("min", 8)), min(int(self.words.get("max", 250)), n))
+
+    def ticket(self) -> Dict[str, Any]:
+        rng = self.rng
+        name = _weighted(rng, self.mix)
+        category = self.categories[name]
+        slots = self._slots(category)
+        sentences = [rng.choice(category["openers"])]
+        if category.get("identifier") and rng.random() < self.identifier_rate:
+            sentences.append(category["identifier"])
+        target = self._target_words()
+        details = list(category.get("details", []))
+        rng.shuffle(details)
+        # Cycle the detail sentences until the drawn query length is reached
+        while details and sum(len(s.split()) for s in sentences) < target:
+            sentences.append(details[len(sentences) % len(details)])
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        self.count += 1
+        return {
+            "customer_name": f"{first} {last}",
+            "email": f"{first.lower()}.{last.lower()}{rng.randint(1, 999)}@example.com",
+            "query": " ".join(s.format(**slots) for s in sentences),
+            "priority": _weighted(rng, self.priorities),
+            "ticket_id": f"{self.prefix}-{self.count:06d}",
+            "category": name,
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        while True:
+            yield self.ticket()
+
+
+def _percentiles(values: List[float], scale: float = 1000) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max, seconds to ms by default."""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def pick(pct: float) -> float:
+        return round(ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))] * scale, 1)
+
+    return {"p50": pick(50), "p95": pick(95), "p99": pick(99), "max": round(ordered[-1] * scale, 1)}
+
+
+# -- targets ---------------------------------------------------------------------------------
+class RejectedError(RuntimeError):
+    """The service refused the ticket (429)."""
+
+
+class GraphTarget:
+    """Runs tickets on the in-process compiled graph; a ticket ends when it completes or pauses at WAIT."""
+
+    name = "graph"
+
+    def __init__(self, threads: int = 64):
+        self.threads = threads
+
+    async def start(self) -> None:
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=self.threads))
+
+    async def __call__(self, payload: Dict[str, Any]) -> str:
+        from agent.graph import checkpointer
+        from agent.runner import pending_clarification, run_ticket
+
+        try:
+            await run_ticket(payload)
+            return "awaiting_customer" if pending_clarification(payload["ticket_id"]) else "completed"
+        finally:
+            checkpointer.delete_thread(payload["ticket_id"])
+
+    async def health(self) -> Dict[str, Any]:
+        from agent.graph import concurrency_metrics
+
+        metrics = concurrency_metrics(history=None)
+        if metrics.get("enabled") is False:
+            return metrics
+        return {name: {k: v for k, v in limiter.items() if k != "history"} for name, limiter in metrics.items()}
+
+    async def close(self) -> None:
+        pass
+
+
+class HttpTarget:
+    """POSTs to the ticket service and follows its SSE stream until a terminal event."""
+
+    name = "http"
+
+    def __init__(self, url: str):
+        import httpx
+
+        self.url = url.rstrip("/")
+        # No connection cap: a client-side pool limit would quietly turn this into a closed loop
+        self.client = httpx.AsyncClient(base_url=self.url, timeout=None, limits=httpx.Limits(max_connections=None, max_keepalive_connections=64))
+
+    async def start(self) -> None:
+        pass
+
+    async def __call__(self, payload: Dict[str, Any]) -> str:
+        response = await self.client.post("/tickets", json=payload)
+        if response.status_code == 429:
+            raise RejectedError("429 queue full")
+        if response.status_code != 202:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        async with self.client.stream("GET", f"/tickets/{payload['ticket_id']}/events") as events:
+            async for line in events.aiter_lines():
+                if not line.startswith("event: "):
+                    continue
+                event = line[len("event: "):].strip()
+                if event == "failed":
+                    raise RuntimeError("ticket failed")
+                if event in TERMINAL_EVENTS:
+                    return event
+        raise RuntimeError("event stream ended without a terminal event")
+
+    async def health(self) -> Dict[str, Any]:
+        response = await self.client.get("/health")
+        body = response.json()
+        return {k: body.get(k) for k in ("queued", "queue_capacity", "running", "workers", "rejected")}
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+# -- open-loop driver ------------------------------------------------------------------------
+async def run_level(
+    target: Callable[[Dict[str, Any]], Awaitable[str]],
+    tickets: Iterator[Dict[str, Any]],
+    qps: float,
+    duration_s: float,
+    arrival: str = "poisson",
+    timeout_s: float = 120.0,
+    rng: Optional[random.Random] = None,
+) -> Dict[str, Any]:
+    """Fire tickets at `qps` for `duration_s`, never waiting on earlier tickets before sending the next."""
+    loop = asyncio.get_running_loop()
+    rng = rng or random.Random(0)
+    results: List[Dict[str, Any]] = []
+
+    async def one(payload: Dict[str, Any], intended: float) -> None:
+        sent = loop.time()
+        entry: Dict[str, Any] = {"category": payload.get("category"), "words": len(payload["query"].split())}
+        try:
+            entry["status"] = await asyncio.wait_for(target(payload), timeout_s)
+        except asyncio.TimeoutError:
+            entry["error"] = "timeout"
+        except RejectedError:
+            entry["error"] = "rejected"
+        except Exception as exc:
+            entry["error"] = type(exc).__name__
+        done = loop.time()
+        entry["latency"] = done - intended
+        entry["service"] = done - sent
+        entry["intended"] = intended
+        entry["send_lag"] = sent - intended
+        entry["done"] = done
+        results.append(entry)
+
+    tasks = []
+    start = loop.time() + 0.05
+    intended = start
+    total = max(1, int(round(qps * duration_s)))
+    for i in range(total):
+        if i:
+            intended += rng.expovariate(qps) if arrival == "poisson" else 1.0 / qps
+        delay = intended - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(next(tickets), intended)))
+    await asyncio.gather(*tasks)
+
+    ok = [r for r in results if "error" not in r]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if "error" in r:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    statuses: Dict[str, int] = {}
+    for r in ok:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+    arrivals = sorted(r["intended"] for r in results)
+    arrival_span = arrivals[-1] - arrivals[0] if len(arrivals) > 1 else 0.0
+    # Completions inside the arrival window shifted by the median latency: equals the arrival rate
+    # while the target keeps up, and falls behind it once work queues up
+    shift = sorted(r["latency"] for r in ok)[len(ok) // 2] if ok else 0.0
+    window = (arrivals[0] + shift, arrivals[-1] + shift) if arrivals else (0.0, 0.0)
+    in_window = sum(1 for r in ok if window[0] <= r["done"] <= window[1])
+    return {
+        "offered_qps": qps,
+        "arrival_qps": round(len(arrivals) / arrival_span, 2) if arrival_span > 0 else float(len(arrivals)),
+        "sent": len(results),
+        "achieved_qps": round(in_window / arrival_span, 2) if arrival_span > 0 else float(len(ok)),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "errors": errors,
+        "statuses": statuses,
+        "latency_ms": _percentiles([r["latency"] for r in ok]),
+        "service_ms": _percentiles([r["service"] for r in ok]),
+        "send_lag_ms": _percentiles([r["send_lag"] for r in results]),
+        "query_words": _percentiles([r["words"] for r in results], scale=1),
+    }
+
+
+def saturated(level: Dict[str, Any], slo_ms: Optional[float], max_error_rate: float, min_throughput: float = 0.9) -> List[str]:
+    """Reasons a level counts as past saturation (empty list if it kept up)."""
+    reasons = []
+    # Compared with the realized arrival rate, not the nominal one: Poisson arrivals over a short level are noisy
+    if level["achieved_qps"] < min_throughput * level["arrival_qps"]:
+        reasons.append("throughput")
+    if level["error_rate"] > max_error_rate:
+        reasons.append("errors")
+    p99 = level["latency_ms"]["p99"]
+    if slo_ms is not None and p99 is not None and p99 > slo_ms:
+        reasons.append("p99_slo")
+    return reasons
+
+
+async def sweep(target, synthesizer: TicketSynthesizer, levels: List[float], duration_s: float, arrival: str, timeout_s: float,
+                slo_ms: Optional[float], max_error_rate: float, stop_on_saturation: bool = True) -> Dict[str, Any]:
+    await target.start()
+    rng = random.Random(synthesizer.rng.random())
+    rows = []
+    saturation = None
+    try:
+        for qps in levels:
+            level = await run_level(target, iter(synthesizer), qps, duration_s, arrival, timeout_s, rng)
+            level["target_health"] = await target.health()
+            level["saturated_by"] = saturated(level, slo_ms, max_error_rate)
+            rows.append(level)
+            print(
+                f"{qps:>7.2f} qps offered, {level['achieved_qps']:>7.2f} achieved, p50 {level['latency_ms']['p50']}ms "
+                f"p99 {level['latency_ms']['p99']}ms, errors {level['error_rate']:.2%} {level['saturated_by'] or ''}",
+                file=sys.stderr,
+            )
+            if level["saturated_by"] and saturation is None:
+                saturation = qps
+                if stop_on_saturation:
+                    break
+    finally:
+        await target.close()
+    sustainable = [r["offered_qps"] for r in rows if not r["saturated_by"]]
+    return {
+        "target": target.name,
+        "arrival": arrival,
+        "duration_s": duration_s,
+        "slo_ms": slo_ms,
+        "max_error_rate": max_error_rate,
+        "mix": synthesizer.mix,
+        "levels": rows,
+        "saturation_qps": saturation,
+        "max_sustainable_qps": max(sustainable) if sustainable else None,
+    }
+
+
+def _parse_mix(text: Optional[str]) -> Optional[Dict[str, float]]:
+    if not text:
+        return None
+    return {k.strip(): float(v) for k, v in (part.split("=") for part in text.split(","))}
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--mix", default=None, help="Category weights, e.g. delivery=0.5,payment=0.5 (default: config mix)")
+    parser.add_argument("--query-words", default=None, metavar="MEDIAN[:SIGMA]", help="Override the lognormal query length distribution")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sample = sub.add_parser("sample", help="Print synthesized payloads as JSON lines")
+    sample.add_argument("--count", type=int, default=5)
+
+    run = sub.add_parser("run", help="Open-loop QPS sweep")
+    run.add_argument("--target", choices=("graph", "http"), default="graph")
+    run.add_argument("--url", default="http://localhost:8000", help="Ticket service base URL for --target http")
+    run.add_argument("--qps", default="1,2,4", help="Comma-separated offered QPS levels, swept in order")
+    run.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals per level")
+    run.add_argument("--arrival", choices=("poisson", "constant"), default="poisson")
+    run.add_argument("--timeout", type=float, default=120.0, help="Per-ticket timeout in seconds (counted as an error)")
+    run.add_argument("--slo-ms", type=float, default=None, help="p99 latency above this marks a level saturated")
+    run.add_argument("--max-error-rate", type=float, default=0.01)
+    run.add_argument("--keep-going", action="store_true", help="Run every level even after saturation")
+    run.add_argument("--threads", type=int, default=64, help="Thread pool for ability calls with --target graph")
+    run.add_argument("--fake-llm", action="store_true", help="Use the offline fake LLM providers (--target graph)")
+    run.add_argument("--out", default=None, help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    config = dict(load_section("loadgen"))
+    if args.query_words:
+        median, _, sigma = args.query_words.partition(":")
+        config["query_words"] = {**config.get("query_words", {}), "median": float(median), **({"sigma": float(sigma)} if sigma else {})}
+    synthesizer = TicketSynthesizer(config, seed=args.seed, mix=_parse_mix(args.mix), prefix=f"LG{args.seed}-{int(time.time()) % 100000}")
+
+    if args.command == "sample":
+        for _ in range(args.count):
+            print(json.dumps(synthesizer.ticket()))
+        return
+
+    if args.target == "graph":
+        if args.fake_llm:
+            os.environ["LLM_FAKE_PROVIDERS"] = "1"
+        import agent.graph  # noqa: F401  build graph and clients before the clock starts
+        target: Any = GraphTarget(threads=args.threads)
+    else:
+        target = HttpTarget(args.url)
+    report = asyncio.run(sweep(
+        target,
+        synthesizer,
+        [float(q) for q in args.qps.split(",")],
+        args.duration,
+        args.arrival,
+        args.timeout,
+        args.slo_ms,
+        args.max_error_rate,
+        stop_on_saturation=not args.keep_going,
+    ))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
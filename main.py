@@ -1,182 +1,200 @@
-"""
-Lang Graph Agent - Customer Support Workflow
-"""
-import os
-import sys
-import json
-import asyncio
-from argparse import ArgumentParser
-from pathlib import Path
-
-os.environ.setdefault("COMMON_MCP_URL", "http://localhost:5001/mcp/")
-os.environ.setdefault("ATLAS_MCP_URL", "http://localhost:5002/mcp/")
-
-# Import existing modular components
-from agent.graph import graph
-from schemas.agent_state import AgentState
-
-def load_input_payload(path: str | None) -> dict:
-    if path:
-        p = Path(path)
-        with p.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    default_path = Path("config/sample_input.json")
-    if default_path.exists():
-        with default_path.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    return {
-        "customer_name": "Akshay Redekar",
-        "email": "akshay.redekar@example.com",
-        "query": "Hi, I cannot reset my password and the reset link does not work. Can you help me?",
-        "priority": "High",
-        "ticket_id": "TCK12345",
-    }
-
-async def main():
-    parser = ArgumentParser()
-    parser.add_argument("--json", action="store_true", help="Print final output JSON only")
-    parser.add_argument("--input", type=str, default=None, help="Path to input JSON file")
-    # No forced routing by default; decisions are made by LLM/tools
-    args = parser.parse_args()
-
-    print("LANG GRAPH AGENT - CUSTOMER SUPPORT WORKFLOW")
-    print("=" * 80)
-    
-    input_payload = load_input_payload(args.input)
-    
-    incoming_response = ""
-    
-
-    initial_state: AgentState = {
-        "ticket_id": input_payload["ticket_id"],
-        "customer_name": input_payload["customer_name"],
-        "email": input_payload["email"],
-        "query": input_payload["query"],
-        "priority": input_payload["priority"],
-        "structured_data": {},
-        "enriched_data": {},
-        "flags": {},
-        "entities": {},
-        "normalized_data": {},
-        "clarification_question": "",
-        "missing_info": [],
-        "extracted_answer": {},
-        "retrieved_data": {},
-        "retrieval_summary": "",
-        "knowledge_base_data": {},
-        "solution_score": 0,
-        "escalation_decision": {},
-        "escalate": False,
-        "decision_reason": "",
-        "escalation_path": "",
-        "next_action": "",
-        "route": "",
-        "ticket_update": {},
-        "ticket_close": {},
-        "customer_response": incoming_response,
-        "api_results": [],
-        "notification_result": {},
-        "status": "started",
-        "audit_log": [],
-        "workflow_start_time": "",
-        "workflow_end_time": "",
-        "messages": [],
-        "solution_summary": ""
-    }
-    
-    # Run the workflow
-    try:
-        thread_id = input_payload["ticket_id"]
-
-        # First pass
-        async for _ in graph.astream(initial_state, config={"configurable": {"thread_id": thread_id}}):
-            pass
-        final_state = graph.get_state({"configurable": {"thread_id": thread_id}}).values
-
-
-        if (
-            str(final_state.get("status", "")) == "awaiting_customer"
-            and not incoming_response
-        ):
-
-            question_text = final_state.get("clarification_question")
-            print("\nClarification needed (from LLM):")
-            print(question_text or "Please provide more details to proceed.")
-
-            try:
-                user_reply = input("\nYour reply: ").strip()
-            except Exception:
-                user_reply = ""
-
-            if user_reply:
-
-                resume_state: AgentState = {
-                    "ticket_id": thread_id,
-                    "customer_response": user_reply,
-
-                    "structured_data": final_state.get("structured_data", {}),
-                    "audit_log": final_state.get("audit_log", []),
-                }  # type: ignore
-                async for _ in graph.astream(resume_state, config={"configurable": {"thread_id": thread_id}}):
-                    pass
-                final_state = graph.get_state({"configurable": {"thread_id": thread_id}}).values
-    except Exception as e:
-        print(f"Error running workflow: {e}")
-        import traceback
-        traceback.print_exc()
-        sys.exit(1)
-
-    if args.json:
-        final_output = {
-            "final_payload": {
-                "ticket_id": final_state.get("ticket_id"),
-                "customer_name": final_state.get("customer_name"),
-                "email": final_state.get("email"),
-                "query": final_state.get("query"),
-                "priority": final_state.get("priority"),
-                "entities": final_state.get("structured_data", {}).get("entities", final_state.get("entities", {})),
-                "normalized_fields": {
-
-                    "priority_score": (
-                        min(100, max(50,
-                            (90 if str(final_state.get("priority", "")).lower()=="high" else (98 if str(final_state.get("priority", "")).lower()=="critical" else (80 if str(final_state.get("priority", "")).lower()=="medium" else 70)))
-                        ))
-                    ),
-                    "sla_risk": final_state.get("flags", {}).get("sla_risk", "Low").title(),
-                    "ticket_status": final_state.get("status", "resolved").title(),
-                },
-                "retrieved_info": [
-                    {
-                        "source": "Knowledge Base",
-                        "content": final_state.get("retrieved_data", {}).get("data", "")
-                    }
-                ],
-                "decision": {
-                    "solution_score": final_state.get("solution_score", 0),
-                    "escalated": bool(final_state.get("escalate", False)),
-                    "assigned_to": "Automated Resolution" if not final_state.get("escalate", False) else str(final_state.get("escalation_path", "")),
-                    "reason": final_state.get("decision_reason", "")
-                },
-                "response": final_state.get("solution_summary", ""),
-                "retrieval_summary": final_state.get("retrieval_summary", ""),
-                "actions_taken": [a.get("action", "").replace("_", " ").title() for a in final_state.get("audit_log", []) if a.get("stage")=="DO" and a.get("action")]
-            },
-            "logs": final_state.get("audit_log", [])
-        }
-        print(json.dumps(final_output, indent=2))
-        return
-
-
-    print("\nFINAL PAYLOAD - key fields")
-    print("=" * 80)
-    for k in ("ticket_id","customer_name","email","query","priority","solution_score","route","status"):
-        print(f"{k}: {final_state.get(k)}")
-    print("\nLogs (stage, abilities, mcp)")
-    for log in final_state.get("audit_log", []):
-        print(f"- {log.get('stage')}: {log.get('abilities_executed')} via {log.get('mcp_client')}")
-
-if __name__ == "__main__":
-    asyncio.run(main())
-
-
-
+"""
+Lang Graph Agent - Customer Support Workflow
+"""
+import os
+import sys
+import json
+import asyncio
+from argparse import ArgumentParser
+from pathlib import Path
+
+os.environ.setdefault("COMMON_MCP_URL", "http://localhost:5001/mcp/")
+os.environ.setdefault("ATLAS_MCP_URL", "http://localhost:5002/mcp/")
+
+# Import existing modular components
+from agent.profiling import PROFILER
+from agent.memory import MEMORY
+from agent.prewarm import cold_warm_latency, prewarm, prewarm_enabled
+from agent.graph import graph, checkpointer, audit_log_of, audit_metrics, concurrency_metrics, dedupe_metrics, deferred_metrics, entity_classifier_metrics, latency_budget_metrics, outbox_metrics, response_cache_metrics
+from agent.graph_builder import load_workflow_config, plan, stage_specs
+from agent.runner import final_output_for, pending_clarification, resume_ticket, run_batch
+from clients.knowledge_base import kb_metrics
+from clients.llm import llm_metrics
+from clients.settings import env_flag
+from schemas.agent_state import AgentState, new_agent_state
+
+def load_input_payload(path: str | None) -> dict:
+    if path:
+        p = Path(path)
+        with p.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    default_path = Path("config/sample_input.json")
+    if default_path.exists():
+        with default_path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    return {
+        "customer_name": "Akshay Redekar",
+        "email": "akshay.redekar@example.com",
+        "query": "Hi, I cannot reset my password and the reset link does not work. Can you help me?",
+        "priority": "High",
+        "ticket_id": "TCK12345",
+    }
+
+def collect_metrics(thread_id: str | None = None) -> dict:
+    """LLM metrics plus each subsystem's, and the checkpoint report of `thread_id` when given."""
+    metrics = {**llm_metrics()}
+    if thread_id is not None:
+        metrics["checkpoint"] = checkpointer.report(thread_id)
+    metrics.update({
+        "concurrency": concurrency_metrics(),
+        "audit": audit_metrics(),
+        "dedupe": dedupe_metrics(),
+        "deferred": deferred_metrics(),
+        "entity_classifier": entity_classifier_metrics(),
+        "latency_budget": latency_budget_metrics(),
+        "knowledge_base": kb_metrics(),
+        "response_cache": response_cache_metrics(),
+        "outbox": outbox_metrics(),
+    })
+    return metrics
+
+def finish_profile(out_dir: str | None) -> dict | None:
+    if not out_dir:
+        return None
+    if PROFILER.enabled:
+        PROFILER.stop()
+    return {"output_dir": out_dir, **PROFILER.write(out_dir)}
+
+def repeat_payloads(payloads: list, repeat: int) -> list:
+    """Copies of the batch with distinct ticket ids, for benchmark-sized runs."""
+    if repeat <= 1:
+        return payloads
+    return [{**p, "ticket_id": f"{p['ticket_id']}-{i}"} for i in range(repeat) for p in payloads]
+
+async def main():
+    parser = ArgumentParser()
+    parser.add_argument("--json", action="store_true", help="Print final output JSON only")
+    parser.add_argument("--input", type=str, default=None, help="Path to input JSON file")
+    parser.add_argument("--metrics", action="store_true", help="Include LLM and checkpoint metrics in the output")
+    parser.add_argument("--batch", nargs="+", default=None, help="Run several input JSON files, earliest SLA deadline first")
+    parser.add_argument("--concurrency", type=int, default=4, help="Tickets in flight in --batch mode")
+    parser.add_argument("--profile", nargs="?", const="profiles", default=None, metavar="DIR", help="Profile each stage (CPU vs await time, sampled stacks) and write folded stacks to DIR")
+    parser.add_argument("--repeat", type=int, default=1, help="Run the --batch inputs this many times (distinct ticket ids)")
+    parser.add_argument("--memory", type=int, default=0, metavar="N", help="Track memory with tracemalloc, snapshotting every N completed tickets")
+    parser.add_argument("--max-growth-kb", type=float, default=None, help="With --memory, exit non-zero if steady-state growth exceeds this many KB per ticket")
+    parser.add_argument("--show-plan", action="store_true", help="Print the stage dependencies and parallel steps compiled from the workflow config")
+    # No forced routing by default; decisions are made by LLM/tools
+    args = parser.parse_args()
+    if args.show_plan:
+        print(json.dumps(plan(stage_specs(load_workflow_config()), parallel=env_flag("PARALLEL_STAGES", True)), indent=2))
+        return
+    if args.profile:
+        PROFILER.start()
+    if args.memory:
+        MEMORY.start(args.memory, checkpoint_report=checkpointer.store_report)
+
+    if args.batch:
+        payloads = repeat_payloads([load_input_payload(p) for p in args.batch], args.repeat)
+        readiness = await asyncio.to_thread(prewarm) if prewarm_enabled() else None
+        report = await run_batch(payloads, concurrency=args.concurrency, keep_output=not args.memory)
+        started_order = sorted(report["tickets"], key=lambda t: t["order"])
+        warmup = {"prewarm": readiness, "latency": cold_warm_latency([t["seconds"] for t in started_order if "seconds" in t])}
+        if not args.json:
+            for t in report["tickets"]:
+                print(f"{t['order']:>3}. {t['ticket_id']} [{t['priority_class']}] {t.get('status')} in {t.get('seconds')}s")
+            report = {"queue_wait": report["queue_wait"]}
+        report["warmup"] = warmup
+        if args.metrics:
+            report["metrics"] = collect_metrics()
+        if args.profile:
+            report["profile"] = finish_profile(args.profile)
+        exceeded = False
+        if args.memory:
+            report["memory"] = MEMORY.report()
+            growth = report["memory"]["steady_state_kb_per_ticket"]
+            exceeded = args.max_growth_kb is not None and growth is not None and growth > args.max_growth_kb
+            report["memory"]["max_growth_kb"] = args.max_growth_kb
+            report["memory"]["passed"] = not exceeded
+        print(json.dumps(report, indent=2))
+        if exceeded:
+            print(f"Steady-state memory growth {growth} KB/ticket exceeds {args.max_growth_kb} KB/ticket", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    print("LANG GRAPH AGENT - CUSTOMER SUPPORT WORKFLOW")
+    print("=" * 80)
+    
+    input_payload = load_input_payload(args.input)
+    
+    incoming_response = ""
+    
+
+    initial_state: AgentState = new_agent_state(input_payload, incoming_response)
+    
+    # Run the workflow
+    try:
+        thread_id = input_payload["ticket_id"]
+
+        # First pass: runs until COMPLETE or pauses at WAIT for a customer reply
+        async for _ in graph.astream(initial_state, config={"configurable": {"thread_id": thread_id}}):
+            pass
+        final_state = graph.get_state({"configurable": {"thread_id": thread_id}}).values
+
+        clarification = pending_clarification(thread_id)
+        if clarification is not None:
+
+            question_text = clarification.get("question") or final_state.get("clarification_question")
+            print("\nClarification needed (from LLM):")
+            print(question_text or "Please provide more details to proceed.")
+
+            # Time spent waiting at the prompt is not part of the ticket's profile
+            if args.profile:
+                PROFILER.stop()
+            try:
+                user_reply = input("\nYour reply: ").strip()
+            except Exception:
+                user_reply = ""
+            if args.profile:
+                PROFILER.start()
+
+            # Resume from the WAIT checkpoint; INTAKE..ASK are not re-executed
+            final_state = await resume_ticket(thread_id, user_reply)
+    except Exception as e:
+        print(f"Error running workflow: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+    if args.json:
+        final_output = final_output_for(final_state)
+        if args.metrics:
+            final_output["metrics"] = collect_metrics(thread_id)
+        if args.profile:
+            final_output["profile"] = finish_profile(args.profile)
+        if args.memory:
+            final_output["memory"] = MEMORY.report()
+        print(json.dumps(final_output, indent=2))
+        return
+
+
+    print("\nFINAL PAYLOAD - key fields")
+    print("=" * 80)
+    for k in ("ticket_id","customer_name","email","query","priority","solution_score","route","status"):
+        print(f"{k}: {final_state.get(k)}")
+    print("\nLogs (stage, abilities, mcp)")
+    for log in audit_log_of(final_state):
+        print(f"- {log.get('stage')}: {log.get('abilities_executed')} via {log.get('mcp_client')}")
+    if args.metrics:
+        print("\nMetrics")
+        print(json.dumps(collect_metrics(thread_id), indent=2))
+    if args.profile:
+        profile = finish_profile(args.profile)
+        print(f"\nProfile (folded stacks in {args.profile}/)")
+        for stage, p in profile["stages"].items():
+            print(f"- {stage}: wall {p['wall_ms']}ms, cpu {p['cpu_ms']}ms, await {p['await_ms']}ms, offloaded cpu {p['offloaded_cpu_ms']}ms")
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+
+
@@ -0,0 +1,47 @@
+"""
+`batch` tool for the FastMCP servers: many `{tool, args}` invocations in one request, run concurrently
+under a cap, answered in order with an error per failed item instead of failing the whole batch
+"""
+
+import asyncio
+from typing import Any, Dict, List
+
+from fastmcp import FastMCP
+
+from clients.settings import load_section
+
+
+def _value(tool, result) -> Any:
+    """Plain JSON value of a ToolResult, undoing FastMCP's wrapping of non-object returns."""
+    if result.structured_content is None:
+        return " ".join(getattr(c, "text", "") for c in result.content)
+    if (tool.output_schema or {}).get("x-fastmcp-wrap-result"):
+        return result.structured_content.get("result")
+    return result.structured_content
+
+
+def register_batch_tool(mcp: FastMCP, max_concurrency: int | None = None, max_items: int | None = None) -> None:
+    cfg = load_section("mcp_batch")
+    limit = int(max_concurrency or cfg.get("max_concurrency", 8))
+    cap = int(max_items or cfg.get("max_items", 256))
+
+    @mcp.tool(name="batch")
+    async def batch(calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run `calls` ([{"tool": name, "args": {...}}]) concurrently; returns [{"ok", "result" | "error"}] in call order."""
+        if len(calls) > cap:
+            raise ValueError(f"Batch of {len(calls)} exceeds max_items={cap}")
+        tools = await mcp.get_tools()
+        sem = asyncio.Semaphore(limit)
+
+        async def one(call: Dict[str, Any]) -> Dict[str, Any]:
+            name = call.get("tool")
+            tool = tools.get(name) if name != "batch" else None
+            if tool is None:
+                return {"ok": False, "error": f"Unknown tool {name!r}"}
+            async with sem:
+                try:
+                    return {"ok": True, "result": _value(tool, await tool.run(call.get("args") or {}))}
+                except Exception as exc:
+                    return {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+
+        return list(await asyncio.gather(*(one(c) for c in calls)))
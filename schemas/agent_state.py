@@ -1,39 +1,91 @@
-from typing import TypedDict, Annotated, List, Dict, Any, Optional
-from langchain_core.messages import BaseMessage
-from langgraph.graph.message import add_messages
-
-class AgentState(TypedDict):
-    ticket_id: str
-    customer_name: str
-    email: str
-    query: str
-    priority: str
-    structured_data: Dict[str, Any]
-    enriched_data: Dict[str, Any]
-    flags: Dict[str, Any]
-    messages: Annotated[List[BaseMessage], add_messages]
-    solution_score: int
-    escalation_path: str
-    retrieved_data: Dict[str, Any]
-    retrieval_summary: str
-    solution_summary: str
-    status: str
-    audit_log: List[Dict[str, Any]]
-    route: str
-    entities: Dict[str, Any]
-    normalized_data: Dict[str, Any]
-    clarification_question: str
-    missing_info: List[str]
-    extracted_answer: Dict[str, Any]
-    knowledge_base_data: Dict[str, Any]
-    escalation_decision: Dict[str, Any]
-    escalate: bool
-    decision_reason: str
-    next_action: str
-    ticket_update: Dict[str, Any]
-    ticket_close: Dict[str, Any]
-    customer_response: str
-    api_results: List[Dict[str, Any]]
-    notification_result: Dict[str, Any]
-    workflow_start_time: str
-    workflow_end_time: str
\ No newline at end of file
+import operator
+import uuid
+from typing import Annotated, TypedDict, List, Dict, Any
+
+def merge_audit_ref(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """Run id, entry count and latest status per stage of audit entries held by the audit sink.
+    A new run of the same ticket id (fresh input with another run id) starts from zero."""
+    left, right = left or {}, right or {}
+    if right.get("run_id", left.get("run_id")) != left.get("run_id"):
+        left = {}
+    return {
+        "run_id": right.get("run_id", left.get("run_id", "")),
+        "entries": left.get("entries", 0) + right.get("entries", 0),
+        "stages": {**left.get("stages", {}), **right.get("stages", {})},
+    }
+
+# Persisted core: everything here is checkpointed at every superstep, so only
+# fields that are read by a later stage or by the final output belong here.
+class AgentState(TypedDict):
+    ticket_id: str
+    customer_name: str
+    email: str
+    query: str
+    priority: str
+    structured_data: Dict[str, Any]
+    flags: Dict[str, Any]
+    solution_score: int
+    escalation_path: str
+    retrieved_data: Dict[str, Any]
+    retrieval_summary: str
+    solution_summary: str
+    status: str
+    # Append-only: nodes return just their new entries, so parallel stages can both log
+    audit_log: Annotated[List[Dict[str, Any]], operator.add]
+    # With the audit sink enabled, entries live outside state and only this reference is checkpointed
+    audit_ref: Annotated[Dict[str, Any], merge_audit_ref]
+    route: str
+    entities: Dict[str, Any]
+    clarification_question: str
+    missing_info: List[str]
+    escalate: bool
+    decision_reason: str
+    customer_response: str
+    reused_from: str
+    # Per-ticket latency budget (deadline, budget_s, started_at); INTAKE sets it, PREPARE may tighten it
+    latency_budget: Dict[str, Any]
+    # When ASK sent its question, and how long WAIT then spent paused for the reply
+    asked_at: float
+    paused_s: float
+    # When INTAKE accepted the ticket (epoch seconds); COMPLETE reports critical-path time from it
+    started_at: float
+
+# Transient per-stage scratch data, held in-process per thread and never checkpointed
+class StageScratch(TypedDict, total=False):
+    parsed_request: Dict[str, Any]
+    normalized_fields: Dict[str, Any]
+    enriched_data: Dict[str, Any]
+    semantic_query: str
+    evaluation: Dict[str, Any]
+
+def new_agent_state(payload: Dict[str, Any], customer_response: str = "") -> AgentState:
+    return {
+        "ticket_id": payload["ticket_id"],
+        "customer_name": payload["customer_name"],
+        "email": payload["email"],
+        "query": payload["query"],
+        "priority": payload["priority"],
+        "structured_data": {},
+        "flags": {},
+        "entities": {},
+        "clarification_question": "",
+        "missing_info": [],
+        "retrieved_data": {},
+        "retrieval_summary": "",
+        "solution_score": 0,
+        "escalate": False,
+        "decision_reason": "",
+        "escalation_path": "",
+        "route": "",
+        "customer_response": customer_response,
+        "reused_from": "",
+        # Hints for INTAKE's budget: a customer SLA and/or an absolute deadline (epoch seconds)
+        "latency_budget": {k: payload[k] for k in ("sla_in_hours", "deadline") if payload.get(k)},
+        "asked_at": 0.0,
+        "paused_s": 0.0,
+        "started_at": 0.0,
+        "status": "started",
+        "audit_log": [],
+        "audit_ref": {"run_id": uuid.uuid4().hex[:12]},
+        "solution_summary": "",
+    }
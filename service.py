@@ -0,0 +1,351 @@
+"""
+Async HTTP ticket API around the compiled graph
+
+    POST /tickets                     submit a ticket (202, or 429 when the queue is full)
+    GET  /tickets/{ticket_id}         status and final output
+    POST /tickets/{ticket_id}/reply   resume a ticket paused at WAIT with the customer's reply
+    GET  /tickets/{ticket_id}/events  stage events as Server-Sent Events
+    GET  /tickets/{ticket_id}/audit   the ticket's audit log (reconstructed from the audit sink)
+    GET  /health                      queue depth and in-flight counts
+    GET  /ready                       200 once prewarmed (provider connections, KB, prompts), else 503
+"""
+import os
+import json
+import time
+import asyncio
+from argparse import ArgumentParser
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from agent.scheduler import EdfQueue
+
+TERMINAL = ("completed", "failed", "awaiting_customer")
+
+
+@dataclass
+class TicketRecord:
+    ticket_id: str
+    payload: Dict[str, Any]
+    status: str = "queued"
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    clarification: Optional[Dict[str, Any]] = None
+    output: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+
+    async def emit(self, event: Dict[str, Any]) -> None:
+        async with self.changed:
+            self.events.append({**event, "ticket_id": self.ticket_id, "ts": round(time.time(), 3)})
+            self.changed.notify_all()
+
+    def view(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "ticket_id": self.ticket_id,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "stages": [e["stage"] for e in self.events if e.get("event") == "stage"],
+        }
+        if self.clarification is not None:
+            out["clarification"] = self.clarification
+        if self.output is not None:
+            out["output"] = self.output
+        if self.error is not None:
+            out["error"] = self.error
+        return out
+
+
+class TicketService:
+    """Admission-controlled runner: a bounded EDF queue feeding a fixed number of graph workers."""
+
+    def __init__(self, concurrency: int = 8, queue_size: int = 64, retain: int = 10000):
+        self.concurrency = concurrency
+        self.queue = EdfQueue(maxsize=queue_size)
+        self.retain = retain
+        self.tickets: "OrderedDict[str, TicketRecord]" = OrderedDict()
+        self.running = 0
+        self.rejected = 0
+        self._workers: List[asyncio.Task] = []
+        self._prewarm: Optional[asyncio.Task] = None
+        self.gated = False
+
+    async def start(self) -> None:
+        from agent.prewarm import READINESS, prewarm, prewarm_enabled
+        from clients.settings import load_section
+
+        # Ability calls run via asyncio.to_thread; size the pool so it is not the real concurrency cap
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=self.concurrency + 4))
+        if prewarm_enabled():
+            # Warm up in the background: /ready answers 503 until done, and with gate_workers admitted
+            # tickets wait in the queue instead of paying the setup themselves
+            self._prewarm = asyncio.create_task(asyncio.to_thread(prewarm))
+            self.gated = bool(load_section("prewarm").get("gate_workers", True))
+        else:
+            READINESS.mark_ready()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        from agent.graph import flush_audit_sink, flush_entity_labels, flush_outbox
+        flush_audit_sink()
+        flush_outbox()
+        flush_entity_labels()
+
+    def _admit(self, record: TicketRecord, graph_input: Any) -> bool:
+        try:
+            self.queue.push_nowait(record.payload, (record, graph_input))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        return True
+
+    def submit(self, payload: Dict[str, Any]) -> Optional[TicketRecord]:
+        from schemas.agent_state import new_agent_state
+
+        ticket_id = payload["ticket_id"]
+        existing = self.tickets.get(ticket_id)
+        if existing is not None and existing.status not in TERMINAL:
+            raise ValueError(f"Ticket {ticket_id} is already {existing.status}")
+        record = TicketRecord(ticket_id=ticket_id, payload=payload)
+        if not self._admit(record, new_agent_state(payload, payload.get("customer_response", ""))):
+            return None
+        self.tickets[ticket_id] = record
+        self.tickets.move_to_end(ticket_id)
+        while len(self.tickets) > self.retain:
+            self.tickets.popitem(last=False)
+        return record
+
+    def reply(self, record: TicketRecord, customer_response: str) -> bool:
+        from langgraph.types import Command
+
+        if record.status != "awaiting_customer":
+            raise ValueError(f"Ticket {record.ticket_id} is {record.status}, not awaiting a reply")
+        if not self._admit(record, Command(resume=customer_response)):
+            return False
+        record.status = "queued"
+        record.clarification = None
+        return True
+
+    async def _worker(self) -> None:
+        from agent.graph import checkpointer
+        from agent.memory import MEMORY
+        from agent.prewarm import READINESS
+        from agent.runner import final_output_for, pending_clarification, stream_ticket, ticket_state
+
+        if self.gated:
+            await READINESS.wait_async()
+        while True:
+            _, (record, graph_input) = await self.queue.pop()
+            self.running += 1
+            record.status = "running"
+            record.started_at = time.time()
+            try:
+                await record.emit({"event": "started"})
+                async for event in stream_ticket(record.ticket_id, graph_input):
+                    await record.emit(event)
+                record.clarification = pending_clarification(record.ticket_id)
+                if record.clarification is not None:
+                    record.status = "awaiting_customer"
+                else:
+                    record.output = await asyncio.to_thread(final_output_for, ticket_state(record.ticket_id))
+                    record.status = "completed"
+            except Exception as exc:
+                record.error = f"{type(exc).__name__}: {exc}"
+                record.status = "failed"
+            finally:
+                self.running -= 1
+                record.finished_at = time.time()
+                if record.status != "awaiting_customer":
+                    # The record now holds the output; the checkpoint is only needed to resume from WAIT
+                    checkpointer.delete_thread(record.ticket_id)
+                MEMORY.ticket_done()
+                await record.emit({"event": record.status})
+                self.queue.task_done()
+
+    def health(self) -> Dict[str, Any]:
+        from agent.graph import audit_metrics, concurrency_metrics, dedupe_metrics, deferred_metrics, entity_classifier_metrics, latency_budget_metrics, memory_metrics, outbox_metrics, response_cache_metrics
+        from agent.prewarm import READINESS
+        from clients.knowledge_base import kb_metrics
+
+        return {
+            "ready": READINESS.ready,
+            "queued": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "running": self.running,
+            "workers": self.concurrency,
+            "rejected": self.rejected,
+            "queue_wait": self.queue.metrics.snapshot(),
+            "concurrency": concurrency_metrics(history=10),
+            "audit": audit_metrics(),
+            "dedupe": dedupe_metrics(),
+            "deferred": deferred_metrics(),
+            "entity_classifier": entity_classifier_metrics(),
+            "latency_budget": latency_budget_metrics(),
+            "knowledge_base": kb_metrics(),
+            "response_cache": response_cache_metrics(),
+            "outbox": outbox_metrics(),
+            "memory": memory_metrics(),
+            "readiness": READINESS.snapshot(),
+        }
+
+
+def _required_fields() -> List[str]:
+    path = Path("config/workflow_config.json")
+    if not path.exists():
+        return ["customer_name", "email", "query", "priority", "ticket_id"]
+    return json.loads(path.read_text(encoding="utf-8"))["input_schema"]["required"]
+
+
+def create_app(concurrency: int = 8, queue_size: int = 64) -> Starlette:
+    service = TicketService(concurrency=concurrency, queue_size=queue_size)
+    required = _required_fields()
+
+    def busy() -> JSONResponse:
+        return JSONResponse({"error": "queue full", **service.health()}, status_code=429, headers={"Retry-After": "1"})
+
+    async def submit(request: Request) -> JSONResponse:
+        try:
+            payload = await request.json()
+        except ValueError:
+            return JSONResponse({"error": "invalid JSON body"}, status_code=400)
+        missing = [k for k in required if not isinstance(payload, dict) or not payload.get(k)]
+        if missing:
+            return JSONResponse({"error": "missing required fields", "fields": missing}, status_code=400)
+        try:
+            record = service.submit(payload)
+        except ValueError as exc:
+            return JSONResponse({"error": str(exc)}, status_code=409)
+        if record is None:
+            return busy()
+        return JSONResponse({"ticket_id": record.ticket_id, "status": record.status}, status_code=202)
+
+    async def status(request: Request) -> JSONResponse:
+        record = service.tickets.get(request.path_params["ticket_id"])
+        if record is None:
+            return JSONResponse({"error": "unknown ticket"}, status_code=404)
+        return JSONResponse(record.view())
+
+    async def reply(request: Request) -> JSONResponse:
+        record = service.tickets.get(request.path_params["ticket_id"])
+        if record is None:
+            return JSONResponse({"error": "unknown ticket"}, status_code=404)
+        try:
+            body = await request.json()
+        except ValueError:
+            return JSONResponse({"error": "invalid JSON body"}, status_code=400)
+        if not isinstance(body, dict):
+            return JSONResponse({"error": "body must be a JSON object"}, status_code=400)
+        try:
+            admitted = service.reply(record, str(body.get("customer_response", "")))
+        except ValueError as exc:
+            return JSONResponse({"error": str(exc)}, status_code=409)
+        if not admitted:
+            return busy()
+        return JSONResponse({"ticket_id": record.ticket_id, "status": record.status}, status_code=202)
+
+    async def events(request: Request):
+        record = service.tickets.get(request.path_params["ticket_id"])
+        if record is None:
+            return JSONResponse({"error": "unknown ticket"}, status_code=404)
+
+        async def stream():
+            sent = 0
+            while True:
+                async with record.changed:
+                    if sent >= len(record.events) and record.status not in TERMINAL:
+                        try:
+                            await asyncio.wait_for(record.changed.wait(), timeout=15)
+                        except asyncio.TimeoutError:
+                            pass
+                    pending = record.events[sent:]
+                    done = record.status in TERMINAL
+                sent += len(pending)
+                for event in pending:
+                    yield f"event: {event.get('event', 'message')}\ndata: {json.dumps(event)}\n\n"
+                if done and sent >= len(record.events):
+                    return
+                if not pending:
+                    yield ": keep-alive\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    async def audit(request: Request) -> JSONResponse:
+        from agent.graph import audit_log_of
+
+        ticket_id = request.path_params["ticket_id"]
+        record = service.tickets.get(ticket_id)
+        # With the audit sink this reads the store (also for tickets no longer retained here)
+        known = {"ticket_id": ticket_id, "audit_log": ((record.output if record else None) or {}).get("logs", [])}
+        entries = await asyncio.to_thread(audit_log_of, known)
+        if record is None and not entries:
+            return JSONResponse({"error": "unknown ticket"}, status_code=404)
+        return JSONResponse({"ticket_id": ticket_id, "entries": entries})
+
+    async def health(request: Request) -> JSONResponse:
+        return JSONResponse(service.health())
+
+    async def ready(request: Request) -> JSONResponse:
+        from agent.prewarm import READINESS
+
+        snapshot = READINESS.snapshot()
+        return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        await service.start()
+        try:
+            yield
+        finally:
+            await service.stop()
+
+    app = Starlette(
+        routes=[
+            Route("/tickets", submit, methods=["POST"]),
+            Route("/tickets/{ticket_id}", status, methods=["GET"]),
+            Route("/tickets/{ticket_id}/reply", reply, methods=["POST"]),
+            Route("/tickets/{ticket_id}/events", events, methods=["GET"]),
+            Route("/tickets/{ticket_id}/audit", audit, methods=["GET"]),
+            Route("/health", health, methods=["GET"]),
+            Route("/ready", ready, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.service = service
+    return app
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("SERVICE_CONCURRENCY", "8")), help="Tickets processed concurrently")
+    parser.add_argument("--queue-size", type=int, default=int(os.getenv("SERVICE_QUEUE_SIZE", "64")), help="Admitted tickets waiting for a worker before 429")
+    parser.add_argument("--fake-llm", action="store_true", help="Use the offline fake LLM providers (load tests)")
+    args = parser.parse_args()
+
+    if args.fake_llm:
+        # Must be set before the graph and its clients are imported by the workers
+        os.environ["LLM_FAKE_PROVIDERS"] = "1"
+    import agent.runner  # noqa: F401  build the graph and clients before accepting traffic
+
+    uvicorn.run(create_app(args.concurrency, args.queue_size), host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Offline fake LLM providers, and the durable side files of the graph in a scratch directory
+_SCRATCH = tempfile.mkdtemp(prefix="agent-tests-")
+os.environ.setdefault("LLM_FAKE_PROVIDERS", "1")
+os.environ.setdefault("AUDIT_SINK_PATH", os.path.join(_SCRATCH, "audit.db"))
+os.environ.setdefault("OUTBOX_PATH", os.path.join(_SCRATCH, "outbox.db"))
+os.environ.setdefault("ENTITY_CLASSIFIER", "0")
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from agent.audit import AuditSink, SqliteAuditStore
+
+
+class SlowStore:
+    """Records batch sizes; each write takes `delay_s`."""
+
+    path = "memory"
+
+    def __init__(self, delay_s: float = 0.0):
+        self.delay_s = delay_s
+        self.batches = []
+
+    def write(self, records):
+        time.sleep(self.delay_s)
+        self.batches.append(len(records))
+
+    def read(self, ticket_id):
+        return []
+
+    def close(self):
+        pass
+
+
+def test_entries_are_written_in_batches(tmp_path):
+    sink = AuditSink(SqliteAuditStore(str(tmp_path / "audit.db")), batch_size=4, flush_interval_ms=50)
+    for i in range(10):
+        sink.emit("T-1", [{"stage": f"S{i}"}], run_id="r1")
+    assert sink.flush()
+    stats = sink.snapshot()
+    assert stats["written"] == 10
+    assert stats["batches"] <= 4
+    assert [e["stage"] for e in sink.ticket_log("T-1")] == [f"S{i}" for i in range(10)]
+    sink.close()
+
+
+def test_reruns_of_a_ticket_id_are_kept_apart(tmp_path):
+    sink = AuditSink(SqliteAuditStore(str(tmp_path / "audit.db")))
+    sink.emit("T-1", [{"stage": "INTAKE"}, {"stage": "COMPLETE"}], run_id="r1")
+    sink.emit("T-1", [{"stage": "INTAKE"}], run_id="r2")
+    sink.flush()
+    assert len(sink.ticket_log("T-1", "r1")) == 2
+    assert len(sink.ticket_log("T-1", "r2")) == 1
+    # Without a run id the latest run is returned, never a merge of both
+    assert len(sink.ticket_log("T-1")) == 1
+    sink.close()
+
+
+def test_emit_on_the_event_loop_drops_instead_of_blocking():
+    store = SlowStore(delay_s=0.3)
+    sink = AuditSink(store, queue_size=1, batch_size=1, flush_interval_ms=10, block_ms=1000)
+    sink.emit("T-1", [{"stage": "A"}])
+    time.sleep(0.05)  # the writer is now busy with A
+
+    async def emit():
+        started = time.perf_counter()
+        accepted = sink.emit("T-1", [{"stage": "B"}, {"stage": "C"}])
+        return accepted, time.perf_counter() - started
+
+    accepted, took = asyncio.run(emit())
+    assert accepted == 1
+    assert took < 0.1
+    assert sink.snapshot()["dropped_on_loop"] == 1
+    sink.close()
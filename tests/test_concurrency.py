@@ -0,0 +1,80 @@
+import asyncio
+
+from agent.concurrency import AdaptiveLimiter
+
+
+def _batch(limiter, n, seconds, ability="a", **release):
+    """Take `n` slots at once, then finish them all with latency `seconds`."""
+
+    async def run():
+        for _ in range(n):
+            await limiter.acquire()
+        for _ in range(n):
+            limiter.release(ability, seconds, **release)
+
+    asyncio.run(run())
+
+
+def test_aimd_grows_by_one_per_window_and_backs_off_on_throttle():
+    limiter = AdaptiveLimiter("t", initial_limit=4, mode="aimd", decrease_cooldown_s=0)
+    _batch(limiter, 1, 0.1)  # baseline
+    for _ in range(4):
+        _batch(limiter, limiter.slots(), 0.1)
+    assert limiter.slots() in (6, 7)
+    before = limiter.limit
+    _batch(limiter, 1, 0.1, ok=False, throttled=True)
+    assert limiter.limit == before * 0.7
+    assert limiter.snapshot()["throttled"] == 1
+
+
+def test_aimd_backs_off_when_latency_rises():
+    limiter = AdaptiveLimiter("t", initial_limit=10, mode="aimd", decrease_cooldown_s=0)
+    _batch(limiter, 1, 0.1)
+    _batch(limiter, 1, 1.0)  # 10x the baseline lifts the smoothed ratio past the tolerance
+    assert limiter.limit == 7.0
+    assert limiter.snapshot()["history"][-1]["reason"] == "latency"
+
+
+def test_gradient_shrinks_towards_the_latency_gradient_but_not_below_min():
+    limiter = AdaptiveLimiter("t", initial_limit=64, min_limit=4, decrease_cooldown_s=0)
+    _batch(limiter, 1, 0.1)
+    limits = []
+    for _ in range(30):
+        _batch(limiter, 1, 2.0)
+        limits.append(limiter.limit)
+    assert limits[0] < 64
+    assert limits == sorted(limits, reverse=True)
+    assert limiter.slots() >= 4
+
+
+def test_no_growth_while_app_limited():
+    limiter = AdaptiveLimiter("t", initial_limit=16, decrease_cooldown_s=0)
+    for _ in range(50):
+        _batch(limiter, 1, 0.1)
+    assert limiter.slots() == 16 and limiter.snapshot()["increases"] == 0
+
+
+def test_latency_is_judged_per_ability():
+    limiter = AdaptiveLimiter("t", initial_limit=8, mode="aimd", decrease_cooldown_s=0)
+    _batch(limiter, 1, 0.01, ability="fast")
+    _batch(limiter, 1, 3.0, ability="llm")
+    for _ in range(5):
+        _batch(limiter, 4, 3.0, ability="llm")
+    assert limiter.snapshot()["decreases"] == 0
+
+
+def test_callers_queue_beyond_the_limit():
+    limiter = AdaptiveLimiter("t", initial_limit=2, min_limit=2)
+
+    async def run():
+        await limiter.acquire()
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done() and limiter.snapshot()["waiting"] == 1
+        limiter.release("a", 0.1)
+        await asyncio.wait_for(waiter, 1)
+        assert limiter.in_flight == 2
+
+    asyncio.run(run())
+    assert limiter.snapshot()["queued"] == 1
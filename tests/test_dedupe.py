@@ -0,0 +1,39 @@
+from agent.dedupe import DedupeIndex, normalize_query
+
+QUERY = "I was charged twice for my premium subscription this month, please refund the duplicate payment"
+
+
+def test_normalize_drops_ids_amounts_and_emails():
+    assert normalize_query("Refund $1,200 for ORD-5551 to ann@example.com!") == "refund for to"
+    assert normalize_query("Refund $1200 for ORD-77") == normalize_query("refund 1,200.00 for ord-99")
+    assert normalize_query("charged 3 times") == "charged times"
+    # A single digit inside a word is part of it, not a number
+    assert normalize_query("My 2FA code fails") == "my 2fa code fails"
+
+
+def test_near_duplicate_hits_and_unrelated_query_misses():
+    index = DedupeIndex(threshold=0.8)
+    index.add("T-1", QUERY, {"route": "DO"}, "High")
+
+    hit = index.lookup(QUERY.replace("month", "month!!") + " ORD-12345", "HIGH")
+    assert hit is not None
+    assert hit["ticket_id"] == "T-1"
+    assert hit["result"] == {"route": "DO"}
+    assert hit["similarity"] >= 0.8
+
+    assert index.lookup("The delivery of my parcel is late and tracking shows nothing", "High") is None
+    assert index.snapshot()["hits"] == 1
+
+
+def test_reuse_needs_the_same_priority():
+    index = DedupeIndex(threshold=0.8)
+    index.add("T-1", QUERY, {"route": "DO"}, "High")
+    assert index.lookup(QUERY, "Low") is None
+
+
+def test_capacity_evicts_oldest():
+    index = DedupeIndex(capacity=1)
+    index.add("T-1", QUERY, {}, "High")
+    index.add("T-2", "My parcel has not arrived and the courier does not answer", {}, "High")
+    assert index.lookup(QUERY, "High") is None
+    assert index.snapshot()["evicted"] == 1
@@ -0,0 +1,79 @@
+import pytest
+
+from agent.graph_builder import infer_dependencies, load_workflow_config, plan, route_plans, skipped_abilities, stage_specs
+
+
+def _specs(*stages):
+    return stage_specs({"stages": list(stages)})
+
+
+def test_dependencies_follow_reads_and_writes():
+    specs = _specs(
+        {"name": "A", "inputs": [], "outputs": ["x"]},
+        {"name": "B", "inputs": ["x"], "outputs": ["y"]},
+        {"name": "C", "inputs": ["x"], "outputs": ["z"]},
+        {"name": "D", "inputs": ["y", "z"], "outputs": []},
+    )
+    assert infer_dependencies(specs) == {"A": set(), "B": {"A"}, "C": {"A"}, "D": {"B", "C"}}
+    assert plan(specs)["parallel_steps"] == [["A"], ["B", "C"], ["D"]]
+
+
+def test_write_after_read_and_undeclared_stages_are_ordered():
+    specs = _specs(
+        {"name": "A", "inputs": ["x"], "outputs": ["y"]},
+        {"name": "B", "inputs": [], "outputs": ["x"]},
+        {"name": "C"},
+    )
+    # B overwrites what A reads; C declares nothing, so it conflicts with everything before it
+    assert infer_dependencies(specs) == {"A": set(), "B": {"A"}, "C": {"B"}}
+
+
+def test_sequential_mode_is_the_config_order_chain():
+    specs = _specs(
+        {"name": "A", "inputs": [], "outputs": ["x"]},
+        {"name": "B", "inputs": [], "outputs": ["y"]},
+    )
+    assert infer_dependencies(specs) == {"A": set(), "B": set()}
+    assert infer_dependencies(specs, parallel=False) == {"A": set(), "B": {"A"}}
+
+
+def test_after_adds_an_edge_without_a_data_dependency():
+    specs = _specs(
+        {"name": "A", "inputs": [], "outputs": ["x"]},
+        {"name": "B", "inputs": [], "outputs": ["y"]},
+        {"name": "C", "inputs": ["x"], "outputs": [], "after": ["B"]},
+    )
+    assert infer_dependencies(specs)["C"] == {"A", "B"}
+    with pytest.raises(ValueError):
+        infer_dependencies(_specs({"name": "A", "after": ["NOPE"]}))
+
+
+def test_shipped_workflow_layout():
+    layout = plan(stage_specs(load_workflow_config()))
+    # RETRIEVE runs alongside the clarification branch; DECIDE waits for WAIT through its `after`
+    assert ["ASK", "RETRIEVE"] in layout["parallel_steps"]
+    assert set(layout["dependencies"]["DECIDE"]) == {"RETRIEVE", "WAIT"}
+    assert layout["router"] == "DECIDE"
+
+
+def test_route_plans_and_skipped_abilities():
+    specs = _specs(
+        {"name": "R", "inputs": [], "outputs": ["route"], "routes": ["X", "Y"], "route_plans": {"X": {"X": ["a"]}}},
+        {"name": "X", "abilities": ["a", "b"]},
+        {"name": "Y", "abilities": ["c"]},
+        {"name": "END", "abilities": ["out"]},
+    )
+    plans = route_plans(specs)
+    # A configured plan always ends with the last stage; an unconfigured route runs the whole tail from its stage
+    assert plans == {"X": {"X": ["a"], "END": ["out"]}, "Y": {"Y": ["c"], "END": ["out"]}}
+    assert skipped_abilities(specs, "X") == ["b", "c"]
+    assert skipped_abilities(specs, "Y") == []
+
+
+def test_route_plan_rejects_abilities_the_stage_lacks():
+    specs = _specs(
+        {"name": "R", "inputs": [], "outputs": ["route"], "routes": ["X"], "route_plans": {"X": {"X": ["nope"]}}},
+        {"name": "X", "abilities": ["a"]},
+    )
+    with pytest.raises(ValueError):
+        route_plans(specs)
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import pytest
+
+from clients.hedging import HedgedInvoker, LatencyTracker
+
+
+def _invoker(**kw) -> HedgedInvoker:
+    return HedgedInvoker(LatencyTracker(), initial_delay=0.05, **kw)
+
+
+def test_fast_primary_is_not_hedged():
+    invoker = _invoker()
+    assert invoker.invoke("a", lambda provider: provider, "primary", "secondary") == "primary"
+    assert invoker.stats.snapshot()["a"]["hedged"] == 0
+
+
+def test_slow_primary_is_hedged_and_secondary_wins():
+    invoker = _invoker()
+    delays = {"primary": 0.5, "secondary": 0.0}
+
+    def call(provider):
+        time.sleep(delays[provider])
+        return provider
+
+    started = time.perf_counter()
+    assert invoker.invoke("a", call, "primary", "secondary") == "secondary"
+    assert time.perf_counter() - started < 0.4
+    stats = invoker.stats.snapshot()["a"]
+    assert (stats["hedged"], stats["secondary_wins"], stats["abandoned"]) == (1, 1, 1)
+
+
+def test_failing_primary_hedges_at_once_and_both_failing_raises():
+    invoker = _invoker()
+
+    def call(provider):
+        raise RuntimeError(provider)
+
+    with pytest.raises(RuntimeError):
+        invoker.invoke("a", call, "primary", "secondary")
+    assert invoker.stats.snapshot()["a"]["failures"] == 1
+
+
+def test_async_loser_is_cancelled():
+    invoker = _invoker()
+    cancelled = []
+
+    async def call(provider):
+        try:
+            await asyncio.sleep(0.5 if provider == "primary" else 0.0)
+        except asyncio.CancelledError:
+            cancelled.append(provider)
+            raise
+        return provider
+
+    async def run():
+        result = await invoker.ainvoke("a", call, "primary", "secondary")
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == "secondary"
+    assert cancelled == ["primary"]
+
+
+def test_hedge_delay_follows_the_observed_percentile():
+    latency = LatencyTracker()
+    invoker = HedgedInvoker(latency, percentile=95, min_delay=0.01, initial_delay=2.0, min_samples=10)
+    assert invoker.hedge_delay("p") == 2.0
+    for i in range(1, 21):
+        latency.record("p", i / 100)
+    assert invoker.hedge_delay("p") == pytest.approx(0.19)
@@ -0,0 +1,52 @@
+import time
+
+from agent.outbox import Outbox
+
+
+class FlakyTicketSystem:
+    """Applies writes in push order; the first `fail` pushes are rejected."""
+
+    def __init__(self, fail: int = 0):
+        self.fail = fail
+        self.pushes = []
+        self.tickets = {}
+
+    def __call__(self, writes):
+        self.pushes.append(writes)
+        if len(self.pushes) <= self.fail:
+            return ["ticket system unavailable"] * len(writes)
+        for w in writes:
+            self.tickets.setdefault(w["ticket_id"], {}).update(w["fields"])
+        return [None] * len(writes)
+
+
+def test_newer_write_waits_for_backing_off_row(tmp_path):
+    system = FlakyTicketSystem(fail=1)
+    outbox = Outbox(str(tmp_path / "outbox.db"), system, backoff_ms=200, start=False)
+
+    outbox.record("T-1", [("update_ticket", {"status": "in_progress", "priority": "High"})])
+    assert outbox.run_once() == 1  # rejected: the update backs off
+    outbox.record("T-1", [("close_ticket", {})])
+
+    # The close must not overtake the update that is still backing off
+    assert outbox.run_once() == 0
+    assert len(system.pushes) == 1
+
+    time.sleep(0.25)
+    assert outbox.run_once() == 2
+    assert len(system.pushes) == 2
+    assert [w["op"] for w in system.pushes[1]] == ["set_ticket_state"]
+    assert system.tickets["T-1"] == {"status": "closed", "priority": "High"}
+    assert outbox.snapshot()["rows"] == {"sent": 2}
+
+
+def test_other_tickets_are_not_held_back(tmp_path):
+    system = FlakyTicketSystem(fail=1)
+    outbox = Outbox(str(tmp_path / "outbox.db"), system, backoff_ms=10_000, start=False)
+
+    outbox.record("T-1", [("update_ticket", {"status": "in_progress"})])
+    outbox.run_once()
+    outbox.record("T-2", [("update_ticket", {"status": "in_progress"}), ("close_ticket", {})])
+
+    assert outbox.run_once() == 2
+    assert system.tickets == {"T-2": {"status": "closed"}}
@@ -0,0 +1,52 @@
+from langchain_core.prompts import PromptTemplate
+
+from clients.prompt_budget import PromptBudget, TokenHistogram, compact_value, render_compact
+
+_PROMPT = PromptTemplate.from_template("Ticket: {query}\nHits: {hits}")
+
+
+def test_compact_value_keeps_selected_fields_and_trims():
+    hits = [{"title": "Refunds", "body": "x" * 50, "score": 0.9, "tags": []} for _ in range(4)]
+    out = compact_value(hits, None, max_chars=10, max_items=2)
+    assert len(out) == 2
+    assert out[0] == {"title": "Refunds", "body": "x" * 10 + "…", "score": 0.9}  # empty values dropped
+    assert compact_value({"a": 1, "b": 2}, ["a"]) == {"a": 1}
+    assert render_compact({"a": [1, 2]}) == '{"a":[1,2]}'
+    assert render_compact("as is") == "as is"
+
+
+def test_render_fits_the_budget_by_halving_string_limits():
+    # `fields` pick keys of the variable itself, as with a tool result's `data`
+    hits = {"data": [f"Article {i}: " + "lorem ipsum " * 200 for i in range(5)], "source": "https://kb/x"}
+    budget = PromptBudget({"abilities": {"retrieve": {"max_tokens": 200, "max_chars": 600, "variables": {"hits": {"fields": ["data"], "max_items": 3}}}}})
+    value, tokens = budget.render("retrieve", _PROMPT, {"query": "refund", "hits": hits})
+    text = value.to_string()
+    assert tokens <= 200
+    assert "https://kb/x" not in text and "Article 3" not in text
+    stats = budget.snapshot()["retrieve"]
+    assert stats["sent"]["mean"] == tokens
+    assert stats["raw"]["mean"] > tokens and stats["savings"] > 0
+
+
+def test_unbudgeted_or_disabled_abilities_render_as_is():
+    inputs = {"query": "refund", "hits": [{"title": "Refunds"}]}
+    raw = _PROMPT.invoke(inputs).to_string()
+    spec = {"abilities": {"retrieve": {"max_tokens": 10, "variables": {"hits": {}}}}}
+    assert PromptBudget(spec).render("other", _PROMPT, inputs)[0].to_string() == raw
+    assert PromptBudget(spec, enabled=False).render("retrieve", _PROMPT, inputs)[0].to_string() == raw
+
+
+def test_compaction_never_sends_more_than_the_raw_prompt():
+    # JSON of a short dict can be longer than its repr; the raw prompt is kept then
+    inputs = {"query": "q", "hits": {"a": 1}}
+    value, tokens = PromptBudget({"abilities": {"r": {"variables": {"hits": {}}}}}).render("r", _PROMPT, inputs)
+    assert tokens <= PromptBudget({}).render("r", _PROMPT, inputs)[1]
+
+
+def test_token_histogram():
+    h = TokenHistogram()
+    for n in (10, 100, 10_000):
+        h.add(n)
+    snap = h.snapshot()
+    assert snap["count"] == 3 and snap["p50"] == 100
+    assert snap["histogram"] == {"<=64": 1, "<=128": 1, ">8192": 1}
@@ -0,0 +1,37 @@
+import pytest
+
+from clients.rate_limit import MemoryBucketStore, RateLimiter, SqliteBucketStore, estimate_tokens
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return MemoryBucketStore() if request.param == "memory" else SqliteBucketStore(str(tmp_path / "buckets.db"))
+
+
+def test_burst_up_to_the_budget_then_callers_queue_in_order(store):
+    # 60 rpm refills one request per second
+    waits = [store.reserve("p:rpm", 1, 60) for _ in range(63)]
+    assert all(w == 0 for w in waits[:60])
+    assert waits[60:] == pytest.approx([1.0, 2.0, 3.0], abs=0.05)
+
+
+def test_sqlite_buckets_are_shared_between_stores(tmp_path):
+    path = str(tmp_path / "buckets.db")
+    first, second = SqliteBucketStore(path), SqliteBucketStore(path)
+    assert first.reserve("p:tpm", 1000, 1000) == 0
+    assert second.reserve("p:tpm", 500, 1000) == pytest.approx(30.0, abs=0.1)
+
+
+def test_limiter_waits_for_the_tighter_budget(store):
+    limiter = RateLimiter({"p": {"rpm": 600, "tpm": 1200, "output_tokens": 100}}, store)
+    assert limiter.reserve("p", 1000) == 0  # 1000 + 100 expected output of 1200 tokens
+    # 600 more leaves 500 tokens of debt at 20 tokens/s, while rpm still has room
+    assert limiter.reserve("p", 500) == pytest.approx(25.0, abs=0.1)
+    stats = limiter.snapshot()["p"]
+    assert (stats["requests"], stats["throttled"]) == (2, 1)
+    assert limiter.reserve("unlimited", 10**6) == 0
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("x" * 400) == 100
@@ -0,0 +1,18 @@
+from string import Template
+
+from agent.response_cache import ResponseTemplateCache, parameterize
+
+
+def test_slots_replace_whole_words_only():
+    slots = {"customer_name": "Tom Baker", "first_name": "Tom", "ticket_id": "TCK-7"}
+    template = parameterize("Hi Tom, ticket TCK-7 for Tom Baker ships Tomorrow.", slots)
+    assert template == "Hi ${first_name}, ticket ${ticket_id} for ${customer_name} ships Tomorrow."
+    filled = Template(template).substitute({"first_name": "Ann", "ticket_id": "TCK-9", "customer_name": "Ann Lee"})
+    assert filled == "Hi Ann, ticket TCK-9 for Ann Lee ships Tomorrow."
+
+
+def test_reply_quoting_a_too_short_slot_is_not_cached():
+    cache = ResponseTemplateCache()
+    key = ("delivery", "shipping", "kb-1", "create")
+    assert not cache.put(key, "Hi Al, your parcel is on its way.", {"first_name": "Al"})
+    assert cache.put(key, "Your parcel is on its way, Alice.", {"first_name": "Al"})
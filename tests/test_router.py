@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from clients.router import CircuitBreaker, CircuitOpenError, ProviderRouter
+
+
+def test_breaker_opens_then_admits_one_probe_after_cooldown():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.try_acquire()
+
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.try_acquire()
+    assert not breaker.try_acquire()  # one probe at a time
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.trips == 1
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.try_acquire()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.trips == 2
+
+
+def _router(**cfg) -> ProviderRouter:
+    return ProviderRouter({"abilities": {"a": ["slow", "fast", "down"]}, "min_samples": 2, "failure_threshold": 2, **cfg}, available=lambda p: p != "down")
+
+
+def test_candidates_rank_measured_providers_by_health():
+    router = _router()
+    assert router.candidates("a", "slow") == ["slow", "fast"]  # unmeasured: configured order, unavailable left out
+    for _ in range(2):
+        router.record("slow", 0.5, True)
+        router.record("fast", 0.1, True)
+    assert router.candidates("a", "slow") == ["fast", "slow"]
+
+
+def test_open_circuit_is_skipped_and_refused():
+    router = _router()
+    router.record("fast", 0.1, False)
+    router.record("fast", 0.1, False)
+    assert router.candidates("a", "slow") == ["slow"]
+    with pytest.raises(CircuitOpenError):
+        router.acquire("fast")
+    assert router.snapshot()["providers"]["fast"]["circuit"] == CircuitBreaker.OPEN
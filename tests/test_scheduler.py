@@ -0,0 +1,51 @@
+import asyncio
+
+from starlette.testclient import TestClient
+
+from agent.scheduler import EdfQueue, SlaPolicy
+
+
+def _policy(max_wait_s=None) -> SlaPolicy:
+    low = {"rank": 3, "sla_hours": 72, "max_wait_s": max_wait_s}
+    classes = {"Critical": {"rank": 0, "sla_hours": 1}, "High": {"rank": 1, "sla_hours": 4}, "Low": low}
+    return SlaPolicy({"classes": classes, "default_class": "Low"})
+
+
+def test_earliest_deadline_first():
+    async def run():
+        queue = EdfQueue(policy=_policy())
+        for ticket_id, priority in [("low", "Low"), ("high", "high"), ("critical", "CRITICAL"), ("unknown", "whatever")]:
+            queue.push_nowait({"ticket_id": ticket_id, "priority": priority}, ticket_id)
+        return [(await queue.pop())[1] for _ in range(4)]
+
+    assert asyncio.run(run()) == ["critical", "high", "low", "unknown"]
+
+
+def test_max_wait_promotes_a_waiting_low_ticket():
+    policy = _policy(max_wait_s=60)
+    low = policy.admit({"priority": "Low"}, arrival=0.0)
+    high = policy.admit({"priority": "High"}, arrival=120.0)
+    assert low.deadline == 72 * 3600
+    assert low.sort_key == 60.0
+    # Queued for a minute already, the low ticket goes before a high one that has just arrived
+    assert low.key() < high.key()
+    # Without max_wait_s the same low ticket waits out the high one's whole SLA
+    assert _policy().admit({"priority": "Low"}, arrival=0.0).key() > high.key()
+
+
+def test_customer_sla_tightens_but_never_loosens_the_class_sla():
+    policy = _policy()
+    assert policy.admit({"priority": "High", "sla_in_hours": 2}, arrival=0.0).deadline == 2 * 3600
+    assert policy.admit({"priority": "High", "sla_in_hours": 48}, arrival=0.0).deadline == 4 * 3600
+
+
+def test_full_queue_answers_429():
+    import service
+
+    # Without the lifespan no workers run, so admitted tickets stay queued
+    client = TestClient(service.create_app(concurrency=1, queue_size=1))
+    ticket = {"ticket_id": "T-1", "customer_name": "Ann", "email": "ann@example.com", "query": "Card declined", "priority": "High"}
+    assert client.post("/tickets", json=ticket).status_code == 202
+    busy = client.post("/tickets", json={**ticket, "ticket_id": "T-2"})
+    assert busy.status_code == 429
+    assert busy.headers["Retry-After"] == "1"
@@ -0,0 +1,52 @@
+import time
+
+from agent.ticket_queue import TicketQueue
+
+
+def _queue(tmp_path, **kw) -> TicketQueue:
+    return TicketQueue(str(tmp_path / "queue.db"), **kw)
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    queue = _queue(tmp_path)
+    queue.enqueue({"ticket_id": "T-1", "priority": "High"})
+    [first] = queue.claim("w1", 10, visibility_s=0.05)
+    assert queue.claim("w2", 10, visibility_s=0.05) == []
+
+    time.sleep(0.1)
+    [second] = queue.claim("w2", 10, visibility_s=60)
+    assert second.id == first.id
+    assert second.attempts == 2
+    assert second.token != first.token
+    assert queue.stats()["redelivered"] == 1
+
+
+def test_ack_and_extend_fail_on_a_lost_lease(tmp_path):
+    queue = _queue(tmp_path)
+    queue.enqueue({"ticket_id": "T-1", "priority": "High"})
+    [stale] = queue.claim("w1", 1, visibility_s=0.05)
+    time.sleep(0.1)
+    [current] = queue.claim("w2", 1, visibility_s=60)
+
+    assert not queue.extend(stale, 60)
+    assert not queue.ack(stale, {"status": "completed"})
+    assert queue.ack(current, {"status": "completed"})
+    assert queue.results("T-1")[0]["status"] == "done"
+
+
+def test_expired_lease_past_max_attempts_is_dead_lettered(tmp_path):
+    queue = _queue(tmp_path, max_attempts=1)
+    queue.enqueue({"ticket_id": "T-1", "priority": "High"})
+    queue.claim("w1", 1, visibility_s=0.05)
+    time.sleep(0.1)
+    assert queue.claim("w2", 1, visibility_s=60) == []
+    assert queue.stats()["dead"] == 1
+
+
+def test_release_returns_a_lease_without_spending_an_attempt(tmp_path):
+    queue = _queue(tmp_path)
+    queue.enqueue({"ticket_id": "T-1", "priority": "High"})
+    [lease] = queue.claim("w1", 1, visibility_s=60)
+    assert queue.release(lease)
+    [again] = queue.claim("w2", 1, visibility_s=60)
+    assert again.attempts == 1
@@ -0,0 +1,277 @@
+"""
+Queue-driven worker mode: N worker processes, each running its own event loop with many
+in-flight tickets, consuming the durable SQLite ticket queue
+
+    python worker.py enqueue config/payment_dispute.json config/critical_auth.json --copies 50
+    python worker.py run --workers 4 --concurrency 32            # until SIGINT/SIGTERM (graceful drain)
+    python worker.py run --workers 4 --exit-when-empty           # batch: drain the queue and exit
+    python worker.py bench --tickets 400 --cores 1,2,4 --fake-llm
+    python worker.py stats
+    python worker.py reply <ticket_id> "ORD-555"                 # re-enqueue an awaiting ticket with the customer's reply
+
+Tickets are claimed earliest SLA deadline first (agent/scheduler.py), not in arrival order.
+
+Clarification does not pause here: checkpoints live in the memory of the process that ran the ticket,
+so a ticket that stops at WAIT is acked as `awaiting_customer` and its checkpoint dropped. `reply`
+enqueues it again with `customer_response` set, and the rerun goes through WAIT without pausing.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import multiprocessing as mp
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+from agent.ticket_queue import Lease, TicketQueue, default_queue_path
+
+
+class QueueWorker:
+    """One process: claims leases up to `concurrency`, runs them on the graph, acks or nacks."""
+
+    def __init__(self, queue: TicketQueue, name: str, concurrency: int, visibility_s: float, exit_when_empty: bool, drain_timeout_s: float):
+        self.queue = queue
+        self.name = name
+        self.concurrency = concurrency
+        self.visibility_s = visibility_s
+        self.exit_when_empty = exit_when_empty
+        self.drain_timeout_s = drain_timeout_s
+        self.draining = False
+        self.active: Dict[int, Lease] = {}
+        self.lost: Set[int] = set()
+        self.stats = {"worker": name, "processed": 0, "failed": 0, "lost_leases": 0, "first_claim": None, "last_finish": None}
+
+    def drain(self) -> None:
+        self.draining = True
+
+    async def _process(self, lease: Lease) -> None:
+        from agent.graph import checkpointer
+        from agent.memory import MEMORY
+        from agent.runner import final_output_for, pending_clarification, run_ticket
+
+        try:
+            state = await run_ticket(lease.payload, lease.payload.get("customer_response", ""))
+            clarification = pending_clarification(lease.ticket_id)
+            # The audit log is read from the sink's store, off the event loop
+            result = {"status": "awaiting_customer", "clarification": clarification} if clarification else {"status": "completed", **await asyncio.to_thread(final_output_for, state)}
+            if not await asyncio.to_thread(self.queue.ack, lease, result):
+                self.stats["lost_leases"] += 1
+            self.stats["processed"] += 1
+        except asyncio.CancelledError:
+            # Cut off by a drain: hand the ticket back now rather than after its visibility timeout
+            if self.draining:
+                await asyncio.shield(asyncio.to_thread(self.queue.release, lease))
+            raise
+        except Exception as exc:
+            if not await asyncio.to_thread(self.queue.nack, lease, f"{type(exc).__name__}: {exc}"):
+                self.stats["lost_leases"] += 1
+            self.stats["failed"] += 1
+        finally:
+            # Worker checkpoints are per process and not resumable elsewhere (see `reply`); keep memory flat
+            checkpointer.delete_thread(lease.ticket_id)
+            MEMORY.ticket_done()
+            self.active.pop(lease.id, None)
+            self.lost.discard(lease.id)
+            self.stats["last_finish"] = time.time()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.visibility_s / 3)
+            for lease in [l for l in self.active.values() if l.id not in self.lost]:
+                if not await asyncio.to_thread(self.queue.extend, lease, self.visibility_s):
+                    # Lost to another worker; counted once, when its ack or nack is refused
+                    self.lost.add(lease.id)
+
+    async def run(self, poll_s: float = 0.05) -> Dict[str, Any]:
+        heartbeat = asyncio.create_task(self._heartbeat())
+        tasks: set = set()
+        try:
+            while not self.draining:
+                leases = await asyncio.to_thread(self.queue.claim, self.name, self.concurrency - len(self.active), self.visibility_s)
+                for lease in leases:
+                    self.stats["first_claim"] = self.stats["first_claim"] or time.time()
+                    self.active[lease.id] = lease
+                    task = asyncio.create_task(self._process(lease))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                if not leases:
+                    if self.exit_when_empty and not self.active and await asyncio.to_thread(self.queue.pending) == 0:
+                        break
+                    await asyncio.sleep(poll_s)
+                elif len(self.active) >= self.concurrency:
+                    await asyncio.sleep(poll_s / 5)
+            if tasks:
+                # Graceful drain: no new claims, let in-flight tickets finish
+                _, unfinished = await asyncio.wait(set(tasks), timeout=self.drain_timeout_s)
+                for task in unfinished:
+                    task.cancel()
+                # Cancelled tickets release their leases and are redelivered without spending an attempt
+                await asyncio.gather(*unfinished, return_exceptions=True)
+        finally:
+            heartbeat.cancel()
+        return self.stats
+
+
+def _worker_main(index: int, args: Dict[str, Any], ready, go, results) -> None:
+    if args["fake_llm"]:
+        os.environ["LLM_FAKE_PROVIDERS"] = "1"
+    # Sibling workers each start their own KB shard processes: split the cores between them
+    os.environ.setdefault("KB_SHARD_WORKERS", str(max(1, (os.cpu_count() or 1) // args["workers"])))
+    import agent.graph  # noqa: F401  build graph and clients before claiming work
+    from agent.prewarm import prewarm, prewarm_enabled
+
+    if prewarm_enabled():
+        prewarm()
+
+    async def _main() -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=args["concurrency"] + 4))
+        queue = TicketQueue(args["db"], max_attempts=args["max_attempts"])
+        worker = QueueWorker(queue, f"worker-{index}-{os.getpid()}", args["concurrency"], args["visibility"], args["exit_when_empty"], args["drain_timeout"])
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.drain)
+        ready.put(index)
+        await loop.run_in_executor(None, go.wait)
+        try:
+            return await worker.run()
+        finally:
+            queue.close()
+            from agent.graph import flush_audit_sink, flush_entity_labels, flush_outbox
+            flush_audit_sink()
+            flush_outbox()
+            flush_entity_labels()
+
+    results.put(asyncio.run(_main()))
+
+
+def run_pool(args: Dict[str, Any]) -> List[Dict[str, Any]]:
+    ctx = mp.get_context("spawn")
+    ready, results, go = ctx.Queue(), ctx.Queue(), ctx.Event()
+    procs = [ctx.Process(target=_worker_main, args=(i, args, ready, go, results), name=f"ticket-worker-{i}") for i in range(args["workers"])]
+    for p in procs:
+        p.start()
+
+    def _forward(signum, _frame):
+        for p in procs:
+            if p.is_alive():
+                os.kill(p.pid, signal.SIGTERM)
+
+    previous = {sig: signal.signal(sig, _forward) for sig in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        for _ in procs:
+            ready.get()
+        go.set()
+        stats = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+    return stats
+
+
+def _load_payloads(paths: List[str]) -> List[Dict[str, Any]]:
+    return [json.loads(Path(p).read_text(encoding="utf-8")) for p in paths]
+
+
+def _copies(payloads: List[Dict[str, Any]], n: int, prefix: str = "") -> List[Dict[str, Any]]:
+    if n <= 1 and not prefix:
+        return payloads
+    return [{**p, "ticket_id": f"{prefix}{p['ticket_id']}-{i}"} for i in range(n) for p in payloads]
+
+
+def bench(args: Dict[str, Any], total: int, cores: List[int]) -> Dict[str, Any]:
+    samples = _load_payloads(sorted(str(p) for p in Path("config").glob("*.json") if "ticket_id" in json.loads(p.read_text(encoding="utf-8"))))
+    rows = []
+    for n in cores:
+        db = f"{args['db']}.bench-{n}"
+        for suffix in ("", "-wal", "-shm"):
+            Path(db + suffix).unlink(missing_ok=True)
+        queue = TicketQueue(db)
+        queue.enqueue_many(_copies(samples, -(-total // len(samples)), prefix=f"B{n}-")[:total])
+        queue.close()
+        stats = run_pool({**args, "db": db, "workers": n, "exit_when_empty": True})
+        start = min(s["first_claim"] for s in stats if s["first_claim"])
+        end = max(s["last_finish"] for s in stats if s["last_finish"])
+        processed = sum(s["processed"] for s in stats)
+        rows.append({"workers": n, "tickets": processed, "failed": sum(s["failed"] for s in stats), "seconds": round(end - start, 3), "tickets_per_s": round(processed / (end - start), 2)})
+        for suffix in ("", "-wal", "-shm"):
+            Path(db + suffix).unlink(missing_ok=True)
+    base = rows[0]["tickets_per_s"] / rows[0]["workers"]
+    for row in rows:
+        row["speedup"] = round(row["tickets_per_s"] / rows[0]["tickets_per_s"], 2)
+        row["efficiency"] = round(row["tickets_per_s"] / (base * row["workers"]), 2)
+    return {"cpu_count": os.cpu_count(), "concurrency_per_worker": args["concurrency"], "results": rows}
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--db", default=default_queue_path(), help="SQLite queue file (env TICKET_QUEUE_DB)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enq = sub.add_parser("enqueue", help="Add ticket JSON files to the queue")
+    enq.add_argument("paths", nargs="+")
+    enq.add_argument("--copies", type=int, default=1, help="Enqueue N copies with suffixed ticket ids")
+
+    for name in ("run", "bench"):
+        p = sub.add_parser(name)
+        p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+        p.add_argument("--concurrency", type=int, default=32, help="In-flight tickets per worker")
+        p.add_argument("--visibility", type=float, default=60.0, help="Lease visibility timeout in seconds")
+        p.add_argument("--max-attempts", type=int, default=3)
+        p.add_argument("--drain-timeout", type=float, default=30.0, help="Seconds to let in-flight tickets finish on shutdown")
+        p.add_argument("--fake-llm", action="store_true", help="Use the offline fake LLM providers")
+        if name == "run":
+            p.add_argument("--exit-when-empty", action="store_true", help="Batch mode: exit once the queue is drained")
+        else:
+            p.add_argument("--tickets", type=int, default=400)
+            p.add_argument("--cores", default="1,2,4", help="Comma-separated worker counts to compare")
+
+    sub.add_parser("stats", help="Print queue counts")
+    rep = sub.add_parser("reply", help="Re-enqueue a ticket awaiting clarification with the customer's reply")
+    rep.add_argument("ticket_id")
+    rep.add_argument("customer_response")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        queue = TicketQueue(args.db)
+        ids = queue.enqueue_many(_copies(_load_payloads(args.paths), args.copies))
+        print(json.dumps({"enqueued": len(ids), **queue.stats()}))
+        return
+    if args.command == "reply":
+        queue = TicketQueue(args.db)
+        payload = queue.payload(args.ticket_id)
+        if payload is None:
+            parser.error(f"unknown ticket {args.ticket_id}")
+        queue.enqueue({**payload, "customer_response": args.customer_response})
+        print(json.dumps({"enqueued": 1, **queue.stats()}))
+        return
+    if args.command == "stats":
+        queue = TicketQueue(args.db)
+        print(json.dumps({**queue.stats(), "queue_wait": queue.wait_metrics()}, indent=2))
+        return
+
+    opts = {
+        "db": args.db,
+        "workers": args.workers,
+        "concurrency": args.concurrency,
+        "visibility": args.visibility,
+        "max_attempts": args.max_attempts,
+        "drain_timeout": args.drain_timeout,
+        "fake_llm": args.fake_llm,
+        "exit_when_empty": getattr(args, "exit_when_empty", False),
+    }
+    if args.command == "bench":
+        print(json.dumps(bench(opts, args.tickets, [int(c) for c in args.cores.split(",")]), indent=2))
+        return
+    stats = run_pool(opts)
+    queue = TicketQueue(args.db)
+    print(json.dumps({"workers": stats, "queue": queue.stats(), "queue_wait": queue.wait_metrics()}, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())